@@ -0,0 +1,340 @@
+"""Module to render quick-look images of many files without the GUI, e.g. python -m NetCDF4viewer --render"""
+import os
+import sys
+import glob
+import time
+import argparse
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import yaml
+import numpy as np
+import netCDF4
+import pyhdf.SD
+import pyhdf.error
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+try:
+    from .Fastplot import MplCanvas, use_plotscheme
+except (ImportError, ModuleNotFoundError):
+    from Fastplot import MplCanvas, use_plotscheme
+try:
+    from .helper_tools import check_for_time
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import check_for_time
+
+
+class AggCanvas(object):
+    """
+    Figure drawn with Agg, plotting works the same way as in MplCanvas (the methods are shared), but there is no Qt
+    widget behind it, problems are collected instead of shown
+    """
+    grid_key = staticmethod(MplCanvas.grid_key)
+    pyramid_image = MplCanvas.pyramid_image
+    swath_image = MplCanvas.swath_image
+    pcolormesh = MplCanvas.pcolormesh
+
+    def __init__(self, width=6, height=4, dpi=100, plotscheme="default", scatter_dot_size=5, density_above=200000,
+                 density_statistic="mean", pyramid_above=16000000, swath_above=1000000, **kwargs):
+        """
+        :param width: float width of figure in inches
+        :param height: float height of figure in inches
+        :param dpi: int Resolution
+        :param plotscheme: string or list of strings, see also plt.style.available for available style sheets
+        :param scatter_dot_size: integer Size for markers in plot
+        :param density_above: integer Scatter plots with more points are binned into pixels, 0 for never
+        :param density_statistic: string mean, max or count, value of a pixel in the binned scatter plot
+        :param pyramid_above: integer Images with more pixels are shown from a pyramid of averaged levels, 0 for never
+        :param swath_above: integer 2D x-y grids with more cells are rasterized instead of a pcolormesh, 0 for never
+        :param **kwargs: other plot settings, not used here
+        """
+        use_plotscheme(plotscheme)
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(self.fig)
+        self.axes = self.fig.add_subplot(111)
+        self.scatter_dot_size = scatter_dot_size
+        self.density_above = density_above
+        self.density_statistic = density_statistic
+        self.pyramid_above = pyramid_above
+        self.swath_above = swath_above
+        self.im = None
+        self.cb = None
+        # colour limits of the data shown, there is no ScalingChooser to fix them
+        self.fixed_clim = None
+        self.mesh_grid = None
+        self.scatter_buffers = None
+        self.toolbar = None
+        self.sc_size_slider = None
+        self.mparent = None
+        self.problems = []
+
+    def report(self, text):
+        self.problems.append(text)
+
+    def view_in_background(self, mimage):
+        """the figure is saved right after plotting, all views are computed when drawing"""
+
+    def image(self, mdata, limits=None):
+        """
+        :return: bool, True if plot worked, False if plot failed
+        """
+        MplCanvas.image(self, mdata, limits)
+        if self.im is None:
+            return False
+        # blitting is only done in the GUI, animated artists would be left out of the saved figure
+        for artist in (self.im, self.axes.title, self.cb.ax):
+            artist.set_animated(False)
+        return True
+
+    def clear(self):
+        """remove everything, the figure can be used for the next plot"""
+        self.fig.clf()
+        self.axes = self.fig.add_subplot(111)
+        self.im = None
+        self.cb = None
+        self.mesh_grid = None
+        self.scatter_buffers = None
+        self.problems = []
+
+    def save(self, filename):
+        self.fig.savefig(filename)
+
+
+def parse_slice(spec):
+    """
+    :param spec: str, numpy like index, e.g. "0,:,:", "3,10:20,::2" or "-1,::-1"
+    :return: tuple of ints and slices, ValueError if spec is no index
+    """
+    index = []
+    for entr in spec.split(","):
+        entr = entr.strip()
+        try:
+            if ":" in entr:
+                parts = [int(part) if part.strip() else None for part in entr.split(":")]
+                if len(parts) > 3 or (len(parts) == 3 and parts[2] == 0):
+                    raise ValueError(entr)
+                index.append(slice(*parts))
+            else:
+                index.append(int(entr))
+        except ValueError:
+            raise ValueError("cannot read the slice " + repr(spec) + " at " + repr(entr) +
+                             ", give an int or start:stop:step (step not 0) per dimension, e.g. 0,:,::2")
+    return tuple(index)
+
+
+def read_variable(fid, filetype, path, index=None):
+    """
+    :param fid: open netCDF4 Dataset or pyhdf SD
+    :param filetype: str, netcdf4 or hdf4
+    :param path: str, path of the netCDF variable or name of the hdf4 sd dataset
+    :param index: tuple of ints and slices, only read this part, None for everything
+    :return: masked array (times converted to dates)
+    """
+    if filetype == "netcdf4":
+        variable = fid[path]
+        if index is None:
+            values, _ = check_for_time(variable)
+        else:
+            values = variable[index]
+        return np.ma.asarray(values)
+    sds = fid.select(path)
+    values = np.ma.asarray(sds[index] if index is not None else sds[:])
+    for attr, value in sds.attributes().items():
+        if "fillvalue" in attr.lower() or "fill_value" in attr.lower():
+            values = np.ma.masked_equal(values, value)
+            break
+    return values
+
+
+def output_name(filename, variable, spec, outdir, extension="png", name=None):
+    """
+    :param name: str, name of the file in the image name, default is its base name without extension
+    :return: str, path of the image: file name, variable and slice, each separated by "_"
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(filename))[0]
+    parts = [name, variable.strip("/").replace("/", "-")]
+    if spec:
+        parts.append("-".join("all" if entr.strip() == ":" else entr.strip().replace(":", "to")
+                              for entr in spec.split(",")))
+    return os.path.join(outdir, "_".join(parts) + "." + extension)
+
+
+def image_names(filenames):
+    """
+    :param filenames: list of str, the files rendered together
+    :return: dictionary of file name and its name in the images: the base name without extension, for files with
+             the same base name (e.g. the same granule in two directories) the path below their common directory
+    """
+    stems = [os.path.splitext(os.path.basename(filename))[0] for filename in filenames]
+    names = {}
+    for filename, stem in zip(filenames, stems):
+        if stems.count(stem) > 1:
+            others = [os.path.abspath(entr) for entr, other in zip(filenames, stems) if other == stem]
+            relative = os.path.relpath(os.path.abspath(filename), os.path.commonpath(others))
+            stem = relative.replace(os.sep, "-").replace(".", "-")
+        names[filename] = stem
+    return names
+
+
+def render_file(filename, variables, xvar=None, yvar=None, spec=None, outdir=".", settings=None, name=None):
+    """
+    render the variables of one file, each to its own image. Runs in a worker process
+
+    :param filename: str, netCDF4, hdf5 or hdf4 file
+    :param variables: list of str, variables to plot (the z values if x and y are given)
+    :param xvar: str, variable with the x-coordinates, None to plot images or lines over the index
+    :param yvar: str, variable with the y-coordinates
+    :param spec: str, slice of the variables, see parse_slice, None for all
+    :param outdir: str, directory for the images
+    :param settings: dictionary of parameters for AggCanvas
+    :param name: str, name of the file in the image names, see output_name
+    :return: tuple of filename, list of the written images and list of error messages
+    """
+    written = []
+    errors = []
+    try:
+        index = parse_slice(spec) if spec else None
+    except ValueError as exc:
+        return filename, written, [str(exc)]
+    try:
+        fid = netCDF4.Dataset(filename)
+        filetype = "netcdf4"
+    except (OSError, UnicodeError):
+        try:
+            fid = pyhdf.SD.SD(filename)
+            filetype = "hdf4"
+        except pyhdf.error.HDF4Error:
+            return filename, written, ["This seems not to be a valid nc, hdf4 or hdf5 file"]
+    canvas = AggCanvas(**(settings or {}))
+    try:
+        coordinates = {}
+        for coordinate in (xvar, yvar):
+            if coordinate is not None:
+                try:
+                    coordinates[coordinate] = read_variable(fid, filetype, coordinate)
+                except Exception as exc:
+                    return filename, written, ["could not read " + str(coordinate) + ": " + str(exc)]
+        for variable in variables:
+            try:
+                zvalues = np.ma.squeeze(read_variable(fid, filetype, variable, index))
+                canvas.clear()
+                if xvar is not None and yvar is not None:
+                    xvalues, yvalues = coordinates[xvar], coordinates[yvar]
+                    # coordinates with the same dimensions as the variable are sliced the same way
+                    if index is not None:
+                        shape = fid[variable].shape if filetype == "netcdf4" else tuple(fid.select(variable).info()[2])
+                        if np.shape(xvalues) == tuple(shape):
+                            xvalues = xvalues[index]
+                        if np.shape(yvalues) == tuple(shape):
+                            yvalues = yvalues[index]
+                    worked = canvas.pcolormesh(types.SimpleNamespace(datavalue=np.ma.squeeze(xvalues), name_value=xvar),
+                                               types.SimpleNamespace(datavalue=np.ma.squeeze(yvalues), name_value=yvar),
+                                               types.SimpleNamespace(datavalue=zvalues, name_value=variable))
+                elif zvalues.ndim == 2:
+                    worked = canvas.image(zvalues)
+                    canvas.axes.set_title(variable)
+                elif zvalues.ndim == 1:
+                    xvalues = np.ma.squeeze(coordinates[xvar]) if xvar is not None else np.arange(len(zvalues))
+                    canvas.axes.plot(xvalues, zvalues)
+                    canvas.axes.set_xlabel(xvar if xvar is not None else "index")
+                    canvas.axes.set_ylabel(variable)
+                    worked = True
+                else:
+                    raise ValueError("has " + str(zvalues.ndim) + " dimensions, choose a 1D or 2D slice with --slice")
+                if not worked:
+                    raise ValueError("; ".join(canvas.problems))
+                outname = output_name(filename, variable, spec, outdir, name=name)
+                if outname in written:
+                    # variables whose names only differ in / and -
+                    outname = os.path.splitext(outname)[0] + "_" + str(len(written) + 1) + ".png"
+                canvas.save(outname)
+                written.append(outname)
+            except Exception as exc:
+                errors.append(str(variable) + ": " + str(exc))
+    finally:
+        if filetype == "netcdf4":
+            fid.close()
+        else:
+            fid.end()
+    return filename, written, errors
+
+
+def render(files, variables, xvar=None, yvar=None, spec=None, outdir=".", workers=0, settings=None):
+    """
+    render the variables of all files, the files are spread over a pool of processes
+
+    :param files: list of str, file names or glob patterns
+    :param workers: int, number of processes, 0 for one per cpu
+    :return: number of images written
+    :other params: see render_file
+    """
+    filenames = []
+    for pattern in files:
+        matches = sorted(glob.glob(pattern))
+        if len(matches) == 0:
+            print("no file found for ", pattern)
+        # overlapping patterns render a file only once
+        filenames.extend(match for match in matches if match not in filenames)
+    if len(filenames) == 0:
+        return 0
+    os.makedirs(outdir, exist_ok=True)
+    workers = int(workers) if workers else (os.cpu_count() or 1)
+    nimages = 0
+    start = time.time()
+    names = image_names(filenames)
+    with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as pool:
+        jobs = [pool.submit(render_file, filename, variables, xvar, yvar, spec, outdir, settings, names[filename])
+                for filename in filenames]
+        for done, job in enumerate(as_completed(jobs), 1):
+            try:
+                filename, written, errors = job.result()
+            except Exception as exc:
+                print("rendering failed: ", exc)
+                continue
+            nimages += len(written)
+            print("[" + str(done) + "/" + str(len(filenames)) + "] " + filename + ": " + str(len(written)) + " images")
+            for error in errors:
+                print("    " + error)
+    duration = max(time.time() - start, 1e-9)
+    print("rendered {} images of {} files in {:.1f} s ({:.2f} files/s) with {} processes".format(
+        nimages, len(filenames), duration, len(filenames) / duration, min(workers, len(filenames))))
+    return nimages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="NetCDF4viewer --render", description="render quick-look images of variables without the GUI")
+    parser.add_argument("files", nargs="+", help="files or glob patterns, e.g. 'data/*.nc'")
+    parser.add_argument("-v", "--variable", action="append", required=True,
+                        help="variable (path in the file) to plot, can be given several times")
+    parser.add_argument("-x", "--x", dest="xvar", help="variable with the x-coordinates")
+    parser.add_argument("-y", "--y", dest="yvar", help="variable with the y-coordinates, together with -x the "
+                                                       "variables are plotted as mesh (2D) or scatter (1D)")
+    parser.add_argument("-s", "--slice", dest="spec", help="part of the variables to plot, e.g. '0,:,:'")
+    parser.add_argument("-o", "--outdir", default=".", help="directory for the images")
+    parser.add_argument("-j", "--workers", type=int, help="number of processes, 0 for one per cpu")
+    parser.add_argument("-c", "--config", help="config file, default is config.yml next to this module")
+    args = parser.parse_args(argv)
+    if args.spec:
+        try:
+            parse_slice(args.spec)
+        except ValueError as exc:
+            parser.error(str(exc))
+    configpath = args.config or os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yml")
+    with open(configpath) as fid:
+        config = yaml.load(fid, yaml.Loader)
+    settings = dict(config.get("Plotsettings", {}))
+    batch = config.get("Batchrender", {})
+    settings.update({key: batch[key] for key in ("width", "height", "dpi") if key in batch})
+    try:
+        settings["plotscheme"] = config["Colorscheme"]["plots"]
+    except KeyError:
+        pass
+    workers = args.workers if args.workers is not None else batch.get("workers", 0)
+    nimages = render(args.files, args.variable, args.xvar, args.yvar, args.spec, args.outdir, workers, settings)
+    return 0 if nimages > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
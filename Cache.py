@@ -0,0 +1,91 @@
+"""Module with caches: per-file metadata (e.g. variable statistics) persisted between sessions and in-memory caches"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHEDIR = os.path.join(os.path.expanduser("~"), ".cache", "QTnetCDF")
+
+
+class MetadataCache(object):
+    """
+    json backed cache for one file. The content is only valid for the version (size and modification time) of the
+    file it was written for, a changed file starts with an empty cache.
+    """
+
+    def __init__(self, filename, cachedir=None):
+        """
+        :param filename: str, path to the file the metadata belongs to
+        :param cachedir: str, directory to store the cache in, default is ~/.cache/QTnetCDF
+        """
+        if cachedir is None:
+            cachedir = CACHEDIR
+        self.filename = os.path.abspath(filename)
+        stat = os.stat(self.filename)
+        self.version = [stat.st_size, stat.st_mtime_ns]
+        self.cachefile = os.path.join(
+            os.path.expanduser(cachedir), hashlib.sha1(self.filename.encode("utf-8")).hexdigest() + ".json")
+        self.content = self.load()
+        self.changed = False
+
+    def load(self):
+        try:
+            with open(self.cachefile) as fid:
+                content = json.load(fid)
+        except (OSError, ValueError):
+            return {}
+        if content.get("file") != self.filename or content.get("version") != self.version:
+            return {}
+        return content.get("sections", {})
+
+    def get(self, section, key, default=None):
+        return self.content.get(section, {}).get(str(key), default)
+
+    def set(self, section, key, value):
+        self.content.setdefault(section, {})[str(key)] = value
+        self.changed = True
+
+    def save(self):
+        """write the cache to disk (atomically), only if something changed"""
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cachefile), exist_ok=True)
+            tmpname = self.cachefile + ".tmp"
+            with open(tmpname, "w") as fid:
+                json.dump({"file": self.filename, "version": self.version, "sections": self.content}, fid)
+            os.replace(tmpname, self.cachefile)
+            self.changed = False
+        except OSError as err:
+            print("metadata cache could not be written: ", err)
+
+
+class LRUCache(object):
+    """
+    in-memory cache keeping the maxsize most recently used entries, safe to use from several threads
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.content = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.content.move_to_end(key)
+            except KeyError:
+                return default
+            return self.content[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.content[key] = value
+            self.content.move_to_end(key)
+            while len(self.content) > self.maxsize:
+                self.content.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.content.clear()
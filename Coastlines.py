@@ -0,0 +1,186 @@
+"""Module for coastline/ country line overlays: simplified levels of the lines, only the visible ones are drawn"""
+import os
+import hashlib
+import numpy as np
+import netCDF4
+from matplotlib.collections import LineCollection
+
+try:
+    from .Cache import CACHEDIR
+except (ImportError, ModuleNotFoundError):
+    from Cache import CACHEDIR
+
+# tolerances (in data units, degrees for longitude/ latitude) of the simplified levels, the first one is the original
+TOLERANCES = (0., 0.01, 0.05, 0.2, 1.)
+
+
+def douglas_peucker(points, tolerance):
+    """
+    simplify a polyline with the Douglas-Peucker algorithm: vertices closer than tolerance to the simplified line
+    are left out, the first and last vertex are always kept
+
+    :param points: array (N, 2) of the vertices
+    :param tolerance: float, largest distance of a left out vertex to the simplified line
+    :return: array (M, 2) of the kept vertices
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start = points[first]
+        direction = points[last] - start
+        offsets = points[first + 1:last] - start
+        squared = direction.dot(direction)
+        # distance to the segment, not the line through it: vertices beyond its ends (or around the start of a
+        # closed ring) are measured to the nearest end
+        along = np.clip(offsets.dot(direction) / squared, 0., 1.) if squared > 0 else np.zeros(len(offsets))
+        distances = np.hypot(*(offsets - along[:, None] * direction).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+
+class CoastlineStore(object):
+    """
+    Polylines at several levels of simplification with the bounding box of each line. segments() returns only the
+    lines that cross a view, at the coarsest level that still looks the same at the resolution of the screen,
+    repeated every period in x (e.g. 360 degrees of longitude) as far as needed.
+    """
+
+    def __init__(self, levels, bboxes, tolerances=TOLERANCES, period=360.):
+        """
+        :param levels: list (one entry per tolerance) of tuples (vertices, offsets): array (N, 2) of the vertices of
+                       all lines and array of the index of the first vertex of each line plus the total number
+        :param bboxes: array (number of lines, 4) of xmin, xmax, ymin, ymax of each line
+        :param tolerances: tuple of floats, tolerance of each level
+        :param period: float, the lines repeat every period in x, None for no repetition
+        """
+        self.levels = levels
+        self.bboxes = bboxes
+        self.tolerances = tuple(tolerances)
+        self.period = period
+
+    @classmethod
+    def from_lines(cls, lines, tolerances=TOLERANCES, period=360.):
+        """
+        :param lines: list of arrays (N, 2) of the vertices of each line
+        :return: CoastlineStore with the simplified levels of lines
+        """
+        lines = [np.asarray(line, dtype=float) for line in lines if len(line) > 0]
+        bboxes = np.array([(line[:, 0].min(), line[:, 0].max(), line[:, 1].min(), line[:, 1].max()) for line in lines])
+        levels = []
+        for tolerance in tolerances:
+            simplified = [douglas_peucker(line, tolerance) for line in lines]
+            offsets = np.cumsum([0] + [len(line) for line in simplified])
+            levels.append((np.concatenate(simplified) if simplified else np.zeros((0, 2)), offsets))
+        return cls(levels, bboxes.reshape(-1, 4), tolerances, period)
+
+    @classmethod
+    def from_file(cls, filename, cachedir=None, tolerances=TOLERANCES, period=360.):
+        """
+        read the lines (one variable (N, 2) per line) of a netCDF/ hdf5 file. The simplified levels are stored in the
+        cache directory and reused as long as the file does not change
+
+        :param filename: str, e.g. country_lines.h5
+        :param cachedir: str, directory of the preprocessed levels, default is ~/.cache/QTnetCDF
+        :return: CoastlineStore
+        """
+        if cachedir is None:
+            cachedir = CACHEDIR
+        stat = os.stat(filename)
+        key = "{}:{}:{}:{}".format(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, tolerances)
+        cachefile = os.path.join(os.path.expanduser(cachedir),
+                                 "lines_" + hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
+        try:
+            with np.load(cachefile) as content:
+                levels = [(content["vertices" + str(idx)], content["offsets" + str(idx)])
+                          for idx in range(len(tolerances))]
+                return cls(levels, content["bboxes"], tolerances, period)
+        except (OSError, KeyError, ValueError):
+            pass
+        with netCDF4.Dataset(filename) as fid:
+            lines = [fid[key][:] for key in fid.variables]
+        store = cls.from_lines(lines, tolerances, period)
+        try:
+            os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+            arrays = {"bboxes": store.bboxes}
+            for idx, (vertices, offsets) in enumerate(store.levels):
+                arrays["vertices" + str(idx)] = vertices
+                arrays["offsets" + str(idx)] = offsets
+            np.savez(cachefile, **arrays)
+        except OSError as err:
+            print("simplified lines could not be cached: ", err)
+        return store
+
+    def level_for(self, pixel_size):
+        """
+        :param pixel_size: float, size of a screen pixel in data units
+        :return: int, the coarsest level whose tolerance is below a pixel
+        """
+        level = 0
+        for idx, tolerance in enumerate(self.tolerances):
+            if tolerance <= pixel_size:
+                level = idx
+        return level
+
+    def segments(self, xlim, ylim, pixels):
+        """
+        :param xlim: tuple of floats, visible range of x
+        :param ylim: tuple of floats, visible range of y
+        :param pixels: tuple of ints, width and height of the view in pixels
+        :return: list of arrays (N, 2), the lines crossing the view
+        """
+        x0, x1 = min(xlim), max(xlim)
+        y0, y1 = min(ylim), max(ylim)
+        pixel_size = min((x1 - x0) / max(pixels[0], 1), (y1 - y0) / max(pixels[1], 1))
+        vertices, offsets = self.levels[self.level_for(pixel_size)]
+        xmin, xmax, ymin, ymax = self.bboxes.T
+        in_y = (ymax >= y0) & (ymin <= y1)
+        if self.period:
+            # copies of the lines shifted by whole periods, as many as the view needs
+            first = int(np.floor((x0 - xmax[in_y].max()) / self.period)) if in_y.any() else 0
+            last = int(np.ceil((x1 - xmin[in_y].min()) / self.period)) if in_y.any() else 0
+            shifts = [self.period * step for step in range(first, last + 1)]
+        else:
+            shifts = [0.]
+        lines = []
+        for shift in shifts:
+            for idx in np.nonzero(in_y & (xmax + shift >= x0) & (xmin + shift <= x1))[0]:
+                line = vertices[offsets[idx]:offsets[idx + 1]]
+                if shift != 0:
+                    line = line + (shift, 0.)
+                lines.append(line)
+        return lines
+
+
+class CoastlineOverlay(LineCollection):
+    """
+    Lines of a CoastlineStore, whenever the view (zoom, pan) or the size of the axes change, only the lines crossing
+    the view are set, at the level matching the resolution
+    """
+
+    def __init__(self, store, **kwargs):
+        """
+        :param store: CoastlineStore
+        :param kwargs: arguments passed on to LineCollection (e.g. colors, linewidths)
+        """
+        super(CoastlineOverlay, self).__init__([], **kwargs)
+        self.store = store
+        self.view = None
+
+    def draw(self, renderer):
+        bbox = self.axes.bbox
+        view = (self.axes.get_xlim(), self.axes.get_ylim(), int(bbox.width), int(bbox.height))
+        if view != self.view:
+            self.set_segments(self.store.segments(view[0], view[1], view[2:]))
+            self.view = view
+        super(CoastlineOverlay, self).draw(renderer)
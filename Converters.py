@@ -6,6 +6,7 @@ import pyhdf.VS
 import pyhdf.V
 import numpy
 import copy
+import itertools
 from pyhdf.error import HDF4Error
 from collections import OrderedDict
 import pandas
@@ -25,6 +26,10 @@ except:
                 import QTnetCDF.MFC as MFC
             except:
                 pass
+try:
+    from .helper_tools import check_for_time
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import check_for_time
 
 HDFTYPE = {pyhdf.HDF.HC.DFTAG_NDG: "HDF SDS",
            pyhdf.HDF.HC.DFTAG_VH: "HDF Vdata",
@@ -49,8 +54,86 @@ DATATYPE = {pyhdf.SD.SDC().COMP_SZIP_RAW: "complex",
             pyhdf.SD.SDC().UCHAR8: "uchar8",
             }
 
+# every value set in a MyQLabel gets a new token, copies keep it. Used to recognise the same data (e.g. grids)
+TOKENS = itertools.count()
+
+
+class DataReference(object):
+    """
+    reference to a variable of an open file: the file handle, the path in the file and the selection. The values
+    are only read (time variables converted, see check_for_time) when they are used, e.g. by a plot. The file has to
+    stay open until then, see App.file_in_use.
+    """
+
+    def __init__(self, variable, path="", selection=slice(None)):
+        """
+        :param variable: netCDF4 variable (or anything with __getitem__, name, shape and dimensions)
+        :param path: str, path of the group of the variable
+        :param selection: index of the part of the variable to use
+        """
+        if not all(hasattr(variable, attr) for attr in ("name", "shape", "dimensions")):
+            raise TypeError(str(getattr(variable, "name", variable)) + " is no variable")
+        self.variable = variable
+        self.path = path
+        self.selection = selection
+        try:
+            self.units = variable.units
+        except (AttributeError, KeyError):
+            self.units = None
+
+    @property
+    def shape(self):
+        """squeezed shape of the selection, nothing is read"""
+        return tuple(size for size in numpy.broadcast_to(0, self.variable.shape)[self.selection].shape if size != 1)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def read(self):
+        """:return: the squeezed values of the selection"""
+        values, _ = check_for_time(self.variable, self.selection)
+        return numpy.squeeze(values)
+
+    def __deepcopy__(self, memo):
+        # the reference does not change, copies of plot data can share it
+        return self
+
+
+def dataset_of(variable):
+    """:return: the netCDF4 Dataset (root group) of a variable, None for anything else"""
+    try:
+        group = variable.group()
+        while group.parent is not None:
+            group = group.parent
+    except AttributeError:
+        return None
+    return group
+
+
+class LazyData(object):
+    """datavalue of a data label: a DataReference is read the first time datavalue is used"""
+    reference = None
+    _datavalue = None
 
-class MyQLabel(QLabel):
+    @property
+    def datavalue(self):
+        if self.reference is not None:
+            self._datavalue = self.reference.read()
+            self.reference = None
+        return self._datavalue
+
+    @datavalue.setter
+    def datavalue(self, value):
+        self.reference = value if isinstance(value, DataReference) else None
+        self._datavalue = None if isinstance(value, DataReference) else value
+
+    def stored(self):
+        """:return: the DataReference if the values are not read yet, else the values"""
+        return self.reference if self.reference is not None else self._datavalue
+
+
+class MyQLabel(LazyData, QLabel):
     """
     implements clickable QLabel that performs action on itself: delete text and associated value.
     """
@@ -65,10 +148,15 @@ class MyQLabel(QLabel):
         self.name_value = ""
         self.path = ""
         self.dimension = None
+        self.token = None
 
     def set(self, value, name, path="", dimension=None, units=""):
+        """
+        :param value: array, or DataReference to read the values only when they are used
+        """
         self.setText(self.name + ": " + name)
         self.datavalue = value
+        self.token = next(TOKENS)
         self.name_value = name
         self.units = units
         self.dimension = dimension
@@ -83,22 +171,24 @@ class MyQLabel(QLabel):
         self.setText(self.name + ": ")
         self.datavalue = None
         self.name_value = None
+        self.token = None
 
     def copy(self):
-        class Dummy(object):
-            def __init__(self, nme, val, dim):
+        class Dummy(LazyData):
+            def __init__(self, nme, val, dim, token):
                 self.name_value = copy.deepcopy(nme)
                 self.datavalue = copy.deepcopy(val)
+                self.token = token
                 try:
                     self.dimension = copy.deepcopy(list(dim))
                 except TypeError:
                     self.dimension = []
 
             def copy(self):
-                newobj = Dummy(self.name_value, self.datavalue, self.dimension)
+                newobj = Dummy(self.name_value, self.stored(), self.dimension, self.token)
                 return newobj
 
-        newobj = Dummy(self.name_value, self.datavalue, self.dimension)
+        newobj = Dummy(self.name_value, self.stored(), self.dimension, self.token)
         return newobj
 
 
@@ -0,0 +1,874 @@
+"""
+Module for misc arithmetic: expressions of variables are kept as a graph of nodes and only evaluated when sliced, block
+by block, reading just the part of each variable the slice needs
+"""
+import os
+import re
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+try:
+    import numexpr
+except (ImportError, ModuleNotFoundError):
+    # optional, without it fused expressions are computed chunk by chunk with numpy
+    numexpr = None
+
+try:
+    from .helper_tools import IO_LOCK, iter_slabs
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import IO_LOCK, iter_slabs
+
+# number of elements computed at once, larger slices are computed block by block
+MAX_ELEMENTS = 1000000
+# threads computing the parts of a reduction or the chunks of an elementwise expression
+THREADS = min(8, os.cpu_count() or 1)
+# elements per chunk of the numpy evaluation of elementwise expressions, the temporaries stay this small
+CHUNK = 65536
+# set in threads that already are one of several workers, they do not start threads of their own
+PARALLEL = threading.local()
+
+# elementwise operators, masks are combined separately (see Program)
+OPERATORS = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide, "**": np.power,
+             "<": np.less, ">": np.greater, "<=": np.less_equal, ">=": np.greater_equal,
+             "==": np.equal, "!=": np.not_equal, "&": np.logical_and, "|": np.logical_or,
+             "where": lambda value, condition: np.where(condition, value, np.nan)}
+COMPARISONS = ("<", ">", "<=", ">=", "==", "!=")
+REDUCTIONS = ("mean", "median")
+LOGICAL = {"and": "&", "&": "&", "or": "|", "|": "|"}
+
+
+def normalize_index(key, shape):
+    """
+    :param key: index as used for numpy arrays: ints, slices, 1D integer or boolean arrays and Ellipsis
+    :param shape: tuple, shape of the indexed array
+    :return: tuple with one entry per dimension: int, range or 1D array of non-negative ints
+    """
+    if not isinstance(key, tuple):
+        key = (key, )
+    if any(entr is Ellipsis for entr in key):
+        pos = [idx for idx, entr in enumerate(key) if entr is Ellipsis][0]
+        key = key[:pos] + (slice(None), ) * (len(shape) - len(key) + 1) + key[pos + 1:]
+    if len(key) > len(shape):
+        raise IndexError("too many indices: " + str(len(key)) + " for " + str(len(shape)) + " dimensions")
+    key = key + (slice(None), ) * (len(shape) - len(key))
+    index = []
+    for entr, size in zip(key, shape):
+        if isinstance(entr, slice):
+            index.append(range(size)[entr])
+        elif isinstance(entr, range):
+            index.append(entr)
+        elif np.ndim(entr) == 0 and np.asarray(entr).dtype.kind in "iu":
+            if not -size <= entr < size:
+                raise IndexError("index " + str(entr) + " is out of bounds for size " + str(size))
+            index.append(int(entr) % size)
+        else:
+            entr = np.asarray(entr)
+            if entr.dtype == bool:
+                entr = np.nonzero(entr)[0]
+            if entr.ndim != 1 or entr.dtype.kind not in "iu":
+                raise IndexError("only ints, slices and 1D integer or boolean arrays are valid indices")
+            index.append(np.where(entr < 0, entr + size, entr))
+    return tuple(index)
+
+
+def index_shape(index):
+    """:return: tuple, shape of the result of a normalized index (ints remove their dimension)"""
+    return tuple(len(entr) for entr in index if not isinstance(entr, int))
+
+
+def index_key(index):
+    """:return: hashable version of a normalized index"""
+    return tuple(("a", entr.tobytes()) if isinstance(entr, np.ndarray) else entr for entr in index)
+
+
+def read(source, index):
+    """
+    read a normalized index from anything with numpy like slicing (netCDF4 variable, array). Arrays of indices are
+    applied to each dimension on their own, as netCDF4 does
+
+    :param source: netCDF4 variable, array
+    :param index: tuple, see normalize_index
+    :return: masked array
+    """
+    basic = []
+    takes = []
+    for entr in index:
+        if isinstance(entr, int):
+            basic.append(entr)
+        elif isinstance(entr, range):
+            basic.append(slice(entr.start, entr.stop if entr.stop >= 0 else None, entr.step))
+        elif isinstance(source, np.ndarray):
+            # arrays: a view of the whole dimension, only the chosen entries are copied
+            basic.append(slice(None))
+            takes.append((len(basic) - 1 - sum(isinstance(prev, int) for prev in basic), entr))
+        else:
+            # netCDF4 reads integer sequences itself, dimension by dimension
+            basic.append(entr)
+    with IO_LOCK:
+        values = source[tuple(basic)]
+    for axis, entr in takes:
+        values = values.take(entr, axis=axis)
+    return np.ma.asarray(values)
+
+
+def compose(index, part):
+    """
+    :param index: tuple, normalized index
+    :param part: tuple of slices, one per dimension of the result of index
+    :return: tuple, normalized index of that part of the result
+    """
+    part = iter(part)
+    return tuple(entr if isinstance(entr, int) else entr[next(part)] for entr in index)
+
+
+class Node(object):
+    """
+    Node of an expression. Slicing a node computes only that part of it; nodes with the same key (the same variable
+    or the same subexpression) are computed once per block
+    """
+    key = None
+    # numpy hands arithmetic with arrays over to the node instead of evaluating it
+    __array_ufunc__ = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def compute(self, index, memo):
+        """
+        :param index: tuple, see normalize_index
+        :param memo: dictionary of the parts already computed for this block
+        :return: masked array (or scalar) of the values at index
+        """
+        raise NotImplementedError
+
+    def fetch(self, index, memo):
+        """like compute, but each part is only computed once per block"""
+        mkey = (self.key, index_key(index))
+        if mkey not in memo:
+            memo[mkey] = self.compute(index, memo)
+        return memo[mkey]
+
+    def evaluate(self, key=Ellipsis, max_elements=MAX_ELEMENTS):
+        """
+        :param key: numpy like index
+        :param max_elements: int, slices larger than this are computed block by block along their first dimension
+        :return: masked array
+        """
+        index = normalize_index(key, self.shape)
+        shape = index_shape(index)
+        total = int(np.prod(shape))
+        splitable = [pos for pos, entr in enumerate(index) if isinstance(entr, range) and len(entr) > 1]
+        if total <= max_elements or len(splitable) == 0:
+            return np.ma.asarray(self.fetch(index, {}))
+        pos = splitable[0]
+        axis = sum(not isinstance(entr, int) for entr in index[:pos])
+        step = max(1, max_elements // (total // len(index[pos])))
+        result = None
+        for start in range(0, len(index[pos]), step):
+            part = np.ma.asarray(self.fetch(index[:pos] + (index[pos][start:start + step], ) + index[pos + 1:], {}))
+            if result is None:
+                result = np.ma.zeros(shape, dtype=part.dtype)
+                result.mask = np.ma.getmaskarray(result)
+            target = (slice(None), ) * axis + (slice(start, start + step), )
+            result[target] = part
+        return result
+
+    def __getitem__(self, key):
+        return self.evaluate(key)
+
+    def __array__(self, dtype=None):
+        values = np.ma.getdata(self.evaluate())
+        return values if dtype is None else values.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __deepcopy__(self, memo):
+        # nodes do not change, copies of plot data can share them
+        return self
+
+    def restrict(self, subset):
+        """
+        :param subset: 1D array of indices or booleans
+        :return: Node in which the reductions along an axis of the length of subset only use the entries of subset
+        """
+        return self
+
+    def sources(self):
+        """:return: list of the objects whose id is part of the key, the key only identifies them while they exist"""
+        return []
+
+    def mean(self, axis=0):
+        return Reduction(self, axis, "mean")
+
+    def median(self, axis=0):
+        return Reduction(self, axis, "median")
+
+    def __neg__(self):
+        return BinaryOp("*", Constant(-1), self)
+
+    def __invert__(self):
+        # not: false and 0 become true
+        return BinaryOp("==", self, Constant(False))
+
+    def __pos__(self):
+        return self
+
+
+def _binary(operator, reverse=False):
+    def method(self, other):
+        if reverse:
+            return BinaryOp(operator, as_node(other), self)
+        return BinaryOp(operator, self, as_node(other))
+    return method
+
+
+for _name, _operator in [("add", "+"), ("sub", "-"), ("mul", "*"), ("truediv", "/"), ("pow", "**")]:
+    setattr(Node, "__" + _name + "__", _binary(_operator))
+    setattr(Node, "__r" + _name + "__", _binary(_operator, reverse=True))
+for _name, _operator in [("lt", "<"), ("gt", ">"), ("le", "<="), ("ge", ">="), ("eq", "=="), ("ne", "!="),
+                         ("and", "&"), ("or", "|")]:
+    setattr(Node, "__" + _name + "__", _binary(_operator))
+# comparisons are overloaded, nodes are hashed by identity
+Node.__hash__ = object.__hash__
+
+
+class Variable(Node):
+    """variable of a file, read slice by slice"""
+
+    def __init__(self, source, name=""):
+        """
+        :param source: netCDF4 variable, array or Representative (hdf4, read once as a whole with get_value)
+        :param name: str, name shown in messages
+        """
+        self.source = source
+        self.name = name
+        self.key = ("variable", id(source))
+        self.value = None
+
+    def sources(self):
+        return [self.source]
+
+    def values(self):
+        """:return: the object to slice, hdf4 variables can only be read as a whole"""
+        if hasattr(self.source, "get_value"):
+            if self.value is None:
+                with IO_LOCK:
+                    self.value = np.ma.asarray(self.source.get_value())
+            return self.value
+        return self.source
+
+    @property
+    def shape(self):
+        return tuple(np.shape(self.values()))
+
+    @property
+    def dtype(self):
+        return np.dtype(self.values().dtype)
+
+    def compute(self, index, memo):
+        return read(self.values(), index)
+
+
+class Constant(Node):
+    """number or array (e.g. rows copied from a table)"""
+
+    def __init__(self, value, name=""):
+        """
+        :param value: number or array
+        :param name: str, name shown in messages
+        """
+        self.name = name
+        self.source = value
+        self.value = value if np.ndim(value) == 0 else np.ma.asarray(value)
+        self.key = ("constant", value) if np.ndim(value) == 0 else ("constant", id(value))
+        self.shape = np.shape(self.value)
+        self.dtype = np.asarray(self.value).dtype
+
+    def sources(self):
+        return [] if np.ndim(self.value) == 0 else [self.source]
+
+    def compute(self, index, memo):
+        if np.ndim(self.value) == 0:
+            return self.value
+        return read(self.value, index)
+
+
+def broadcast_index(index, shape, operand_shape):
+    """
+    :param index: tuple, normalized index of the result
+    :param shape: tuple, shape of the result
+    :param operand_shape: tuple, shape of an operand broadcast to shape
+    :return: tuple, normalized index of the operand
+    """
+    entries = index[len(shape) - len(operand_shape):]
+    sizes = shape[len(shape) - len(operand_shape):]
+    return tuple((0 if isinstance(entr, int) else range(1)) if osize == 1 and size != 1 else entr
+                 for entr, osize, size in zip(entries, operand_shape, sizes))
+
+
+class BinaryOp(Node):
+    """+, -, *, /, ** or a comparison of two nodes, element by element with numpy broadcasting"""
+
+    def __init__(self, operator, left, right):
+        """
+        :param operator: str, key of OPERATORS
+        :param left: Node
+        :param right: Node
+        """
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.key = ("binary", operator, left.key, right.key)
+        try:
+            self.shape = tuple(np.broadcast_shapes(left.shape, right.shape))
+        except ValueError:
+            raise ValueError("shapes " + str(left.shape) + " and " + str(right.shape) + " do not fit together")
+
+    def restrict(self, subset):
+        return BinaryOp(self.operator, self.left.restrict(subset), self.right.restrict(subset))
+
+    def sources(self):
+        return self.left.sources() + self.right.sources()
+
+    @property
+    def dtype(self):
+        return OPERATORS[self.operator](np.ones(1, self.left.dtype), np.ones(1, self.right.dtype)).dtype
+
+    def compute(self, index, memo):
+        # the whole elementwise part below this node is computed in one pass
+        if getattr(self, "program", None) is None:
+            self.program = Program(self)
+        return self.program.run(index, memo)
+
+
+def numexpr_dtype(dtype):
+    """:return: dtype numexpr can compute with for values of dtype, None if there is none"""
+    if dtype.kind in "b" or (dtype.kind in "ifc" and dtype.itemsize >= 4):
+        return dtype
+    if dtype.kind == "i" or (dtype.kind == "u" and dtype.itemsize < 4):
+        return np.dtype(np.int32)
+    if dtype.kind == "u":
+        return np.dtype(np.int64) if dtype.itemsize == 4 else None
+    if dtype.kind == "f":
+        return np.dtype(np.float32)
+    return None
+
+
+class Program(object):
+    """
+    elementwise part of an expression (the tree of BinaryOps below a node), compiled once into numexpr source and an
+    equivalent numpy function. The other nodes (variables, constants, reductions) are its inputs, each computed once.
+    A result is masked where any input is masked or where it is not finite (e.g. division by 0).
+    """
+
+    def __init__(self, node):
+        """
+        :param node: BinaryOp
+        """
+        self.node = node
+        self.inputs = []
+        positions = {}
+
+        def build(entr):
+            if isinstance(entr, BinaryOp):
+                ltext, lfunc = build(entr.left)
+                rtext, rfunc = build(entr.right)
+                ufunc = OPERATORS[entr.operator]
+                if entr.operator == "where":
+                    text = "where(" + rtext + ", " + ltext + ", nan)"
+                else:
+                    text = "(" + ltext + entr.operator + rtext + ")"
+                return text, lambda values: ufunc(lfunc(values), rfunc(values))
+            if entr.key not in positions:
+                positions[entr.key] = len(self.inputs)
+                self.inputs.append(entr)
+            pos = positions[entr.key]
+            return "i" + str(pos), lambda values: values[pos]
+        self.source, self.function = build(node)
+
+    def run(self, index, memo):
+        """
+        :param index: tuple, normalized index of the node
+        :param memo: dictionary of the parts already computed for this block
+        :return: masked array
+        """
+        values = [np.ma.asarray(entr.fetch(broadcast_index(index, self.node.shape, entr.shape), memo))
+                  for entr in self.inputs]
+        shape = np.broadcast_shapes(*[entr.shape for entr in values])
+        data = [np.ma.getdata(entr) for entr in values]
+        result = None
+        if numexpr is not None:
+            result = self.with_numexpr(data)
+        if result is None:
+            result = self.with_numpy(data, shape)
+        mask = None
+        for entr in values:
+            if np.ma.getmask(entr) is not np.ma.nomask and entr.mask.any():
+                mask = entr.mask if mask is None else mask | entr.mask
+        if result.dtype.kind in "fc":
+            invalid = ~np.isfinite(result)
+            if invalid.any():
+                mask = invalid if mask is None else mask | invalid
+        if mask is None:
+            return np.ma.masked_array(result)
+        return np.ma.masked_array(result, mask=np.broadcast_to(mask, shape))
+
+    def with_numexpr(self, data):
+        """:return: array computed by numexpr (multithreaded, in chunks), None if numexpr cannot do it"""
+        local = {"nan": np.float64(np.nan)}
+        for pos, entr in enumerate(data):
+            dtype = numexpr_dtype(entr.dtype)
+            if dtype is None:
+                return None
+            local["i" + str(pos)] = entr.astype(dtype, copy=False)
+        try:
+            with np.errstate(all="ignore"):
+                return numexpr.evaluate(self.source, local_dict=local, global_dict={})
+        except Exception as exc:
+            print("numexpr could not compute " + self.source + ", using numpy: ", exc)
+            return None
+
+    def with_numpy(self, data, shape):
+        """:return: array computed chunk by chunk with numpy, the chunks spread over threads"""
+        with np.errstate(all="ignore"):
+            if int(np.prod(shape)) <= CHUNK:
+                return np.asarray(self.function(data))
+            views = [np.broadcast_to(entr, shape) for entr in data]
+            parts = list(iter_slabs(shape, CHUNK))
+
+            def run(part):
+                with np.errstate(all="ignore"):
+                    return self.function([entr[part] for entr in views])
+            result = None
+            if getattr(PARALLEL, "active", False) or THREADS == 1:
+                chunks = map(run, parts)
+                pool = None
+            else:
+                pool = ThreadPoolExecutor(max_workers=THREADS)
+                chunks = pool.map(run, parts)
+            try:
+                for part, chunk in zip(parts, chunks):
+                    if result is None:
+                        result = np.empty(shape, dtype=np.asarray(chunk).dtype)
+                    result[part] = chunk
+            finally:
+                if pool is not None:
+                    pool.shutdown()
+            return result
+
+
+class Reduction(Node):
+    """
+    nan-aware mean or median along one axis, masked values are left out. The result is computed in parts spread over
+    a pool of threads, each part reads the operand in blocks of at most MAX_ELEMENTS (the mean block by block along
+    the axis, the median exactly, with all values along the axis of a few results at once), so the operand never
+    needs to fit into memory.
+    """
+
+    def __init__(self, operand, axis, how="mean", subset=None):
+        """
+        :param operand: Node
+        :param axis: int, axis to reduce
+        :param how: str, mean or median
+        :param subset: 1D array of indices or booleans along axis, only these enter the reduction, None for all
+        """
+        if not -operand.ndim <= axis < operand.ndim:
+            raise ValueError("axis " + str(axis) + " does not exist, the data has " + str(operand.ndim) +
+                             " dimensions")
+        self.operand = operand
+        self.axis = axis % operand.ndim
+        self.how = how
+        length = operand.shape[self.axis]
+        self.along = range(length) if subset is None else normalize_index(subset, (length, ))[0]
+        self.key = ("reduction", how, self.axis, index_key((self.along, )), operand.key)
+        self.shape = operand.shape[:self.axis] + operand.shape[self.axis + 1:]
+        self.dtype = np.dtype(float)
+
+    def sources(self):
+        return self.operand.sources()
+
+    def restrict(self, subset):
+        operand = self.operand.restrict(subset)
+        if len(np.atleast_1d(subset)) == self.operand.shape[self.axis]:
+            return Reduction(operand, self.axis, self.how, subset)
+        return Reduction(operand, self.axis, self.how, None if isinstance(self.along, range) else self.along)
+
+    def block(self, index, along):
+        """:return: index of the operand, index with along inserted at the reduced axis"""
+        return index[:self.axis] + (along, ) + index[self.axis:]
+
+    def mean(self, index):
+        # the reduced axis is where it was in the operand, after the ints before it removed their dimension
+        axis = sum(not isinstance(entr, int) for entr in index[:self.axis])
+        step = max(1, MAX_ELEMENTS // max(int(np.prod(index_shape(index))), 1))
+        total = 0.
+        count = 0
+        for start in range(0, len(self.along), step):
+            values = self.operand.fetch(self.block(index, self.along[start:start + step]), {})
+            values = np.ma.asarray(values).astype(float).filled(np.nan)
+            valid = np.isfinite(values)
+            total = total + np.where(valid, values, 0.).sum(axis=axis)
+            count = count + valid.sum(axis=axis)
+        with np.errstate(all="ignore"):
+            return np.ma.masked_where(count == 0, total / np.maximum(count, 1))
+
+    def median(self, index):
+        axis = sum(not isinstance(entr, int) for entr in index[:self.axis])
+        values = np.ma.asarray(self.operand.fetch(self.block(index, self.along), {})).astype(float).filled(np.nan)
+        with warnings.catch_warnings():
+            # all-nan slices give nan (masked), no need to warn
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.ma.masked_invalid(np.nanmedian(values, axis=axis))
+
+    def compute(self, index, memo):
+        shape = index_shape(index)
+        if self.how == "median":
+            # all values along the axis of a part are in memory at once
+            per_part = max(1, MAX_ELEMENTS // max(len(self.along), 1))
+        else:
+            per_part = MAX_ELEMENTS
+        reduce = getattr(self, self.how)
+        parts = list(iter_slabs(shape, per_part))
+        if len(parts) == 1:
+            return reduce(index)
+        result = np.ma.zeros(shape)
+        result.mask = np.ma.getmaskarray(result)
+        # numpy releases the GIL, reading is serialized by IO_LOCK
+        def run(part):
+            PARALLEL.active = True
+            return reduce(compose(index, part))
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            for part, values in zip(parts, pool.map(run, parts)):
+                result[part] = values
+        return result
+
+
+def as_node(value):
+    """:return: Node of value (Node, Formula, number or array)"""
+    if isinstance(value, Node):
+        return value
+    if isinstance(value, Formula):
+        return value.build()
+    return Constant(value)
+
+
+TOKENS = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|"
+                    r"(\*\*|<=|>=|==|!=|[-+*/<>(),.=&|~]))")
+
+
+def tokenize(text):
+    """:return: list of tuples (kind, text), kind is number, name or op"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKENS.match(text, pos)
+        if match is None:
+            raise ValueError("cannot read the expression at: " + text[pos:].lstrip())
+        number, name, operator = match.groups()
+        if number is not None:
+            tokens.append(("number", number))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", operator))
+        pos = match.end()
+    return tokens
+
+
+class Parser(object):
+    """
+    recursive descent parser of misc expressions: numbers, variables, + - * / **, comparisons (also ranges as
+    1 < v0 <= 5), and/ or/ not (also & | ~, all with lower precedence than comparisons, and before or), brackets,
+    where(condition, values) and the reductions mean/ median, as function (mean(v0, 1), np.nanmean(v0, axis=1)) or
+    method (v0.mean(axis=1))
+    """
+
+    def __init__(self, text, variables):
+        """
+        :param text: str, the expression
+        :param variables: dictionary of names and Nodes
+        """
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.variables = variables
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        kind, text = self.peek()
+        if kind is None or (expected is not None and text != expected):
+            raise ValueError("expected " + str(expected or "more") + " but found " + str(text or "the end"))
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        node = self.logical()
+        if self.pos != len(self.tokens):
+            raise ValueError("unexpected " + self.peek()[1])
+        return node
+
+    def logical(self):
+        # as in python, and binds stronger than or
+        node = self.conjunction()
+        while self.peek()[1] in ("or", "|"):
+            _, operator = self.take()
+            node = BinaryOp(LOGICAL[operator], node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek()[1] in ("and", "&"):
+            _, operator = self.take()
+            node = BinaryOp(LOGICAL[operator], node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek()[1] in ("not", "~"):
+            self.take()
+            return ~self.negation()
+        return self.comparison()
+
+    def comparison(self):
+        node = self.arithmetic()
+        condition = None
+        # a < b <= c is a < b and b <= c
+        while self.peek()[1] in COMPARISONS:
+            _, operator = self.take()
+            right = self.arithmetic()
+            part = BinaryOp(operator, node, right)
+            condition = part if condition is None else BinaryOp("&", condition, part)
+            node = right
+        return node if condition is None else condition
+
+    def arithmetic(self):
+        node = self.term()
+        while self.peek()[1] in ("+", "-"):
+            _, operator = self.take()
+            node = BinaryOp(operator, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek()[1] in ("*", "/"):
+            _, operator = self.take()
+            node = BinaryOp(operator, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[1] == "-":
+            self.take()
+            return -self.unary()
+        if self.peek()[1] == "+":
+            self.take()
+            return self.unary()
+        node = self.postfix()
+        if self.peek()[1] == "**":
+            self.take()
+            node = BinaryOp("**", node, self.unary())
+        return node
+
+    def postfix(self):
+        node = self.atom()
+        while self.peek()[1] == ".":
+            self.take()
+            _, name = self.take()
+            self.take("(")
+            node = self.reduction(name, [node] + self.arguments())
+        return node
+
+    def atom(self):
+        kind, text = self.take()
+        if kind == "number":
+            return Constant(float(text) if any(char in text for char in ".eE") else int(text))
+        if text == "(":
+            node = self.logical()
+            self.take(")")
+            return node
+        if kind != "name":
+            raise ValueError("unexpected " + text)
+        # np.nanmean, numpy.median, ...
+        while self.peek()[1] == "." and text in ("np", "numpy"):
+            self.take()
+            _, text = self.take()
+        if self.peek()[1] == "(":
+            self.take()
+            if text == "where":
+                args = self.arguments()
+                if len(args) != 2:
+                    raise ValueError("where needs the condition and the values")
+                return BinaryOp("where", args[1], args[0])
+            return self.reduction(text, self.arguments())
+        if text not in self.variables:
+            raise ValueError("unknown name " + text)
+        return self.variables[text]
+
+    def arguments(self):
+        """:return: list of the arguments up to the closing bracket, axis=n is returned as int"""
+        args = []
+        while self.peek()[1] != ")":
+            if self.peek()[0] == "name" and self.tokens[self.pos + 1:self.pos + 2] == [("op", "=")]:
+                _, name = self.take()
+                self.take("=")
+                if name != "axis":
+                    raise ValueError("unknown argument " + name)
+            args.append(self.logical())
+            if self.peek()[1] != ")":
+                self.take(",")
+        self.take(")")
+        return args
+
+    def reduction(self, name, args):
+        how = name[3:] if name.startswith("nan") else name
+        if how not in REDUCTIONS:
+            raise ValueError("unknown function " + name + ", possible are " + ", ".join(REDUCTIONS))
+        if len(args) not in (1, 2):
+            raise ValueError(name + " needs the data and the axis")
+        axis = 0
+        if len(args) == 2:
+            if not isinstance(args[1], Constant) or np.asarray(args[1].value).dtype.kind not in "iu":
+                raise ValueError("the axis of " + name + " has to be an integer")
+            axis = int(args[1].value)
+        return Reduction(args[0], axis, how)
+
+
+def parse(text, variables):
+    """
+    :param text: str, expression, e.g. "(v0 - v1) / v1" or "v0.mean(axis=0)"
+    :param variables: dictionary of names and Nodes
+    :return: Node
+    """
+    return Parser(text, variables).parse()
+
+
+# operator at the end of the text of a formula, the next variable is its (right) operand
+TRAILING_OPERATOR = r"(\*\*|<=|>=|==|!=|[-+*/<>(,=&|~]|\band|\bor|\bnot)\s*$"
+# operators after which the text so far is not a complete operand
+OPENING = ("(", ",", "=", "~", "not")
+
+
+def complete(text):
+    """:return: True if text is a whole expression (not empty, brackets closed, no operator at its end)"""
+    return bool(text.strip()) and text.count("(") == text.count(")") and re.search(TRAILING_OPERATOR, text) is None
+
+
+def grouped(text):
+    """:return: text in brackets, unless it is a single variable or number or in brackets already"""
+    text = text.strip()
+    if re.fullmatch(r"v\d+|\d+\.?\d*|\.\d+", text):
+        return text
+    depth = 0
+    for pos, char in enumerate(text):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth == 0 and (pos < len(text) - 1 or char != ")"):
+            return "(" + text + ")"
+    return text
+
+
+class Formula(object):
+    """
+    misc expression as it is put together in the GUI: the typed text, in which each variable chosen with m appears
+    as v0, v1, ... The formula does not change, adding returns a new one.
+    """
+
+    def __init__(self, text="", variables=()):
+        """
+        :param text: str, the expression
+        :param variables: tuple of Nodes, the variables v0, v1, ... of text
+        """
+        self.text = text
+        self.variables = tuple(variables)
+        self.node = None
+
+    __array_ufunc__ = None
+
+    def add_variable(self, node, operator="+"):
+        """
+        like the misc buttons always did, the operator is applied to the result so far: a, +, b, /, c is (a+b)/c
+
+        :param node: Node, e.g. Variable of a file
+        :param operator: str, put between the text and the variable if the text does not end with an operator
+        :return: Formula
+        """
+        text = self.text
+        if complete(text):
+            text = grouped(text) + operator
+        else:
+            match = re.search(TRAILING_OPERATOR, text)
+            if match is not None and complete(text[:match.start()]) and match.group(1) not in OPENING:
+                text = grouped(text[:match.start()]) + match.group(1)
+        return Formula(text + "v" + str(len(self.variables)), self.variables + (node, ))
+
+    def add_text(self, text):
+        """:return: Formula with text appended, an operator (or .mean, ...) at its start applies to the result so far"""
+        if complete(self.text) and re.match(r"\s*(\*\*|<=|>=|==|!=|[-+*/<>&|.]|and\b|or\b)", text):
+            return Formula(grouped(self.text) + text, self.variables)
+        return Formula(self.text + text, self.variables)
+
+    def where(self, condition):
+        """
+        :param condition: Node of booleans, e.g. Constant of a mask
+        :return: Formula, values of this formula where condition is True, masked elsewhere
+        """
+        return Formula("where(v" + str(len(self.variables)) + ", " + self.text + ")", self.variables + (condition, ))
+
+    def build(self):
+        """:return: Node of the whole expression, ValueError if it is not complete"""
+        if self.node is None:
+            self.node = parse(self.text, {"v" + str(idx): node for idx, node in enumerate(self.variables)})
+        return self.node
+
+    def combine(self, other, operator, reverse=False):
+        """:return: Formula, (this formula) operator other"""
+        if reverse:
+            formula = Formula("", self.variables).add_variable(as_node(other))
+            return formula.add_text(operator + grouped(self.text))
+        return self.add_variable(as_node(other), operator)
+
+    def __add__(self, other):
+        return self.combine(other, "+")
+
+    def __sub__(self, other):
+        return self.combine(other, "-")
+
+    def __mul__(self, other):
+        return self.combine(other, "*")
+
+    def __truediv__(self, other):
+        return self.combine(other, "/")
+
+    def __radd__(self, other):
+        return self.combine(other, "+", reverse=True)
+
+    def __rsub__(self, other):
+        return self.combine(other, "-", reverse=True)
+
+    def __rmul__(self, other):
+        return self.combine(other, "*", reverse=True)
+
+    def __rtruediv__(self, other):
+        return self.combine(other, "/", reverse=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __str__(self):
+        names = {"v" + str(idx): getattr(node, "name", "") or "table" for idx, node in enumerate(self.variables)}
+        return re.sub(r"\bv\d+\b", lambda match: names.get(match.group(0), match.group(0)), self.text)
+
+
+def as_formula(value):
+    """:return: Formula of value (None, Formula, Node, number or array)"""
+    if value is None:
+        return Formula()
+    if isinstance(value, Formula):
+        return value
+    return Formula().add_variable(as_node(value))
@@ -1,13 +1,14 @@
 """Module to make 2D plots with sliders to view 3D and 4D data faster.  Can be used individually"""
 import os
 import sys
+import copy
 import matplotlib.pyplot as plt
 import numpy
-from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSlot, QTimer
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QApplication, QLabel, QWidget, QVBoxLayout, QPushButton, QHBoxLayout, QMessageBox,
-                             QMainWindow, qApp, QSlider, QStatusBar, QLineEdit, QInputDialog, QComboBox, QDockWidget)
-from matplotlib.path import Path
+                             QMainWindow, qApp, QSlider, QStatusBar, QLineEdit, QInputDialog, QComboBox, QDockWidget,
+                             QSpinBox, QFileDialog)
 from matplotlib import dates
 from matplotlib.widgets import LassoSelector
 from numpy import ma
@@ -33,9 +34,9 @@ except (ModuleNotFoundError, ImportError):
         print("add_interactivity is not loaded. This reduces the interactivity"
               "for 1D plots. Check if add_interactivity.py is in the current python path")
 try:
-    from .helper_tools import convert_from_time, check_for_time
+    from .helper_tools import convert_from_time, check_for_time, is_datetime, minmax_decimate, AppendBuffer
 except:
-    from helper_tools import convert_from_time, check_for_time
+    from helper_tools import convert_from_time, check_for_time, is_datetime, minmax_decimate, AppendBuffer
 
 try:
     from .Colorschemes import QDarkPalette
@@ -50,6 +51,11 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationTool
 from matplotlib.figure import Figure
 from matplotlib.colors import LogNorm, Normalize
 from matplotlib.backend_bases import key_press_handler
+from matplotlib.collections import Collection, QuadMesh, LineCollection
+from matplotlib.image import AxesImage
+from matplotlib.lines import Line2D
+from matplotlib.spines import Spine
+from matplotlib.transforms import Bbox
 import matplotlib.projections as proj
 import matplotlib.axes._subplots as axs
 
@@ -57,8 +63,49 @@ try:
     from .Menues import center, HelpWindow
 except (ImportError, ModuleNotFoundError):
     from Menues import center, HelpWindow
+try:
+    from .Cache import LRUCache
+except (ImportError, ModuleNotFoundError):
+    from Cache import LRUCache
+try:
+    from .Rasterize import DensityImage, PyramidImage, SwathImage
+except (ImportError, ModuleNotFoundError):
+    from Rasterize import DensityImage, PyramidImage, SwathImage
+try:
+    from .Workers import FrameRenderer, ViewRenderer, ColourLimitsWorker, export_frames
+except (ImportError, ModuleNotFoundError):
+    from Workers import FrameRenderer, ViewRenderer, ColourLimitsWorker, export_frames
+try:
+    from .Selection import PointIndex, as_float
+except (ImportError, ModuleNotFoundError):
+    from Selection import PointIndex, as_float
+try:
+    from .Imagecanvas import ImageCanvas
+except (ImportError, ModuleNotFoundError):
+    from Imagecanvas import ImageCanvas
 
 SIZEVALS = numpy.array([0.1, 0.2, 0.5, 1, 2, 3, 4, 5, 8, 15, 20, 30, 50, 80, 150])
+# cell edges of the last grids used in pcolormesh
+GRID_CACHE = LRUCache(maxsize=8)
+
+
+def use_plotscheme(plotscheme):
+    """
+    :param plotscheme: string or list of strings, matplotlib style sheets, an own file (last entry) is looked for in
+                       the folder of this module
+    """
+    try:
+        plt.style.use(plotscheme)
+    except:
+        try:
+            here = os.path.dirname(os.path.abspath(__file__))
+            if (not isinstance(plotscheme, numpy.ndarray)) and (not isinstance(plotscheme, list)):
+                plotscheme = [plotscheme]
+            plotschemenew = plotscheme[:-1]
+            plotschemenew.append(os.path.join(here, plotscheme[-1]))
+            plt.style.use(plotschemenew)
+        except:
+            pass
 
 
 class Easyerrorbar(axs.Axes):
@@ -102,7 +149,9 @@ class MplCanvas(FigureCanvasQTAgg):
     """
 
     # noinspection PyUnresolvedReferences
-    def __init__(self, parent=None, width=4, height=4, dpi=150, plotscheme="default", scatter_dot_size=5, **kwargs):
+    def __init__(self, parent=None, width=4, height=4, dpi=150, plotscheme="default", scatter_dot_size=5,
+                 decimate_above=100000, density_above=200000, density_statistic="mean", pyramid_above=16000000,
+                 swath_above=1000000, join_rows_above=50, render_in_background=True, **kwargs):
         """
         Canvas to view 1, 2, 3 or 4 D plots, here 3 and 4 D refer to 2 D with slicers
 
@@ -112,20 +161,20 @@ class MplCanvas(FigureCanvasQTAgg):
         :param dpi: int Resolution
         :param plotscheme: string or list of strings, see also plt.style.available for available style sheets
         :param scatter_dot_size: integer Size for markers in plot
+        :param decimate_above: integer Lines with more points are decimated to the resolution of the screen, 0 for never
+        :param density_above: integer Scatter plots with more points are shown as image of the points binned into
+                              screen pixels, 0 for never
+        :param density_statistic: string mean, max or count, value of a pixel in the binned scatter plot
+        :param pyramid_above: integer Images with more pixels are shown from a pyramid of averaged levels, 0 for never
+        :param swath_above: integer 2D x-y grids with more cells are rasterized to the screen instead of a pcolormesh,
+                            0 for never
+        :param join_rows_above: integer More rows of a table selection are drawn with a few artists instead of one
+                                 line each, 0 for never
+        :param render_in_background: bool Binned scatter plots, image pyramids and rasterized swaths compute the
+                                     pixels of a new view in a background thread, the old ones are shown meanwhile
         :param **kwargs contains all other passed parameters. Although not used here, it is important to include
         """
-        try:
-            plt.style.use(plotscheme)
-        except:
-            try:
-                here = os.path.dirname(os.path.abspath(__file__))
-                if (not isinstance(plotscheme, numpy.ndarray)) and (not isinstance(plotscheme, list)):
-                    plotscheme = [plotscheme]
-                plotschemenew = plotscheme[:-1]
-                plotschemenew.append(os.path.join(here, plotscheme[-1]))
-                plt.style.use(plotschemenew)
-            except:
-                pass
+        use_plotscheme(plotscheme)
         self.fig = Figure(figsize=(width, height), dpi=dpi)
         proj.register_projection(Easyerrorbar)  # this is needed for 1D errorbars.
         self.axes = self.fig.add_subplot(111, projection='easyerrorbar')
@@ -138,8 +187,32 @@ class MplCanvas(FigureCanvasQTAgg):
         self.toolbar = NavigationToolbar(self, parent)
         self.im = None
         self.cb = None
+        # colour limits used for all data instead of those of the data shown, see ScalingChooser
+        self.fixed_clim = None
+        self.mesh_grid = None
+        # offsets and colours of the scatter plot with room to append, see append_scatter
+        self.scatter_buffers = None
+        self.decimate_above = decimate_above
+        self.density_above = density_above
+        self.density_statistic = density_statistic
+        self.pyramid_above = pyramid_above
+        self.swath_above = swath_above
+        self.join_rows_above = join_rows_above
+        self.render_in_background = render_in_background
+        # created with the first view computed in the background
+        self.view_renderer = None
+        # labels of the rows drawn together, see plot_rows
+        self.row_labels = {}
+        self.decimated = {}
+        self.decimate_cid = None
         self.sc_size_slider = None
+        self.background = None
+        self.blit_bbox = None
+        self.printing = False
         self.mpl_connect('key_press_event', self.on_key_press)
+        self.mpl_connect('draw_event', self.on_draw)
+        self.mpl_connect('resize_event', self.redecimate)
+        self.mpl_connect('pick_event', self.on_pick_row)
         self.setFocusPolicy(Qt.StrongFocus)
         self.mparent = parent
         self.scroll_zoom()
@@ -186,6 +259,180 @@ class MplCanvas(FigureCanvasQTAgg):
         except TypeError:
             pass
 
+    def plot_line(self, x, y, **kwargs):
+        """
+        Plot y against x as line. Lines with more than decimate_above points and increasing x only get the first,
+        last, minimum and maximum point of each pixel column of the current view. This is redone from the full data
+        whenever the x limits (zoom, pan) or the size of the canvas change.
+
+        :param x: 1D array like x coordinates
+        :param y: 1D array like y coordinates
+        :param kwargs: arguments passed on to axes.plot
+        :return: Line2D
+        """
+        full = self.decimation_data(x, y)
+        if full is None:
+            return self.axes.plot(x, y, **kwargs)[0]
+        xdata, xnum, yfloat = full
+        xdec, ydec = minmax_decimate(xdata, xnum, yfloat, (xnum[0], xnum[-1]), self.decimation_bins())
+        line, = self.axes.plot(xdec, ydec, **kwargs)
+        self.register_decimated(line, full)
+        return line
+
+    def set_line_data(self, line, x, y):
+        """
+        Replace the data of a line in place, decimated like in plot_line
+
+        :param line: Line2D
+        :param x: 1D array like x coordinates
+        :param y: 1D array like y coordinates
+        """
+        self.decimated.pop(line, None)
+        full = self.decimation_data(x, y)
+        if full is None:
+            line.set_data(x, y)
+            return
+        xdata, xnum, yfloat = full
+        line.set_data(*minmax_decimate(xdata, xnum, yfloat, (xnum[0], xnum[-1]), self.decimation_bins()))
+        self.register_decimated(line, full)
+
+    def decimation_data(self, x, y):
+        """
+        :param x: 1D array like x coordinates
+        :param y: 1D array like y coordinates
+        :return: tuple of x, x as float and y as float with nan for missing values if the line is decimated,
+                 None otherwise
+        """
+        if not (self.decimate_above and len(x) > self.decimate_above and not ma.is_masked(x)):
+            return None
+        xnum = None
+        xdata = ma.getdata(x)
+        ydata = ma.asarray(y)
+        if ydata.dtype.kind in "biuf":
+            if xdata.dtype.kind in "biuf":
+                xnum = xdata.astype(float)
+            elif xdata.dtype.kind == "M" or isinstance(xdata[0], datetime.datetime):
+                xnum = dates.date2num(xdata)
+        if xnum is None or not (numpy.diff(xnum) >= 0).all():
+            return None
+        return xdata, xnum, ma.filled(ydata.astype(float), numpy.nan)
+
+    def register_decimated(self, line, full):
+        self.decimated[line] = full
+        if self.decimate_cid is None or self.decimate_cid[0] is not self.axes.callbacks:
+            self.decimate_cid = (self.axes.callbacks, self.axes.callbacks.connect('xlim_changed', self.redecimate))
+
+    def plot_rows(self, x, rows, labels, marker=None):
+        """
+        Plot many rows against x with a few artists instead of one line per row: lines as one LineCollection,
+        markers as one line (without connecting lines) per colour of the colour cycle, markers of single lines are
+        drawn much faster than a scatter with a colour per point. So there are never more Line2D than colours in the
+        cycle (10 by default), however many rows there are. The rows get the colours they would get as separate
+        lines. The label of a row is kept in row_labels and shown in the toolbar when clicking on the row.
+
+        :param x: 1D array x coordinates of all rows or 2D array, one row of x coordinates per row
+        :param rows: 2D array of y coordinates, one row per line
+        :param labels: list of strings, label of each row
+        :param marker: string, marker to plot points instead of lines, None for lines
+        :return: list of LineCollection or Line2D
+        """
+        is_date = isinstance(numpy.ravel(x)[0], (datetime.datetime, numpy.datetime64))
+        yfloat = as_float(rows).reshape(len(labels), -1)
+        xfloat = numpy.broadcast_to(as_float(x).reshape(-1, yfloat.shape[1]), yfloat.shape)
+        cycle = plt.rcParams['axes.prop_cycle'].by_key().get('color', ['C0'])
+        artists = []
+        if marker:
+            for first in range(min(len(cycle), len(labels))):
+                grouplabels = labels[first::len(cycle)]
+                line, = self.axes.plot(xfloat[first::len(cycle)].ravel(), yfloat[first::len(cycle)].ravel(),
+                                       marker=marker, lw=0, color=cycle[first], label=self.rows_label(grouplabels))
+                self.row_labels[line] = (grouplabels, yfloat.shape[1], is_date)
+                artists.append(line)
+        else:
+            collection = LineCollection(numpy.stack([xfloat, yfloat], axis=-1),
+                                        colors=[cycle[num % len(cycle)] for num in range(len(labels))],
+                                        label=self.rows_label(labels))
+            self.axes.add_collection(collection)
+            self.axes.autoscale_view()
+            self.row_labels[collection] = (list(labels), 1, is_date)
+            artists.append(collection)
+        for artist in artists:
+            artist.set_picker(True)
+        if is_date:
+            self.axes.xaxis_date()
+        return artists
+
+    @staticmethod
+    def rows_label(labels):
+        return labels[0] + " ... " + labels[-1] + " (" + str(len(labels)) + " rows)"
+
+    def on_pick_row(self, event):
+        """
+        show the label of a row of plot_rows in the toolbar
+        :param event: pick event
+        """
+        if event.artist not in self.row_labels or len(event.ind) == 0:
+            return
+        labels, rowlength, _ = self.row_labels[event.artist]
+        self.toolbar.set_message(labels[event.ind[0] // rowlength])
+
+    def swap_rows(self, artist):
+        """
+        exchange x and y of an artist of plot_rows in place, including the labels of the rows
+
+        :param artist: LineCollection or Line2D
+        :return: tuple of arrays, the new x and y
+        """
+        if isinstance(artist, LineCollection):
+            segments = numpy.array(artist.get_segments())[:, :, ::-1]
+            artist.set_segments(segments)
+            x, y = segments[:, :, 0], segments[:, :, 1]
+        else:
+            y, x = artist.get_data()
+            artist.set_data(x, y)
+        labels, rowlength, is_date = self.row_labels[artist]
+        newlabels = []
+        for label in labels:
+            names = label.split(" vs ")
+            newlabels.append(" vs ".join([names[1].strip(), names[0].strip()]) if len(names) == 2 else label)
+        self.row_labels[artist] = (newlabels, rowlength, is_date)
+        artist.set_label(self.rows_label(newlabels))
+        return x, y
+
+    def decimation_bins(self):
+        return max(int(self.axes.bbox.width), 100)
+
+    def full_data(self, line):
+        """
+        :param line: Line2D
+        :return: tuple of x and y, the complete data of line, also if it is shown decimated
+        """
+        if line in self.decimated:
+            return self.decimated[line][0], self.decimated[line][2]
+        return line.get_data()
+
+    def redecimate(self, event=None):
+        """
+        decimate all long lines again for the current x limits and canvas size
+        :param event: resize event or axes (xlim_changed), not used
+        """
+        xlim = self.axes.get_xlim()
+        nbins = self.decimation_bins()
+        for line in list(self.decimated):
+            if line.axes is None:  # removed in the meantime
+                del self.decimated[line]
+                continue
+            xdata, xnum, yfloat = self.decimated[line]
+            line.set_data(*minmax_decimate(xdata, xnum, yfloat, xlim, nbins))
+
+    def report(self, text):
+        """
+        tell the user about a problem with the data to plot
+
+        :param text: str, message to show
+        """
+        HelpWindow(self.mparent, text)
+
     def image(self, mdata, limits=None):
         """
         Plot the current 2D data as an image. Use either default limits or provided limits
@@ -200,9 +447,13 @@ class MplCanvas(FigureCanvasQTAgg):
         except AttributeError:
             pass
         try:
-            self.im = self.axes.imshow(mdata)
+            if (self.pyramid_above and numpy.ndim(mdata) == 2 and numpy.size(mdata) > self.pyramid_above and
+                    numpy.asarray(mdata[:1, :1]).dtype.kind in "biuf"):
+                self.im = self.pyramid_image(mdata)
+            else:
+                self.im = self.axes.imshow(mdata)
         except TypeError:
-            HelpWindow(self, "Likely you tried to make an image of text data. \n"
+            self.report("Likely you tried to make an image of text data. \n"
                              "Maybe this is a table and not a matrix? Check with 's'.")
             return
         if limits is not None:
@@ -210,9 +461,278 @@ class MplCanvas(FigureCanvasQTAgg):
             self.im.axes.set_ylim(limits["ylim"])
             self.im.set_clim(limits["clim"])
             self.im.set_cmap(limits["cmap"])
+        elif self.fixed_clim is not None:
+            self.im.set_clim(self.fixed_clim)
         self.cb = self.fig.colorbar(self.im, ax=self.axes, shrink=0.8)
+        if isinstance(self.im, PyramidImage):
+            return
+        # image, title and colorbar are excluded from the full draw, this way they can be redrawn on top of a
+        # stored background when only the data changes (see update_image)
+        self.im.set_animated(True)
+        self.axes.title.set_animated(True)
+        self.cb.ax.set_animated(True)
         return
 
+    @staticmethod
+    def grid_key(mlabel):
+        """
+        identity of coordinate data: the token of the value set in the MyQLabel (kept by copies) or the array itself,
+        and its shape, e.g. selecting a subset makes it a different grid
+
+        :param mlabel: MyQLabel or copy of it
+        :return: tuple, usable as dictionary key
+        """
+        token = getattr(mlabel, "token", None)
+        if token is None:
+            token = ("id", id(mlabel.datavalue))
+        return token, numpy.shape(mlabel.datavalue)
+
+    def pyramid_image(self, mdata):
+        """
+        add mdata as PyramidImage, the axes are set up the same way imshow does it
+
+        :param mdata: 2D array to display
+        :return: PyramidImage
+        """
+        # the pyramid always puts row i at y=i, upper origin is done by inverting the y-axis
+        mimage = PyramidImage(self.axes, mdata)
+        self.view_in_background(mimage)
+        self.axes.add_image(mimage)
+        self.axes.set_aspect(plt.rcParams["image.aspect"])
+        xmin, xmax, ymin, ymax = mimage.bounds
+        self.axes.set_xlim(xmin, xmax)
+        if plt.rcParams["image.origin"] == "upper":
+            self.axes.set_ylim(ymax, ymin)
+        else:
+            self.axes.set_ylim(ymin, ymax)
+        return mimage
+
+    def swath_image(self, xcorners, ycorners, mdata):
+        """
+        add a curvilinear field as SwathImage
+
+        :param xcorners: 2D array (M+1, N+1), x-coordinates of the cell corners
+        :param ycorners: 2D array (M+1, N+1), y-coordinates of the cell corners
+        :param mdata: 2D array (M, N)
+        :return: SwathImage
+        """
+        mimage = SwathImage(self.axes, xcorners, ycorners, mdata)
+        self.view_in_background(mimage)
+        self.axes.add_image(mimage)
+        self.axes.update_datalim(mimage.data_limits())
+        self.axes.autoscale_view()
+        return mimage
+
+    def view_in_background(self, mimage):
+        """
+        let mimage compute the pixels of new views in the background (if render_in_background is set)
+
+        :param mimage: ViewDependentImage
+        """
+        if self.render_in_background:
+            mimage.render_later = self.render_later
+
+    def render_later(self, mimage, view):
+        """
+        :param mimage: ViewDependentImage
+        :param view: tuple (x0, x1, y0, y1, nx, ny) to compute
+        :return: bool, True if the view is computed in the background, False if it has to be computed right now
+        """
+        if self.printing:
+            return False
+        if self.view_renderer is None:
+            self.view_renderer = ViewRenderer()
+            self.view_renderer.ready.connect(self.on_view_ready)
+        self.view_renderer.request(mimage, view)
+        return True
+
+    def stop_workers(self):
+        """stop computing views in the background, e.g. before the window closes"""
+        if self.view_renderer is not None:
+            self.view_renderer.stop()
+
+    def on_view_ready(self, mimage, generation, view, mdata, extent):
+        """
+        show the pixels computed in the background, unless a newer view was requested in the meantime
+        """
+        if generation != mimage.generation or mimage.axes is None:
+            return
+        mimage.show_view(view, mdata, extent)
+        mimage.requested = None
+        self.draw_idle()
+
+    def blit_ready(self):
+        """
+        :return: bool, True if the current plot is an image that can be updated by blitting
+        """
+        return (isinstance(self.im, AxesImage) and self.im.get_animated() and self.im.axes is self.axes and
+                self.cb is not None and self.cb.ax in self.fig.axes)
+
+    def draw_animated(self, image_only=False):
+        """
+        draw the image, title and colorbar, followed by everything in the axes that belongs on top of the image
+        (e.g. lines or spines, they are in the background already, but would be hidden by the image)
+
+        :param image_only: bool, True to leave out title and colorbar
+        """
+        self.axes.draw_artist(self.im)
+        for artist in self.axes.get_children():
+            if (isinstance(artist, (Line2D, Collection, Spine)) and artist.get_visible() and
+                    not artist.get_animated() and artist.get_zorder() > self.im.get_zorder()):
+                self.axes.draw_artist(artist)
+        if image_only:
+            return
+        self.axes.draw_artist(self.axes.title)
+        self.fig.draw_artist(self.cb.ax)
+
+    def on_draw(self, event):
+        """
+        After a full draw, store the figure without the animated artists as background and add them on top
+        :param event: draw event
+        """
+        if self.printing or not self.blit_ready():
+            self.background = None
+            return
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.blit_bbox = None
+        self.draw_animated()
+
+    def blit_image(self, image_only=False):
+        """
+        restore the background, redraw image, title and colorbar and only repaint the region they cover
+
+        :param image_only: bool, True if title and colour bar did not change, only the axes are redrawn
+        """
+        if image_only:
+            # the spines are drawn again on top of the image, include their outer half
+            bbox = self.axes.bbox.padded(4)
+            # the restored part is given in pixels from the top left corner of the background
+            height = self.fig.bbox.height
+            self.restore_region(self.background, bbox=(bbox.x0, height - bbox.y1, bbox.x1, height - bbox.y0),
+                                xy=(0, 0))
+            self.draw_animated(image_only=True)
+            self.blit(bbox)
+            return
+        renderer = self.get_renderer()
+        self.restore_region(self.background)
+        self.draw_animated()
+        bbox = Bbox.union([self.axes.bbox, self.axes.title.get_window_extent(renderer),
+                           self.cb.ax.get_tightbbox(renderer)])
+        # tick labels of the previous colorbar might have been larger
+        if self.blit_bbox is not None:
+            bbox = Bbox.union([bbox, self.blit_bbox])
+        self.blit_bbox = bbox
+        self.blit(bbox)
+
+    def set_norm(self, is_log, clim=None):
+        """
+        switch the colour scale of the image between linear and log, without rebuilding the image
+
+        :param is_log: bool, True for a log colour scale
+        :param clim: tuple of floats, colour limits, default are the current ones
+        :return: None, raises ValueError if log is requested, but the limits are not positive
+        """
+        if clim is None:
+            clim = self.im.get_clim()
+        if is_log:
+            if min(*clim) <= 0:
+                raise ValueError("log colour scale needs positive limits")
+            self.im.set_norm(LogNorm(*clim))
+        else:
+            self.im.set_norm(Normalize(*clim))
+
+    def set_log(self, is_log):
+        """
+        toggle between linear and log colour scale of the image keeping the colour limits, updated by blitting
+
+        :param is_log: bool, True for a log colour scale
+        :return: bool, True if it worked, False if the image has to be redone with image(), raises ValueError as
+                 set_norm
+        """
+        if self.background is None or not self.blit_ready():
+            return False
+        self.set_norm(is_log)
+        self.blit_image()
+        return True
+
+    def update_image(self, mdata, limits=None, is_log=False, title=None):
+        """
+        Fast path of image(): keep the image and colorbar, only replace the data and colour scale and blit.
+        Only possible if an image of the same shape is shown already
+
+        :param mdata: 2D array to display
+        :param limits: dictionary with keys xlim, ylim, clim and cmap, None for limits of the data
+        :param is_log: bool, True for a log colour scale
+        :param title: str, new title for the axes, None to keep the current one
+        :return: bool, True if it worked, False if the image has to be redone with image(), raises ValueError as
+                 set_norm
+        """
+        if self.background is None or not self.blit_ready():
+            return False
+        # the image might show coloured frames of an animation, see show_rgba
+        if numpy.shape(mdata) != self.im.get_array().shape[:2]:
+            return False
+        try:
+            self.im.set_data(mdata)
+        except TypeError:
+            return False
+        if limits is not None:
+            self.im.set_cmap(limits["cmap"])
+            clim = limits["clim"]
+        elif self.fixed_clim is not None:
+            clim = self.fixed_clim
+        else:
+            # set_data masks invalid values already
+            values = ma.asarray(self.im.get_array())
+            if values.count() > 0:
+                clim = (values.min(), values.max())
+            else:
+                clim = None
+        self.set_norm(is_log, clim)
+        if title is not None:
+            self.axes.set_title(title)
+        self.blit_image()
+        return True
+
+    def color_lookup(self):
+        """
+        :return: tuple of a copy of the current norm and the lookup table of the colour map, for helper_tools.colorize
+        """
+        return copy.copy(self.im.norm), self.im.get_cmap()(numpy.linspace(0, 1, 256), bytes=True)
+
+    def show_rgba(self, rgba):
+        """
+        show already coloured data in place of the image (e.g. frames of an animation) by blitting, the colour bar
+        is kept. Only the colours are exchanged, no colour mapping or full draw is done
+
+        :param rgba: array (M, N, 4) of uint8 of the shape of the image
+        :return: bool, True if it worked, False if the image can not be exchanged like this
+        """
+        if self.background is None or not self.blit_ready() or isinstance(self.im, PyramidImage):
+            return False
+        if rgba.shape[:2] != self.im.get_array().shape[:2]:
+            return False
+        self.im.set_data(rgba)
+        self.blit_image(image_only=True)
+        return True
+
+    def print_figure(self, *args, **kwargs):
+        """saving needs the animated artists in the normal draw"""
+        animated = [artist for artist in (self.im, self.axes.title, getattr(self.cb, "ax", None))
+                    if artist is not None and artist.get_animated()]
+        self.printing = True
+        for artist in animated:
+            artist.set_animated(False)
+        try:
+            super(MplCanvas, self).print_figure(*args, **kwargs)
+        finally:
+            for artist in animated:
+                artist.set_animated(True)
+            self.printing = False
+            self.background = None
+            self.blit_bbox = None
+            self.draw_idle()
+
     def change_scatter_size(self, value):
         """
         To change the scatter plot dot size with the slider
@@ -281,40 +801,119 @@ class MplCanvas(FigureCanvasQTAgg):
                  (newlaty[-1, :] + dlatx[-1, :]).reshape(1, -1)))
             return newlon, newlat
 
-        def remove_mask(xin, yin, zin):
+        def edges2d(xin, yin, shape):
             """
-            If there are masked values in the x or y coordinates, it is not
-            possible to use pcolormesh and pcolor would need to be used. That is
-            very slow. Instead, make sure that those values are also masked in
-            the z-data and replace the masked values in the grid with the
-            smallest unmasked ones in the grid.
+            Cell edges for 2D x and y coordinates. If the grid has the same size as the z data, it is extended with
+            adjustgrid. If there are masked values in the x or y coordinates, it is not possible to use pcolormesh
+            and pcolor would need to be used. That is very slow. Instead, replace the masked values in the grid with
+            the smallest unmasked ones in the grid and return the mask to apply to the z-data.
 
             Parameters:
             -----------
-            xin: 2D array (M, N)
+            xin: 2D array (M, N) or (M+1, N+1)
                 x coordinate array
-            yin: 2D array  (M, N)
+            yin: 2D array (M, N) or (M+1, N+1)
                 y coordinate array
-            zin: 2D array (M, N)
-                z-data array
+            shape: tuple (M, N)
+                shape of the z-data
 
             Returns:
             --------
-            lon: 2D array (M, N)
-                new x array without masked values
-            lat: 2D array (M, N)
-                new y array without masked values
-            zdata: 2D array (M, N)
-                additionally masks all values that were masked in the grid
+            lon: 2D array (M+1, N+1)
+                x edges without masked values
+            lat: 2D array (M+1, N+1)
+                y edges without masked values
+            mymask: 2D bool array (M, N) or None
+                z-data to mask because of masked grid coordinates
+            cellmask: 2D bool array (M, N) or None
+                cells with at least one masked corner
+            """
+            if tuple([zentry + 1 for zentry in shape]) == xin.shape:
+                lon, lat = xin, yin
+            else:  # assume grid has the same size as zarray
+                lon, lat = adjustgrid(xin, yin)
+            if not (ma.is_masked(lon) or ma.is_masked(lat)):
+                return lon, lat, None, None
+            print("there are masked values in the grid coordinats.\n "
+                  "Make a crude fix, pcolor is too slow!")
+            mymask = ma.getmaskarray(lon)[:-1, 1:]
+            corners = ma.getmaskarray(lon) | ma.getmaskarray(lat)
+            cellmask = corners[:-1, :-1] | corners[1:, :-1] | corners[:-1, 1:] | corners[1:, 1:]
+            lon = ma.filled(lon, lon.min())
+            lat = ma.filled(lat, lat.min())
+            return lon, lat, mymask, cellmask
+
+        def edges1d(xin, yin, shape):
             """
-            lon = np.copy(xin)
-            lon[xin.mask] = xin.min()
-            lat = np.copy(yin)
-            lat[yin.mask] = yin.min()
-            mymask = zin.mask | xin.mask[:-1, 1:]
-            zdata = ma.array(np.copy(zin[:].data), mask=mymask)
-            return lon, lat, zdata
+            Cell edges for 1D x and y coordinates that have the length of a dimension of the z-data: they are made one
+            longer, the outer boundaries are shifted by the nearest difference. Masked values in the grid are
+            replaced, the affected z-data is returned as mask.
 
+            Parameters:
+            -----------
+            xin: 1D array
+                x coordinate array
+            yin: 1D array
+                y coordinate array
+            shape: tuple (M, N)
+                shape of the z-data
+
+            Returns:
+            --------
+            xxnew: 1D array
+                x edges without masked values
+            yynew: 1D array
+                y edges without masked values
+            gridmask: 2D bool array (M, N) or None
+                z-data to mask because of masked grid coordinates
+            """
+            if xin.size in shape:
+                # make xx one longer. Shift outer boundaries by the nearest diff
+                # if xx is an array of timedelta, /2 does not work, but *0.5 does
+                xdiff = ma.diff(xin) * 0.5
+                xxnew = xdiff + xin[:-1]
+                xxnew = ma.concatenate((xin[:1] - xdiff[0], xxnew, xin[-1:] + xdiff[-1]))
+            else:
+                xxnew = ma.asarray(xin)
+            if yin.size in shape:
+                # if yy is an array of timedelta, /2 does not work, but *0.5 does
+                ydiff = ma.diff(yin) * 0.5
+                yynew = ydiff + yin[:-1]
+                yynew = ma.concatenate((yin[:1] - ydiff[0], yynew, yin[-1:] + ydiff[-1]))
+            else:
+                yynew = ma.asarray(yin)
+            # handle masks in the x-y axis
+            if not (ma.getmaskarray(xxnew).any() or ma.getmaskarray(yynew).any()):
+                return xxnew, yynew, None
+            xxnew = ma.copy(xxnew)
+            yynew = ma.copy(yynew)
+            # find indices that are masked in the grid coordinates
+            indxs_maskx = np.arange(len(xxnew))[ma.getmaskarray(xxnew)]
+            indxs_masky = np.arange(len(yynew))[ma.getmaskarray(yynew)]
+            # since the grid gives borders, the data point before also
+            # needs to be masked out, but not if the first grid is masked
+            indxs_maskx2 = indxs_maskx - 1
+            indxs_masky2 = indxs_masky - 1
+            indxs_maskx2 = indxs_maskx2[indxs_maskx2 > 0]
+            indxs_masky2 = indxs_masky2[indxs_masky2 > 0]
+            indxs_maskx = indxs_maskx[indxs_maskx < len(xxnew) - 1]
+            indxs_masky = indxs_masky[indxs_masky < len(yynew) - 1]
+            # also, if the masked grid boundary is the last (n), then only
+            # the data position at (n-1) has to be masked out, (n) does
+            # not exist.
+            # mask those coordinates out in the data grid
+            gridmask = np.zeros(shape, dtype=bool)
+            gridmask[indxs_masky, :] = True
+            gridmask[:, indxs_maskx] = True
+            gridmask[indxs_masky2, :] = True
+            gridmask[:, indxs_maskx2] = True
+            xxnew[xxnew.mask] = xxnew.min()
+            yynew[yynew.mask] = yynew.min()
+            return xxnew, yynew, gridmask
+
+        self.axes.title.set_animated(False)
+        self.mesh_grid = None
+        self.scatter_buffers = None
         try:
             self.cb.remove()
         except AttributeError:
@@ -323,6 +922,9 @@ class MplCanvas(FigureCanvasQTAgg):
             pass
         except ValueError:
             pass
+        # mask of the data because of masked grid coordinates and whether the data had to be transposed
+        gridmask = None
+        transposed = False
         try:
             xx = x.datavalue
             yy = y.datavalue
@@ -332,96 +934,156 @@ class MplCanvas(FigureCanvasQTAgg):
                     xx = xx[only_indices]
                     yy = yy[only_indices]
                     cc = cc[only_indices]
-                self.im = self.axes.scatter(xx, yy, c=cc, s=self.scatter_dot_size)
-                if self.sc_size_slider is None:
-                    self.sc_size_slider = self.toolbar.addWidget(self.change_size)
-            elif (xx.shape == yy.shape) and (xx.ndim != 1):
-                if tuple([zentry + 1 for zentry in cc.shape]) == xx.shape:
-                    try:
-                        self.im = self.axes.pcolormesh(xx, yy, cc)
-                    except ValueError:
-                        print("The data is one less than the grid, no fix but\n"
-                              "there are masked values in the grid coordinats.\n "
-                              "Make a crude fix, pcolor is too slow!")
-                        newx, newy, newz = remove_mask(xx, yy, cc)
-                        self.im = self.axes.pcolormesh(newx, newy, newz)
-                else:  # assume grid has the same size as zarray
-                    xnew, ynew = adjustgrid(xx, yy)
-                    try:
-                        self.im = self.axes.pcolormesh(xnew, ynew, cc)
-                    except ValueError:
-                        print(
-                            "The data is same size as the grid, a fix applied\n"
-                            "and there are masked values in the grid coordinats.\n "
-                            "Make a crude fix, pcolor is too slow!")
-                        lon, lat, zdata = remove_mask(xnew, ynew, cc)
-                        self.im = self.axes.pcolormesh(lon, lat, zdata)
-                        # self.im = self.axes.pcolor(lon, lat, zdata)
-            elif (xx.ndim == 1) & (yy.ndim == 1):
-                # this sould mean that both xx and yy are 1D and together form the shape of cc
-                if xx.size in cc.shape:
-                    # make xx one longer. Shift outer boundaries by the nearest diff
-                    # if xx is an array of timedelta, /2 does not work, but *0.5 does
-                    xdiff = ma.diff(xx) * 0.5
-                    xxnew = xdiff + xx[:-1]
-                    xxnew = ma.concatenate((xx[:1] - xdiff[0], xxnew, xx[-1:] + xdiff[-1]))
+                if (self.density_above and cc.size > self.density_above and
+                        all(numpy.asarray(entr).dtype.kind in "biuf" for entr in (xx, yy, cc))):
+                    self.im = DensityImage(self.axes, xx, yy, cc, statistic=self.density_statistic)
+                    self.view_in_background(self.im)
+                    self.axes.add_image(self.im)
+                    self.axes.update_datalim(self.im.data_limits())
+                    self.axes.autoscale_view()
                 else:
-                    xxnew = xx
-                if yy.size in cc.shape:
-                    # if yy is an array of timedelta, /2 does not work, but *0.5 does
-                    ydiff = ma.diff(yy) * 0.5
-                    yynew = ydiff + yy[:-1]
-                    yynew = ma.concatenate((yy[:1] - ydiff[0], yynew, yy[-1:] + ydiff[-1]))
-                else:
-                    yynew = yy
-                # handle masks in the x-y axis
-                if xxnew.mask.any() or yynew.mask.any():
-                    xxnew = ma.copy(xxnew)
-                    yynew = ma.copy(yynew)
-                    # find indices that are masked in the grid coordinates
-                    indxs_maskx = np.arange(len(xxnew))[xxnew.mask]
-                    indxs_masky = np.arange(len(yynew))[yynew.mask]
-                    # since the grid gives borders, the data point before also
-                    # needs to be masked out, but not if the first grid is masked
-                    indxs_maskx2 = indxs_maskx - 1
-                    indxs_masky2 = indxs_masky - 1
-                    indxs_maskx2 = indxs_maskx2[indxs_maskx2 > 0]
-                    indxs_masky2 = indxs_masky2[indxs_masky2 > 0]
-                    indxs_maskx = indxs_maskx[indxs_maskx < len(xxnew) - 1]
-                    indxs_masky = indxs_masky[indxs_masky < len(yynew) - 1]
-                    # also, if the masked grid boundary is the last (n), then only
-                    # the data position at (n-1) has to be masked out, (n) does
-                    # not exist.
-                    ccnew = np.ma.copy(cc)
-                    # mask those coordinates out in the data grid
-                    ccnew.mask = ma.getmaskarray(ccnew)
-                    ccnew.mask[indxs_masky, :] = True
-                    ccnew.mask[:, indxs_maskx] = True
-                    ccnew.mask[indxs_masky2, :] = True
-                    ccnew.mask[:, indxs_maskx2] = True
-                    xxnew[xxnew.mask] = xxnew.min()
-                    yynew[yynew.mask] = yynew.min()
+                    self.im = self.axes.scatter(xx, yy, c=cc, s=self.scatter_dot_size)
+                    if self.sc_size_slider is None and self.toolbar is not None:
+                        self.sc_size_slider = self.toolbar.addWidget(self.change_size)
+            elif ((xx.shape == yy.shape) and (xx.ndim != 1)) or ((xx.ndim == 1) & (yy.ndim == 1)):
+                # this sould mean that either x and y are a 2D grid or both xx and yy are 1D and together form the
+                # shape of cc. The edges are cached, so plotting again on the same grid skips their computation
+                key = (self.grid_key(x), self.grid_key(y), cc.shape)
+                cached = GRID_CACHE.get(key)
+                if cached is None:
+                    if xx.ndim == 1:
+                        cached = dict(zip(("x", "y", "mask"), edges1d(xx, yy, cc.shape)), cells=None)
+                    else:
+                        cached = dict(zip(("x", "y", "mask", "cells"), edges2d(xx, yy, cc.shape)))
+                    # the coordinates are kept in the entry, so their ids can not be reused while it exists
+                    cached["coordinates"] = (xx, yy)
+                    GRID_CACHE.set(key, cached)
+                xxnew, yynew, gridmask = cached["x"], cached["y"], cached["mask"]
+                if gridmask is not None:
+                    ccnew = ma.array(ma.getdata(cc), mask=ma.getmaskarray(cc) | gridmask)
                 else:
                     ccnew = cc
-                try:
+                if (xx.ndim != 1 and self.swath_above and cc.size > self.swath_above and
+                        all(numpy.asarray(entr).dtype.kind in "biuf" for entr in (xx, yy, cc))):
+                    # too many cells for a QuadMesh, rasterize them for the current view instead. Cells with a
+                    # masked corner are left out completely, their replaced corners would make them huge
+                    if cached["cells"] is not None:
+                        gridmask = gridmask | cached["cells"]
+                        ccnew = ma.array(ma.getdata(cc), mask=ma.getmaskarray(cc) | gridmask)
+                    self.im = self.swath_image(xxnew, yynew, ccnew)
+                elif xx.ndim != 1:
                     self.im = self.axes.pcolormesh(xxnew, yynew, ccnew)
-                except TypeError as exc1:
-                    HelpWindow(self, "careful: z data is transposed to fit x and y")
-                    self.im = self.axes.pcolormesh(xxnew, yynew, ccnew.T)
+                else:
+                    try:
+                        self.im = self.axes.pcolormesh(xxnew, yynew, ccnew)
+                    except TypeError as exc1:
+                        self.report("careful: z data is transposed to fit x and y")
+                        self.im = self.axes.pcolormesh(xxnew, yynew, ccnew.T)
+                        transposed = True
             else:
-                HelpWindow(self.mparent, "the dimensions seem wrong\n"
-                                         "xdim: " + str(xx.shape) + " ydim: " +
-                           str(yy.shape) + " zdim: " + str(xx.shape))
+                self.report("the dimensions seem wrong\n"
+                            "xdim: " + str(xx.shape) + " ydim: " +
+                            str(yy.shape) + " zdim: " + str(xx.shape))
                 return False
         except Exception as exc1:
-            HelpWindow(self.mparent, "something went really wrong, please report this error " + str(exc1))
+            self.report("something went really wrong, please report this error " + str(exc1))
             return False
+        if cc.ndim == 2:
+            self.mesh_grid = {"x": xx, "y": yy, "mask": gridmask, "transposed": transposed}
+        if self.fixed_clim is not None and getattr(self.im, "statistic", None) != "count":
+            self.im.set_clim(self.fixed_clim)
         self.cb = self.fig.colorbar(self.im, ax=self.axes)
         self.axes.set_xlabel(x.name_value)
         self.axes.set_ylabel(y.name_value)
         self.axes.set_title(z.name_value)
         return True
 
+    def append_scatter(self, x, y, z):
+        """
+        Fast path of pcolormesh() for adding points to a scatter plot: the offsets and colours of the existing
+        scatter are kept in buffers with spare room, only the new points are converted and copied. The colour limits
+        are widened to the new points, which updates the colorbar once.
+        Only possible if the current plot is a scatter plot (not binned into pixels) and stays below density_above
+
+        :param x: 1D array, x-coordinates of the new points
+        :param y: 1D array, y-coordinates of the new points
+        :param z: 1D array, values of the new points
+        :return: True if the points were added, False if the plot has to be made again with pcolormesh
+        """
+        if not isinstance(self.im, Collection) or isinstance(self.im, (QuadMesh, LineCollection)):
+            return False
+        if self.scatter_buffers is None:
+            self.scatter_buffers = (AppendBuffer(self.im.get_offsets()), AppendBuffer(self.im.get_array()))
+        offsets, colours = self.scatter_buffers
+        if self.density_above and len(offsets) + len(z) > self.density_above:
+            return False
+        # like scatter, masked points are left out
+        valid = ~(ma.getmaskarray(x) | ma.getmaskarray(y) | ma.getmaskarray(z))
+        if not valid.all():
+            x, y, z = x[valid], y[valid], z[valid]
+        if len(z) == 0:
+            return True
+        try:
+            new_offsets = numpy.column_stack([numpy.asarray(self.axes.convert_xunits(ma.getdata(x)), dtype=float),
+                                              numpy.asarray(self.axes.convert_yunits(ma.getdata(y)), dtype=float)])
+            new_colours = numpy.asarray(ma.getdata(z), dtype=float)
+        except (TypeError, ValueError):
+            return False
+        offsets.append(new_offsets)
+        colours.append(new_colours)
+        self.im.set_offsets(offsets.values)
+        self.im.set_array(colours.values)
+        self.axes.update_datalim(new_offsets)
+        self.axes.autoscale_view()
+        vmin, vmax = self.im.get_clim()
+        finite = new_colours[numpy.isfinite(new_colours)]
+        if finite.size > 0 and (finite.min() < vmin or finite.max() > vmax):
+            self.im.set_clim(min(vmin, finite.min()), max(vmax, finite.max()))
+        return True
+
+    def update_mesh(self, x, y, z, limits=None):
+        """
+        Fast path of pcolormesh(): keep the QuadMesh (or SwathImage), its grid and the colorbar, only exchange the
+        colour values.
+        Only possible if the last pcolormesh was done with the same x and y
+
+        :param x: x-coordinate used for the current plot
+        :param y: y-coordinate used for the current plot
+        :param z: new 2D data, same shape as the current one
+        :param limits: dictionary with keys xlim, ylim, clim and cmap, None for colour limits of the data
+        :return: bool, True if it worked, False if pcolormesh() is needed
+        """
+        if self.mesh_grid is None or not isinstance(self.im, (QuadMesh, SwathImage)) or self.im.axes is not self.axes:
+            return False
+        if x.datavalue is not self.mesh_grid["x"] or y.datavalue is not self.mesh_grid["y"]:
+            return False
+        cc = z.datavalue
+        if isinstance(self.im, SwathImage):
+            ncells = self.im.valid.size
+        else:
+            ncells = self.im.get_array().size
+        if cc.ndim != 2 or cc.size != ncells:
+            return False
+        mask = ma.getmaskarray(cc)
+        if self.mesh_grid["mask"] is not None:
+            if self.mesh_grid["mask"].shape != cc.shape:
+                return False
+            mask = mask | self.mesh_grid["mask"]
+        cc = ma.array(ma.getdata(cc), mask=mask)
+        if self.mesh_grid["transposed"]:
+            cc = cc.T
+        if isinstance(self.im, SwathImage):
+            self.im.set_values(cc)
+        else:
+            self.im.set_array(cc.reshape(self.im.get_array().shape))
+        if limits is not None:
+            self.set_axis_values(limits)
+        elif self.fixed_clim is not None:
+            self.im.set_norm(Normalize(*self.fixed_clim))
+        elif cc.count() > 0:
+            self.im.set_norm(Normalize(cc.min(), cc.max()))
+        return True
+
     @property
     def get_axis_values(self):
         """
@@ -443,11 +1105,108 @@ class MplCanvas(FigureCanvasQTAgg):
         self.im.set_cmap(mdict["cmap"])
 
 
+def make_canvas(parent=None, canvas="matplotlib", **kwargs):
+    """
+    canvas for images with sliders, both kinds have the same interface for images
+
+    :param parent: parent QT app
+    :param canvas: string matplotlib or qimage, the latter only draws images, but at a higher frame rate
+    :param kwargs: passed through to the canvas
+    :return: MplCanvas or ImageCanvas
+    """
+    if canvas == "qimage":
+        return ImageCanvas(parent=parent, **kwargs)
+    return MplCanvas(parent=parent, **kwargs)
+
+
+class ScalingChooser(QComboBox):
+    """
+    Choice of the colour limits of sliced data: those of each slice, or fixed for all slices to the minimum and
+    maximum or to the percentiles of the whole variable. The fixed ones are computed in the background and can be
+    chosen once they are ready.
+    """
+
+    def __init__(self, mdata, on_change, percentile=2, **kwargs):
+        """
+        :param mdata: the whole variable (array or netCDF4 variable), read chunk by chunk
+        :param on_change: function called without arguments when another scaling was chosen
+        :param percentile: float, the robust limits are the percentile and 100 - percentile
+        :param kwargs: passed to QComboBox
+        """
+        super(ScalingChooser, self).__init__(**kwargs)
+        self.percentile = float(percentile)
+        self.on_change = on_change
+        self.limits = {}
+        self.addItem("colours per slice")
+        self.addItem("global min/max (computing)")
+        self.addItem("{:g}-{:g} % (computing)".format(self.percentile, 100 - self.percentile))
+        for row in (1, 2):
+            self.model().item(row).setEnabled(False)
+        self.currentIndexChanged.connect(self.on_index)
+        self.worker = ColourLimitsWorker(mdata, self.percentile)
+        self.worker.result.connect(self.on_result)
+        self.worker.start()
+
+    @property
+    def clim(self):
+        """tuple of the chosen fixed colour limits, None for the limits of each slice"""
+        return self.limits.get(self.currentIndex())
+
+    def on_result(self, limits):
+        if limits is None:
+            self.setItemText(1, "global min/max (not available)")
+            self.setItemText(2, "{:g}-{:g} % (not available)".format(self.percentile, 100 - self.percentile))
+            return
+        self.limits = {1: limits["global"], 2: limits["robust"]}
+        self.setItemText(1, "global min/max: {:.4g} - {:.4g}".format(*limits["global"]))
+        self.setItemText(2, "{:g}-{:g} %: {:.4g} - {:.4g}".format(self.percentile, 100 - self.percentile,
+                                                                  *limits["robust"]))
+        for row in (1, 2):
+            self.model().item(row).setEnabled(True)
+
+    def on_index(self, index):
+        self.on_change()
+
+    def stop(self):
+        self.worker.requestInterruption()
+        self.worker.wait()
+
+
+def stop_workers(window):
+    """
+    stop all background jobs of a plot window (animation frames, views, colour limits), so nothing reads the file
+    any more once the window is closed
+
+    :param window: plot window, e.g. Fast2D
+    """
+    for chooser in window.findChildren(DataChooser):
+        chooser.stop_workers()
+    for scaling in window.findChildren(ScalingChooser) + [getattr(window, "scaling", None)]:
+        if scaling is not None:
+            scaling.stop()
+    for canvas in window.findChildren(MplCanvas) + [getattr(window, "myfigure", None)]:
+        if isinstance(canvas, MplCanvas):
+            canvas.stop_workers()
+
+
 # noinspection PyUnresolvedReferences
 class DataChooser(QWidget):
     """Class to handle data with 3 or 4 dimensions: includes sliders for the choice of 2D slides"""
 
-    def __init__(self, parent, is3d=True, is4d=False, is3dspecial=False, dimnames=None, **kwargs):
+    def __init__(self, parent, is3d=True, is4d=False, is3dspecial=False, dimnames=None, animation_fps=10,
+                 animation_cache_mb=256, full_data=None, robust_percentile=2, **kwargs):
+        """
+        :param parent: Fast3D or Fast2D window, needs update_plot and shape
+        :param is3d: bool, True for sliders of the slice dimension
+        :param is4d: bool, True for a second slice index
+        :param is3dspecial: False or tuple of (lengths, dimension numbers) of the slice dimensions
+        :param dimnames: list of strings, names of the dimensions
+        :param animation_fps: int, initial frames per second of the playback through the slices
+        :param animation_cache_mb: int, memory for frames rendered ahead of the playback
+        :param full_data: the whole variable the slices are taken from, to offer colour limits fixed for all slices
+        :param robust_percentile: float, the robust colour limits are this and 100 - this percentile of full_data
+        :param kwargs: passed to QWidget
+        """
         super().__init__(**kwargs)
         layout4 = QHBoxLayout()
         layout5 = QVBoxLayout()
@@ -563,6 +1322,29 @@ class DataChooser(QWidget):
         self.log_button = QPushButton("plot log")
         self.log_button.clicked.connect(self.on_log)
         layout5.addWidget(self.log_button)
+        self.scaling = None
+        if full_data is not None and (is3d or is3dspecial):
+            self.scaling = ScalingChooser(full_data, self.on_scaling, robust_percentile)
+            layout5.addWidget(self.scaling)
+        self.renderer = None
+        self.animation_cache_mb = int(animation_cache_mb)
+        self.play_timer = QTimer(self)
+        self.play_timer.timeout.connect(self.on_frame)
+        if is3d and hasattr(parent, "slice_data"):
+            layout6 = QHBoxLayout()
+            self.play_button = QPushButton("play")
+            self.play_button.clicked.connect(self.on_play)
+            self.fps_box = QSpinBox()
+            self.fps_box.setRange(1, 60)
+            self.fps_box.setValue(int(animation_fps))
+            self.fps_box.setSuffix(" fps")
+            self.fps_box.valueChanged.connect(self.on_fps)
+            export_button = QPushButton("export")
+            export_button.clicked.connect(self.on_export)
+            layout6.addWidget(self.play_button)
+            layout6.addWidget(self.fps_box)
+            layout6.addWidget(export_button)
+            layout5.addLayout(layout6)
         buttons2.setLayout(layout5)
         layout4.addWidget(buttons2)
         self.setLayout(layout4)
@@ -599,6 +1381,7 @@ class DataChooser(QWidget):
             HelpWindow(self, "You need to type an integer")
 
     def on_log(self):
+        self.stop_playing()
         if self.is_log:
             self.is_log = False
             self.log_button.setText("put log")
@@ -630,7 +1413,13 @@ class DataChooser(QWidget):
                 _ = self.mparent.update_plot(self.is_log)
         return
 
+    def on_scaling(self):
+        """use the chosen colour limits for this and all following slices"""
+        self.mparent.myfigure.fixed_clim = self.scaling.clim
+        self.update_slice()
+
     def on_freeze(self):
+        self.stop_playing()
         if self.is3d or self.is3dspecial:
             if self.frozen:
                 self.frozen = False
@@ -655,6 +1444,112 @@ class DataChooser(QWidget):
                     _ = self.mparent.update_plot(
                         self.active_index, self.active_dimension, self.frozen, self.is_log)
 
+    def animation_indices(self):
+        """
+        :return: list of indices of the active dimension in the order they are played, starting after the current one
+        """
+        mymax = self.mparent.shape[self.active_dimension]
+        start = self.active_index % mymax
+        return [(start + step) % mymax for step in range(1, mymax + 1)]
+
+    def frame_renderer(self):
+        """
+        :return: FrameRenderer for the active dimension with the current colour scale, or None if there is no image
+        """
+        try:
+            norm, lut = self.mparent.myfigure.color_lookup()
+        except AttributeError:
+            return None
+        frame_bytes = 4 * int(numpy.prod(self.mparent.myfigure.im.get_array().shape[:2]))
+        max_frames = max(2, self.animation_cache_mb * 2 ** 20 // frame_bytes)
+        dimension = self.active_dimension
+        if self.is4d:
+            index2, dimension2 = self.active_index2, self.active_dimension2
+        else:
+            index2, dimension2 = None, None
+
+        def get_slice(index):
+            return self.mparent.slice_data(index, dimension, index2, dimension2)
+        return FrameRenderer(get_slice, self.animation_indices(), norm, lut, max_frames)
+
+    def on_play(self):
+        if self.renderer is not None:
+            self.stop_playing()
+            return
+        self.renderer = self.frame_renderer()
+        if self.renderer is None:
+            HelpWindow(self, "there is no image to animate")
+            return
+        self.renderer.failed.connect(self.on_render_failed)
+        self.renderer.start()
+        self.play_button.setText("pause")
+        self.play_timer.start(int(1000 / self.fps_box.value()))
+
+    def on_fps(self, value):
+        if self.play_timer.isActive():
+            self.play_timer.setInterval(int(1000 / value))
+
+    def on_frame(self):
+        """show the next frame if it is rendered already, otherwise try again at the next tick"""
+        mymax = self.mparent.shape[self.active_dimension]
+        index = (self.active_index + 1) % mymax
+        frame = self.renderer.get(index)
+        if frame is None:
+            return
+        if not self.mparent.myfigure.show_rgba(frame):
+            self.stop_playing()
+            HelpWindow(self, "this image cannot be animated, please step through the slices instead")
+            return
+        self.active_index = index
+        self.renderer.set_playhead(index)
+        self.entry.setText(str(index))
+
+    def stop_workers(self):
+        """stop the playback and the colour limits in the background without showing anything"""
+        self.play_timer.stop()
+        if self.renderer is not None:
+            self.renderer.requestInterruption()
+            self.renderer.wait()
+            self.renderer = None
+        if self.scaling is not None:
+            self.scaling.stop()
+
+    def on_render_failed(self, error):
+        self.stop_playing()
+        HelpWindow(self, "the slices could not be read for the animation: " + error)
+
+    def stop_playing(self):
+        """stop the playback and show the data of the current slice"""
+        self.play_timer.stop()
+        if self.renderer is None:
+            return
+        self.renderer.requestInterruption()
+        self.renderer.wait()
+        self.renderer = None
+        self.play_button.setText("play")
+        self.update_slice()
+
+    def on_export(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "Export slices", "",
+                                                  "Animated GIF (*.gif);;PNG images, one per slice (*.png)")
+        if not filename:
+            return
+        self.stop_playing()
+        renderer = self.frame_renderer()
+        if renderer is None:
+            HelpWindow(self, "there is no image to export")
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            mymax = self.mparent.shape[self.active_dimension]
+            number = export_frames((renderer.render(index) for index in range(mymax)), filename, self.fps_box.value())
+        except (OSError, ValueError) as exc:
+            HelpWindow(self, "the slices could not be exported: " + str(exc))
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        print(number, " slices exported to ", filename)
+
     def update_dim_label(self, value):
         if self.is3d:
             self.active_dimension = value
@@ -728,6 +1623,10 @@ class DataChooser(QWidget):
             self.update_slice()
 
     def update_slice(self):
+        if self.renderer is not None:
+            # stop_playing shows the chosen slice
+            self.stop_playing()
+            return
         if self.is3d or self.is3dspecial:
             if not self.is4d:
                 worked = self.mparent.update_plot(self.active_index, self.active_dimension, self.frozen, self.is_log)
@@ -802,6 +1701,7 @@ class Fast2D_select(QMainWindow):
                 mydata_dims[str(idx)] = np.arange(sh)
         self.mydims = mydata_dims
         self.is_log = False
+        self.plotted_axes = None
         self.layout = QVBoxLayout()
         try:
             self.shape = mydata.shape
@@ -858,6 +1758,8 @@ class Fast2D_select(QMainWindow):
         buttonlayout.addWidget(entry_area, alignment=Qt.AlignBottom)
         self.layout.addWidget(buttonarea)
         xylayout.addWidget(self.log_button, alignment=Qt.AlignTop)
+        self.scaling = ScalingChooser(mydata, self.on_scaling, kwargs.get("robust_percentile", 2))
+        xylayout.addWidget(self.scaling, alignment=Qt.AlignTop)
         mainwindow = QWidget()
         mainwindow.setLayout(self.layout)
         self.indices = {self.dimnames.index(dim): 0 for dim in self.currentdimnames}
@@ -874,6 +1776,11 @@ class Fast2D_select(QMainWindow):
         self.show()
         return
 
+    def closeEvent(self, event):
+        # background jobs must not read the file after the window is gone
+        stop_workers(self)
+        super(Fast2D_select, self).closeEvent(event)
+
     def on_log(self):
         if self.is_log:
             self.is_log = False
@@ -887,6 +1794,10 @@ class Fast2D_select(QMainWindow):
             self.log_button.setText("put log")
             _ = self.update_plot(self.is_log, False)
 
+    def on_scaling(self):
+        self.myfigure.fixed_clim = self.scaling.clim
+        self.update_plot(self.is_log, False)
+
     def savedata(self):
         newwindow = Savewindow(self, name_adding=self.newname)
         newwindow.show()
@@ -1040,10 +1951,24 @@ class Fast2D_select(QMainWindow):
     def update_plot(self, is_log=False, isnew=False):
         xdim = self.mydims[self.xentry.currentText()]
         ydim = self.mydims[self.yentry.currentText()]
+        plotted_axes = (self.xentry.currentText(), self.yentry.currentText())
+        if isnew or self.master.config["moreDdata"]["newplotwindow"]:
+            self.plotted_axes = None
+        elif plotted_axes == self.plotted_axes:
+            # same axes as the current image, only the data and the title change
+            try:
+                if self.myfigure.update_image(self.subdata, is_log=is_log, title=self.newname):
+                    return True
+            except ValueError:
+                _ = HelpWindow(
+                    self, "it seems there are 0 or negative values.\n "
+                          "Before putting log, adjust limits \nand keep the values. Change back to lin for now.")
+                return False
         if isnew or self.master.config["moreDdata"]["newplotwindow"]:
             layout2 = QVBoxLayout()
             plotwindow = QWidget()
-            self.myfigure = MplCanvas(parent=self, **self.plotdict)
+            self.myfigure = make_canvas(parent=self, **self.plotdict)
+            self.myfigure.fixed_clim = self.scaling.clim
             layout2.addWidget(self.myfigure.toolbar)
             layout2.addWidget(self.myfigure, stretch=1)
             plotwindow.setLayout(layout2)
@@ -1137,7 +2062,7 @@ class Fast2D_select(QMainWindow):
                 self, "it seems there are 0 or negative values.\n "
                       "Before putting log, adjust limits \nand keep the values. Change back to lin for now.")
             return False
-
+        self.plotted_axes = plotted_axes
         return True
 
 
@@ -1275,6 +2200,8 @@ class Fast2D(QMainWindow):  # only_indices does currently not work for 2D x-y-z
         if mname is None:
             mname = '2D Viewer'
         self.mydata = mydata
+        # x, y and z of the scatter plot with room to append more granules, see add_to_plot
+        self.append_buffers = None
         try:
             self.shape = mydata.shape
         except AttributeError:
@@ -1286,7 +2213,9 @@ class Fast2D(QMainWindow):  # only_indices does currently not work for 2D x-y-z
             is4d = len(is3dsp[0]) > 1
         else:
             is4d = False
-        my_slider = DataChooser(self, is3d=False, is4d=is4d, is3dspecial=is3dsp)
+        my_slider = DataChooser(self, is3d=False, is4d=is4d, is3dspecial=is3dsp,
+                                full_data=self.odata.z.datavalue if is3dsp else None,
+                                robust_percentile=kwargs.get("robust_percentile", 2))
         # my_slider2 = DataChooser(self, is3d=False, is3dspecial=is3dsp)
         self.active_button = QPushButton("make active")
         self.active_button.clicked.connect(self.make_active)
@@ -1347,6 +2276,11 @@ class Fast2D(QMainWindow):  # only_indices does currently not work for 2D x-y-z
         self.show()
         return
 
+    def closeEvent(self, event):
+        # background jobs must not read the file after the window is gone
+        stop_workers(self)
+        super(Fast2D, self).closeEvent(event)
+
     def add_to_plot(self, mydata, only_indices=None, symbol=None):
         if only_indices is not None:
             newx = mydata.x.copy()
@@ -1386,12 +2320,17 @@ class Fast2D(QMainWindow):  # only_indices does currently not work for 2D x-y-z
             return
         else:
             if self.mydata.datavalue.ndim == 1:
-                self.x.datavalue = numpy.r_[self.x.datavalue, newx.datavalue]
-                self.y.datavalue = numpy.r_[self.y.datavalue, newy.datavalue]
-                self.mydata.datavalue = numpy.r_[self.mydata.datavalue, newz.datavalue]
-                self.myfigure.cb.remove()
-                self.myfigure.im.remove()
-                worked = self.myfigure.pcolormesh(self.x, self.y, self.mydata)
+                # the data of all granules is kept in buffers with room to append, the k-th granule only costs
+                # its own size instead of copying all before it again
+                if self.append_buffers is None:
+                    self.append_buffers = tuple(AppendBuffer(entr.datavalue) for entr in (self.x, self.y, self.mydata))
+                for entr, buffer, new in zip((self.x, self.y, self.mydata), self.append_buffers, (newx, newy, newz)):
+                    buffer.append(new.datavalue)
+                    entr.datavalue = buffer.values
+                if not self.myfigure.append_scatter(newx.datavalue, newy.datavalue, newz.datavalue):
+                    self.myfigure.cb.remove()
+                    self.myfigure.im.remove()
+                    worked = self.myfigure.pcolormesh(self.x, self.y, self.mydata)
             else:
                 self.myfigure.pcolormesh(newx, newy, newz)
         self.myfigure.draw()
@@ -1530,8 +2469,8 @@ class Fast2Dplus(Fast2D):
         print("the indices to use are: ", active_index, idx2)
         if frozen:
             axesvalues = self.myfigure.get_axis_values
-        self.myfigure.cb.remove()
-        self.myfigure.im.remove()  # set_visible(False)
+        else:
+            axesvalues = None
         if 0 in self.my_ext_dim:
             if active_index < self.odata.z.datavalue.shape[0]:
                 self.mydata.datavalue = self.odata.z.datavalue[active_index]
@@ -1577,12 +2516,13 @@ class Fast2Dplus(Fast2D):
                     self.mydata.datavalue = self.odata.z.datavalue[:, :, active_index, idx2]
                 else:
                     HelpWindow(self, "this dimension has not " + str(idx2) + " entries. choose lower number")
-        if frozen:
+        # x and y do not change with the level, so the mesh can be kept and only gets the new colours
+        if not self.myfigure.update_mesh(self.x, self.y, self.mydata, axesvalues):
+            self.myfigure.cb.remove()
+            self.myfigure.im.remove()  # set_visible(False)
             worked = self.myfigure.pcolormesh(self.x, self.y, self.mydata)
-            self.myfigure.set_axis_values(axesvalues)
-        else:
-            worked = self.myfigure.pcolormesh(self.x, self.y, self.mydata)
-        self.myfigure.draw()
+            if frozen:
+                self.myfigure.set_axis_values(axesvalues)
 
         # maybe the below only is done if not frozen.
         if is_log:
@@ -1622,9 +2562,10 @@ class Fast1D(QMainWindow):
             self.myfigure.toolbar.actions()[7].triggered.connect(self.add_interactivity)
         except:
             pass
-        self.lassos = []
+        self.lasso = None
+        self.point_indices = []
+        self.selection = None
         self.symbol = symbol
-        self.current_idx = []
         self.active_button = QPushButton("make active")
         self.active_button.clicked.connect(self.make_active)
         self.swap_axes_button = QPushButton("swap axes")
@@ -1660,40 +2601,40 @@ class Fast1D(QMainWindow):
         self.myfigure.fig.set_tight_layout(True)
         self.show()
 
+    def closeEvent(self, event):
+        # background jobs must not read the file after the window is gone
+        stop_workers(self)
+        super(Fast1D, self).closeEvent(event)
+
     def swap_axes(self):
-        ax = self.myfigure.fig.axes[0]
-        linelist = ax.get_lines()
-        linelist2 = linelist.copy()
-        maxx = -1e33
-        minx = 1e33
-        maxy = -1e33
-        miny = 1e33
-        for line in linelist:
-            y, x = line.get_data()
+        """exchange x and y of all lines in place, with a single redraw"""
+        ax = self.myfigure.axes
+        joined = [artist for artist in self.myfigure.row_labels if artist.axes is ax]
+        if any(self.myfigure.row_labels[artist][2] for artist in joined):
+            HelpWindow(self, "datetime axes cannot be swapped")
+            return
+        swapped = []
+        for line in ax.get_lines():
+            if line in self.myfigure.row_labels:
+                continue
+            y, x = self.myfigure.full_data(line)
             try:
-                if isinstance(x[0], datetime.datetime) or isinstance(y[0],
-                                                                     datetime.datetime):  ### x sometimes not indexable?
+                if is_datetime(x[0]) or is_datetime(y[0]):  ### x sometimes not indexable?
                     HelpWindow(self, "datetime axes cannot be swapped")
                     return
-                else:
-                    pass
             except IndexError:
-                linelist2.remove(line)
                 line.remove()
-        for line in linelist2:
-            y, x = line.get_data()
-            yname, xname = line.get_label().split(" vs ")
-            xname = xname.strip()
-            yname = yname.strip()
-            # print(yname, xname)
-            ylabel = " vs ".join([xname, yname])
-            xx = MyQLabel("x", x)
-            xx.set(x, xname)
-            yy = MyQLabel("y", y)
-            yy.set(y, yname)
-            self.mydata = Data(x=xx, y=yy)
-            line.remove()
-            self.update_plot(self.mydata, self.symbol, self.only_indices)
+                continue
+            swapped.append((line, x, y))
+        maxx = -1e33
+        minx = 1e33
+        maxy = -1e33
+        miny = 1e33
+        for line, x, y in swapped:
+            self.myfigure.set_line_data(line, x, y)
+            names = line.get_label().split(" vs ")
+            if len(names) == 2:
+                line.set_label(" vs ".join([names[1].strip(), names[0].strip()]))
             try:
                 maxx = max(numpy.nanmax(x), maxx)
                 minx = min(numpy.nanmin(x), minx)
@@ -1704,11 +2645,34 @@ class Fast1D(QMainWindow):
                 miny = min(numpy.nanmin(y), miny)
             except:
                 print(type(y), y)
+        for artist in joined:
+            x, y = self.myfigure.swap_rows(artist)
+            maxx = max(numpy.nanmax(x), maxx)
+            minx = min(numpy.nanmin(x), minx)
+            maxy = max(numpy.nanmax(y), maxy)
+            miny = min(numpy.nanmin(y), miny)
+        if swapped:
+            line, x, y = swapped[-1]
+            xname, yname = (line.get_label().split(" vs ") + [""])[:2]
+            xx = MyQLabel("x", x)
+            xx.set(x, xname.strip())
+            yy = MyQLabel("y", y)
+            yy.set(y, yname.strip())
+            self.mydata = Data(x=xx, y=yy)
+        for pindex in self.point_indices:
+            pindex.swap_axes()
+        xlabel = ax.get_xlabel()
+        ax.set_xlabel(ax.get_ylabel())
+        ax.set_ylabel(xlabel)
         # print("x: ", minx, maxx)
         # print("y: ", miny, maxy)
         ax.set_xlim([minx, maxx])
         ax.set_ylim([miny, maxy])
-        self.myfigure.draw()
+        try:
+            self.add_interactivity()
+        except Exception as exc:
+            print(exc)
+            self.myfigure.draw()
 
     def open_save_dialog(self):
         idxs = np.arange(len(self.current_idx))[self.current_idx]
@@ -1718,28 +2682,72 @@ class Fast1D(QMainWindow):
     def make_active(self):
         self.master.active1D = self
 
-    def onselect(self, hh, xdata, ydata):
-        def onsel(verts, my_hh=hh, my_xdata=xdata, my_ydata=ydata):
-            if isinstance(my_ydata[0], datetime.datetime):
-                my_ydata = dates.date2num(my_ydata)
-            if isinstance(my_xdata[0], datetime.datetime):
-                my_xdata = dates.date2num(my_xdata)
-            pts = [(xi, yi) for xi, yi in zip(my_xdata, my_ydata)]
-            path = Path(verts)
-            try:
-                idxs = numpy.nonzero(path.contains_points(pts))[0]
-                mask = numpy.full([len(pts), ], fill_value=False)
-                mask[idxs] = True
-                labelx, labely = [entr.strip() for entr in my_hh.split("vs")]
-                self.current_idx = np.full(xdata.shape, False)
-                self.current_idx[idxs] = True
-                # if self.master.config["Plotsettings"]["open_save_dialog"]:
-                #    newwindow = Savewindow(self, indices=idxs)
-                #    newwindow.show()
-            except Exception as ex:
-                HelpWindow(self, "There was a problem selecting: " + str(ex))
-
-        return onsel
+    @property
+    def current_idx(self):
+        """
+        :return: 1D array of bool, True for the points selected with the lasso, empty list if nothing is selected
+        """
+        if self.selection is None:
+            return []
+        packed, size = self.selection
+        return numpy.unpackbits(packed, count=size).astype(bool)
+
+    @current_idx.setter
+    def current_idx(self, mask):
+        if len(mask) == 0:
+            self.selection = None
+        else:
+            self.selection = (numpy.packbits(mask), len(mask))
+
+    def plot_rows(self, x, rows, labels, symbol=False):
+        """
+        plot many rows at once with a few artists, see MplCanvas.plot_rows. With a symbol all rows are one selectable
+        scatter: the lasso selects a point index (a column of the rows) if the point of any row is inside the lasso
+        or on its outline.
+
+        :param x: 1D array x values of all rows or 2D array, x values of each row
+        :param rows: 2D array y values, one row per line
+        :param labels: list of strings, one label per row
+        :param symbol: marker to plot the points with, False for lines, then nothing can be selected
+        """
+        self.myfigure.plot_rows(x, rows, labels, marker=symbol or None)
+        if symbol:
+            self.add_selectable(ma.resize(x, numpy.shape(rows)).ravel(), ma.ravel(rows),
+                                rowlength=numpy.shape(rows)[1])
+
+    def add_selectable(self, xdata, ydata, rowlength=None):
+        """
+        make the points of a scatter plot selectable with the lasso of the axes
+
+        :param xdata: 1D array of x values
+        :param ydata: 1D array of y values
+        :param rowlength: int, for the points of several rows one after the other: number of points per row
+        """
+        try:
+            self.point_indices.append(PointIndex(xdata, ydata, rowlength=rowlength))
+        except ValueError as exc:
+            print("points cannot be selected: ", exc)
+            return
+        if self.lasso is None or self.lasso.ax is not self.myfigure.axes:
+            self.lasso = LassoSelector(self.myfigure.axes, self.onselect)
+
+    def onselect(self, verts):
+        """
+        select the points of all scatter plots inside the lasso, a point index is selected if the point of any of
+        the plots is inside
+
+        :param verts: list of (x, y) vertices of the lasso
+        """
+        if len(verts) < 3 or not self.point_indices:
+            return
+        try:
+            size = max(pindex.size for pindex in self.point_indices)
+            mask = numpy.zeros(size, dtype=bool)
+            for pindex in self.point_indices:
+                mask[:pindex.size] |= pindex.select(verts)
+            self.current_idx = mask
+        except Exception as ex:
+            HelpWindow(self, "There was a problem selecting: " + str(ex))
 
     def update_plot(self, mydata, symbol=False, oi=None):
         if mydata.y.datavalue.ndim > 1:
@@ -1752,49 +2760,74 @@ class Fast1D(QMainWindow):
                         " or either for x or y only 1 column/ row and that the length of the x and y data is equal.")
                 alllabel2 = mydata.x.text().split(":")[1].split("s.")[-1].split(" - ")
                 labcols = numpy.arange(int(alllabel2[0]), int(alllabel2[1]) + 1)
-                for row, col, lab, labcol in zip(mydata.y.datavalue, mydata.x.datavalue, labs, labcols):
+                xname = mydata.x.text().split(":")[1].split("s.")[0]
+                yname = mydata.y.text().split(":")[1].split("s.")[0]
+                nrows = min(len(mydata.y.datavalue), len(labs), len(labcols))
+                labels = [xname + " " + str(labcol) + " vs " + yname + " " + str(lab)
+                          for lab, labcol in zip(labs[:nrows], labcols[:nrows])]
+                if 0 < self.myfigure.join_rows_above < nrows:
+                    rows = mydata.y.datavalue[:nrows]
+                    cols = mydata.x.datavalue[:nrows]
                     if oi is not None:
-                        row = row[oi]
-                        col = col[oi]
-                    label = (mydata.x.text().split(":")[1].split("s.")[0] + " " + str(labcol) +
-                             " vs " + mydata.y.text().split(":")[1].split("s.")[0] +
-                             " " + str(lab))
-                    if symbol:
-                        self.myfigure.axes.plot(col, row, marker=symbol, lw=0, label=label)
-                        self.lassos.append(make_lasso(col, row, self.onselect, label, self.myfigure.axes))
-                    else:
-                        self.myfigure.axes.plot(col, row, label=label)
+                        rows = rows[:, oi]
+                        cols = cols[:, oi]
+                    self.plot_rows(cols, rows, labels, symbol)
+                else:
+                    for row, col, label in zip(mydata.y.datavalue, mydata.x.datavalue, labels):
+                        if oi is not None:
+                            row = row[oi]
+                            col = col[oi]
+                        if symbol:
+                            self.myfigure.axes.plot(col, row, marker=symbol, lw=0, label=label)
+                            self.add_selectable(col, row)
+                        else:
+                            self.myfigure.plot_line(col, row, label=label)
             else:
                 xdata = ma.copy(mydata.x.datavalue)
                 if oi is not None:
                     xdata = xdata[oi]
-                for row, lab in zip(mydata.y.datavalue, labs):
+                xname = mydata.x.text().split(":")[1]
+                yname = mydata.y.text().split(":")[1].split("s.")[0]
+                nrows = min(len(mydata.y.datavalue), len(labs))
+                labels = [xname + " vs " + yname + " " + str(lab) for lab in labs[:nrows]]
+                if 0 < self.myfigure.join_rows_above < nrows:
+                    rows = mydata.y.datavalue[:nrows]
                     if oi is not None:
-                        row = row[oi]
-                    label = (mydata.x.text().split(":")[1] + " vs " + mydata.y.text().split(":")[1].split("s.")[0] +
-                             " " + str(lab))
-                    if symbol:
-                        self.myfigure.axes.plot(xdata, row, marker=symbol, lw=0, label=label)
-                        self.lassos.append(make_lasso(xdata, row, self.onselect, label,
-                                                      self.myfigure.axes))
-                    else:
-                        self.myfigure.axes.plot(xdata, row, label=label)
+                        rows = rows[:, oi]
+                    self.plot_rows(xdata, rows, labels, symbol)
+                else:
+                    for row, label in zip(mydata.y.datavalue, labels):
+                        if oi is not None:
+                            row = row[oi]
+                        if symbol:
+                            self.myfigure.axes.plot(xdata, row, marker=symbol, lw=0, label=label)
+                            self.add_selectable(xdata, row)
+                        else:
+                            self.myfigure.plot_line(xdata, row, label=label)
         elif mydata.x.datavalue.ndim > 1:
             ydata = ma.copy(mydata.y.datavalue)
             if oi is not None:
                 ydata = ydata[oi]
             alllabel = mydata.x.text().split(":")[1].split("s.")[-1].split(" - ")
             labs = numpy.arange(int(alllabel[0]), int(alllabel[1]) + 1)
-            for row, lab in zip(mydata.x.datavalue, labs):
+            xname = mydata.x.text().split(":")[1].split("s.")[0]
+            yname = mydata.y.text().split(":")[1]
+            nrows = min(len(mydata.x.datavalue), len(labs))
+            labels = [xname + " " + str(lab) + " vs " + yname for lab in labs[:nrows]]
+            if 0 < self.myfigure.join_rows_above < nrows:
+                cols = mydata.x.datavalue[:nrows]
                 if oi is not None:
-                    row = row[oi]
-                label = (mydata.x.text().split(":")[1].split("s.")[0] + " " + str(lab) + " vs " +
-                         mydata.y.text().split(":")[1])
-                if symbol:
-                    self.myfigure.axes.plot(row, ydata, marker=symbol, lw=0, label=label)
-                    self.lassos.append(make_lasso(row, ydata, self.onselect, label, self.myfigure.axes))
-                else:
-                    self.myfigure.axes.plot(row, ydata, label=label)
+                    cols = cols[:, oi]
+                self.plot_rows(cols, ma.resize(ydata, cols.shape), labels, symbol)
+            else:
+                for row, label in zip(mydata.x.datavalue, labels):
+                    if oi is not None:
+                        row = row[oi]
+                    if symbol:
+                        self.myfigure.axes.plot(row, ydata, marker=symbol, lw=0, label=label)
+                        self.add_selectable(row, ydata)
+                    else:
+                        self.myfigure.plot_line(row, ydata, label=label)
         else:
             label = mydata.x.text().split(":")[1] + " vs " + mydata.y.text().split(":")[1]
             try:  # TODO this should be configurable
@@ -1815,10 +2848,15 @@ class Fast1D(QMainWindow):
                 ydata = ydata[oi]
             if symbol:
                 self.myfigure.axes.plot(xdata, ydata, marker=symbol, lw=0, label=label)
-                self.lassos.append(make_lasso(xdata, ydata, self.onselect, label, self.myfigure.axes))
+                self.add_selectable(xdata, ydata)
+            elif mydata.yerr.datavalue is None and mydata.xerr.datavalue is None:
+                self.myfigure.plot_line(xdata, ydata, label=label)
             else:
                 self.myfigure.axes.errorbar(xdata, ydata, yerr=mydata.yerr.datavalue,
                                             xerr=mydata.xerr.datavalue, label=label)
+        self.myfigure.axes.set_xlabel(mydata.x.text().split(":")[1])
+        self.myfigure.axes.set_ylabel(mydata.y.text().split(":")[1])
+        # legend, interactivity and drawing only once for all rows
         try:
             self.add_interactivity()
         except Exception as exc:
@@ -1826,9 +2864,6 @@ class Fast1D(QMainWindow):
             print("it seems that add_interactivity is not loaded. Check if the file is in pythonpath")
             HelpWindow(self, "either add_interactivity is not loaded, or you try to plot time axis in existing plot")
             return
-        self.myfigure.axes.set_xlabel(mydata.x.text().split(":")[1])
-        self.myfigure.axes.set_ylabel(mydata.y.text().split(":")[1])
-        self.myfigure.draw()
 
     def add_interactivity(self):
         try:
@@ -1840,21 +2875,6 @@ class Fast1D(QMainWindow):
         self.myfigure.draw()
 
 
-def make_lasso(xdata, ydata, mfunc, label, axis):
-    """
-    Activate a lasso selector on axis
-
-    :param xdata: x-indeces
-    :param ydata: y-indices
-    :param mfunc: Function to execute with the LassoSelector
-    :param label: str
-    :param axis: axis handle Axis to activate LassoSelector on
-    :return: Function LassoSelector activated on axis calling function myfunc
-    """
-    myfunc = mfunc(label, xdata, ydata)
-    return LassoSelector(axis, myfunc)
-
-
 class standalone:
     def __init__(self,mdata):
         self.app = QApplication([""])
@@ -1895,8 +2915,13 @@ class Fast3D(QMainWindow):
                 self.shape = mydata.shape
             except Exception as exc:
                 print("shape couldn't be determined, why? ", exc)
-            self.myfigure = MplCanvas(parent=self, **kwargs)
-            self.my_slider = DataChooser(self, is4d=self.is4d, dimnames=mydata_dims)
+            self.myfigure = make_canvas(parent=self, **kwargs)
+            self.current_slice = None
+            self.current_log = False
+            self.my_slider = DataChooser(self, is4d=self.is4d, dimnames=mydata_dims,
+                                         animation_fps=kwargs.get("animation_fps", 10),
+                                         animation_cache_mb=kwargs.get("animation_cache_mb", 256),
+                                         full_data=mydata, robust_percentile=kwargs.get("robust_percentile", 2))
             if self.is4d:
                 self.update_plot(0, 0, idx2=0, dim2=1)
             else:
@@ -1926,6 +2951,25 @@ class Fast3D(QMainWindow):
             self.palette = QDarkPalette()
             self.setPalette(self.palette)
 
+    def closeEvent(self, event):
+        # background jobs must not read the file after the window is gone
+        stop_workers(self)
+        super(Fast3D, self).closeEvent(event)
+
+    def slice_data(self, index, dimension, idx2=None, dim2=None):
+        """
+        :param index: integer Index in the first dimension
+        :param dimension: integer Number of the first dimension
+        :param idx2: integer Index in the second dimension
+        :param dim2: integer Number of the second dimension (of the full data)
+        :return: 2D array, the slice as shown by update_plot
+        """
+        key = [slice(None)] * self.mydata.ndim
+        key[dimension] = index
+        if dim2 is not None:
+            key[dim2] = idx2
+        return self.mydata[tuple(key)]
+
     def update_plot(self, index, dimension, hold_it=False, is_log=False, idx2=None, dim2=None):
         """
         :param idx2: integer Index in the second dimension
@@ -1975,6 +3019,24 @@ class Fast3D(QMainWindow):
                 HelpWindow(self,
                            "It seems you chose an index that does not exist. Maybe you changed slicing at high index")
                 return False
+        current_slice = (index, dimension, idx2, dim2)
+        if self.current_slice is not None and self.current_slice[1::2] == current_slice[1::2]:
+            # same orientation as the current image: only exchange data and colour scale
+            try:
+                if current_slice == self.current_slice and is_log != self.current_log:
+                    worked = self.myfigure.set_log(is_log)
+                else:
+                    worked = self.myfigure.update_image(
+                        newdata, self.myfigure.get_axis_values if hold_it else None, is_log)
+            except ValueError:
+                HelpWindow(self, "it seems there are 0 or negative values.\n "
+                                 "Before putting log, adjust limits \nand "
+                                 "keep the values. Change back to lin for now.")
+                return False
+            if worked:
+                self.current_slice = current_slice
+                self.current_log = is_log
+                return True
         if hold_it:
             self.myfigure.image(newdata, self.myfigure.get_axis_values)
             if is_log:
@@ -2012,6 +3074,8 @@ class Fast3D(QMainWindow):
         except RuntimeError:
             HelpWindow(self, "sorry, something bad happened")
         self.myfigure.fig.set_tight_layout(True)
+        self.current_slice = current_slice
+        self.current_log = is_log
         return True
 
 
@@ -0,0 +1,509 @@
+"""Canvas drawing 2D data directly into a QImage, a fast alternative to MplCanvas for images with sliders"""
+import copy
+import numpy as np
+from numpy import ma
+from PyQt5.QtCore import Qt, QRect, QPoint
+from PyQt5.QtGui import QImage, QPainter, QPalette, QColor
+from PyQt5.QtWidgets import QWidget, QToolBar, QLabel, QFileDialog
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm, Normalize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.ticker import MaxNLocator
+
+try:
+    from .helper_tools import colorize
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import colorize
+
+
+class ImageAxis(object):
+    """ticks and tick labels of one axis, set like for a matplotlib axis"""
+
+    def __init__(self):
+        self.ticks = None
+        self.labels = None
+        self.rotation = 0
+
+    def set_ticks(self, ticks):
+        self.ticks = list(ticks)
+        self.labels = None
+
+    def set_ticklabels(self, labels):
+        self.labels = [str(entr) for entr in labels]
+
+    def set_tick_params(self, rotation=None, **kwargs):
+        if rotation is not None:
+            self.rotation = rotation
+
+    def get_ticks(self, lower, upper):
+        """
+        :param lower: float, lower limit of the view
+        :param upper: float, upper limit of the view
+        :return: list of tuples (position, label) of the ticks in the view
+        """
+        lower, upper = min(lower, upper), max(lower, upper)
+        if self.ticks is None:
+            ticks = MaxNLocator(6, integer=True).tick_values(lower, upper)
+            labels = ["{:g}".format(entr) for entr in ticks]
+        else:
+            ticks = self.ticks
+            labels = self.labels if self.labels is not None else ["{:g}".format(entr) for entr in ticks]
+        return [(tick, label) for tick, label in zip(ticks, labels) if lower <= tick <= upper]
+
+
+class ImageAxes(object):
+    """labels, title and limits of the image, with the names of matplotlib axes"""
+
+    def __init__(self):
+        self.xlabel = ""
+        self.ylabel = ""
+        self.title = ""
+        self.xlim = (0, 1)
+        self.ylim = (1, 0)
+        self.xaxis = ImageAxis()
+        self.yaxis = ImageAxis()
+
+    def set_xlabel(self, label):
+        self.xlabel = str(label)
+
+    def get_xlabel(self):
+        return self.xlabel
+
+    def set_ylabel(self, label):
+        self.ylabel = str(label)
+
+    def get_ylabel(self):
+        return self.ylabel
+
+    def set_title(self, title):
+        self.title = str(title)
+
+    def get_title(self):
+        return self.title
+
+    def set_xlim(self, xlim, *args):
+        self.xlim = tuple(xlim) if not args else (xlim, args[0])
+
+    def get_xlim(self):
+        return self.xlim
+
+    def set_ylim(self, ylim, *args):
+        self.ylim = tuple(ylim) if not args else (ylim, args[0])
+
+    def get_ylim(self):
+        return self.ylim
+
+
+class ColorImage(object):
+    """data, norm and colour map of the image, with the methods of a matplotlib AxesImage"""
+
+    def __init__(self, mdata, axes, cmap=None):
+        self.axes = axes
+        self.data = None
+        self.norm = Normalize()
+        self.cmap = plt.get_cmap(cmap)
+        self.lut = None
+        self.set_data(mdata)
+        self.autoscale()
+
+    def set_data(self, mdata):
+        mdata = ma.masked_invalid(mdata)
+        if mdata.ndim != 2 or mdata.dtype.kind not in "biuf":
+            raise TypeError("only 2D numeric data can be shown as image")
+        self.data = mdata
+
+    def get_array(self):
+        return self.data
+
+    def autoscale(self):
+        if self.data.count() > 0:
+            self.norm.vmin, self.norm.vmax = float(self.data.min()), float(self.data.max())
+        else:
+            self.norm.vmin, self.norm.vmax = 0., 1.
+
+    def get_clim(self):
+        return self.norm.vmin, self.norm.vmax
+
+    def set_clim(self, vmin, vmax=None):
+        if vmax is None:
+            vmin, vmax = vmin
+        self.norm.vmin, self.norm.vmax = vmin, vmax
+
+    def set_norm(self, norm):
+        self.norm = norm
+
+    def get_cmap(self):
+        return self.cmap
+
+    def set_cmap(self, cmap):
+        self.cmap = plt.get_cmap(cmap)
+        self.lut = None
+
+    def get_lut(self):
+        """
+        :return: array (256, 4) of uint8, RGBA colours of the colour map
+        """
+        if self.lut is None:
+            self.lut = self.cmap(np.linspace(0, 1, 256), bytes=True)
+        return self.lut
+
+    def colors(self, mdata):
+        """
+        :param mdata: 2D array
+        :return: array (M, N, 4) of uint8, RGBA colours of mdata, masked values are transparent
+        """
+        return colorize(mdata, self.norm, self.get_lut())
+
+
+class ImageCanvas(QWidget):
+    """
+    Canvas for 2D data with the same interface as MplCanvas for images (image, update_image, set_log,
+    get_axis_values, ...). Only the visible part is sampled at the resolution of the widget and coloured with a
+    lookup table, so each frame costs about the same, independent of the size of the data. Mouse wheel zooms, drag
+    pans, double click resets the view. Saving uses matplotlib.
+    """
+
+    margins = (70, 30, 90, 60)  # left, top, right, bottom in pixels
+
+    def __init__(self, parent=None, width=4, height=4, dpi=150, **kwargs):
+        """
+        :param parent: parent QT app
+        :param width: float width in inches
+        :param height: float height in inches
+        :param dpi: int pixels per inch, with width and height only used for the initial size
+        :param kwargs: contains all other passed parameters (e.g. plotscheme), not used here
+        """
+        super(ImageCanvas, self).__init__(parent)
+        self.mparent = parent
+        self.resize(int(width * dpi * 0.7), int(height * dpi * 0.7))
+        self.setMinimumSize(200, 150)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setMouseTracking(True)
+        self.axes = ImageAxes()
+        self.fig = self
+        self.im = None
+        self.cb = None
+        # colour limits used for all data instead of those of the data shown
+        self.fixed_clim = None
+        self.frame = None
+        self.drag_start = None
+        self.toolbar = QToolBar(parent)
+        self.toolbar.addAction("Home", self.home)
+        self.toolbar.addAction("Save", self.save)
+        self.position = QLabel("")
+        self.toolbar.addWidget(self.position)
+
+    def image(self, mdata, limits=None):
+        """
+        Show the current 2D data as image. Use either default limits or provided limits
+
+        :param mdata: 2D array to display
+        :param limits: dictionary with keys xlim, ylim, clim and cmap
+        :return: None
+        """
+        cmap = None if self.im is None else self.im.get_cmap()
+        try:
+            self.im = ColorImage(mdata, self.axes, cmap)
+            self.frame = None
+        except TypeError:
+            self.im = None
+            raise
+        self.home(redraw=False)
+        if limits is not None:
+            self.set_axis_values(limits)
+        elif self.fixed_clim is not None:
+            self.im.set_clim(self.fixed_clim)
+        self.update()
+
+    def update_image(self, mdata, limits=None, is_log=False, title=None):
+        """
+        Replace the data of the current image, keeping the view. Only possible if an image of the same shape is shown
+
+        :param mdata: 2D array to display
+        :param limits: dictionary with keys xlim, ylim, clim and cmap, None for colour limits of the data
+        :param is_log: bool, True for a log colour scale
+        :param title: str, new title, None to keep the current one
+        :return: bool, True if it worked, False if image() is needed, raises ValueError as set_norm
+        """
+        if self.im is None or np.shape(mdata) != self.im.get_array().shape:
+            return False
+        try:
+            self.im.set_data(mdata)
+        except TypeError:
+            return False
+        self.frame = None
+        if limits is not None:
+            self.im.set_cmap(limits["cmap"])
+            clim = limits["clim"]
+        elif self.fixed_clim is not None:
+            clim = self.fixed_clim
+        else:
+            self.im.norm = Normalize()
+            self.im.autoscale()
+            clim = self.im.get_clim()
+        self.set_norm(is_log, clim)
+        if title is not None:
+            self.axes.set_title(title)
+        self.update()
+        return True
+
+    def set_norm(self, is_log, clim=None):
+        """
+        switch the colour scale of the image between linear and log
+
+        :param is_log: bool, True for a log colour scale
+        :param clim: tuple of floats, colour limits, default are the current ones
+        :return: None, raises ValueError if log is requested, but the limits are not positive
+        """
+        if clim is None:
+            clim = self.im.get_clim()
+        if is_log:
+            if min(*clim) <= 0:
+                raise ValueError("log colour scale needs positive limits")
+            self.im.set_norm(LogNorm(*clim))
+        else:
+            self.im.set_norm(Normalize(*clim))
+
+    def set_log(self, is_log):
+        """
+        toggle between linear and log colour scale of the image keeping the colour limits
+
+        :param is_log: bool, True for a log colour scale
+        :return: bool, True if it worked, False if there is no image yet
+        """
+        if self.im is None:
+            return False
+        self.set_norm(is_log)
+        self.update()
+        return True
+
+    def color_lookup(self):
+        """
+        :return: tuple of a copy of the current norm and the lookup table of the colour map, for helper_tools.colorize
+        """
+        return copy.copy(self.im.norm), self.im.get_lut()
+
+    def show_rgba(self, rgba):
+        """
+        show already coloured data in place of the image (e.g. frames of an animation), with the current colour bar
+
+        :param rgba: array (M, N, 4) of uint8 of the shape of the image
+        :return: bool, True if it worked, False if there is no image of that shape
+        """
+        if self.im is None or rgba.shape[:2] != self.im.get_array().shape:
+            return False
+        self.frame = rgba
+        self.repaint()
+        return True
+
+    @property
+    def get_axis_values(self):
+        """
+        return the current values for x, y and color axis, as well as colour map
+
+        :return: mdict, dictionary with keys clim, xlim, ylim and cmap
+        """
+        return {"clim": self.im.get_clim(), "xlim": self.axes.get_xlim(), "ylim": self.axes.get_ylim(),
+                "cmap": self.im.get_cmap()}
+
+    def set_axis_values(self, mdict):
+        self.im.set_clim(mdict["clim"])
+        self.axes.set_xlim(mdict["xlim"])
+        self.axes.set_ylim(mdict["ylim"])
+        self.im.set_cmap(mdict["cmap"])
+
+    def draw(self):
+        self.update()
+
+    def draw_idle(self):
+        self.update()
+
+    def set_tight_layout(self, tight):
+        """the layout of this canvas is always tight, only there for the MplCanvas interface"""
+        pass
+
+    def home(self, redraw=True):
+        """show the complete image, pixel centres are at integer positions like in imshow"""
+        if self.im is None:
+            return
+        nrow, ncol = self.im.get_array().shape
+        self.axes.set_xlim((-0.5, ncol - 0.5))
+        self.axes.set_ylim((nrow - 0.5, -0.5))
+        if redraw:
+            self.update()
+
+    def plot_rect(self):
+        left, top, right, bottom = self.margins
+        return QRect(left, top, max(self.width() - left - right, 1), max(self.height() - top - bottom, 1))
+
+    def to_data(self, point):
+        """
+        :param point: QPoint in widget coordinates
+        :return: tuple of floats, x and y in data coordinates
+        """
+        rect = self.plot_rect()
+        xlim = self.axes.get_xlim()
+        ylim = self.axes.get_ylim()
+        xval = xlim[0] + (point.x() - rect.left()) / rect.width() * (xlim[1] - xlim[0])
+        yval = ylim[1] + (point.y() - rect.top()) / rect.height() * (ylim[0] - ylim[1])
+        return xval, yval
+
+    def render(self, width, height):
+        """
+        sample the visible part of the data at the resolution of the plot area and colour it
+
+        :param width: int, width of the plot area in pixels
+        :param height: int, height of the plot area in pixels
+        :return: array (height, width, 4) of uint8
+        """
+        mdata = self.im.get_array()
+        xlim = self.axes.get_xlim()
+        ylim = self.axes.get_ylim()
+        cols = np.floor(xlim[0] + (np.arange(width) + 0.5) / width * (xlim[1] - xlim[0]) + 0.5).astype(np.int64)
+        rows = np.floor(ylim[1] + (np.arange(height) + 0.5) / height * (ylim[0] - ylim[1]) + 0.5).astype(np.int64)
+        validc = (cols >= 0) & (cols < mdata.shape[1])
+        validr = (rows >= 0) & (rows < mdata.shape[0])
+        rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        if validc.any() and validr.any():
+            if self.frame is not None:
+                rgba[np.ix_(validr, validc)] = self.frame[np.ix_(rows[validr], cols[validc])]
+            else:
+                rgba[np.ix_(validr, validc)] = self.im.colors(mdata[np.ix_(rows[validr], cols[validc])])
+        return rgba
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().color(QPalette.Window))
+        textcolor = self.palette().color(QPalette.WindowText)
+        painter.setPen(textcolor)
+        rect = self.plot_rect()
+        if self.im is not None:
+            try:
+                rgba = np.ascontiguousarray(self.render(rect.width(), rect.height()))
+                qimage = QImage(rgba.data, rect.width(), rect.height(), 4 * rect.width(), QImage.Format_RGBA8888)
+                painter.drawImage(rect, qimage)
+                self.draw_colorbar(painter, rect)
+            except (ValueError, ZeroDivisionError) as exc:
+                painter.drawText(rect, Qt.AlignCenter, "cannot show the data: " + str(exc))
+            self.draw_ticks(painter, rect)
+        painter.drawRect(rect)
+        metrics = painter.fontMetrics()
+        painter.drawText(QRect(rect.left(), 0, rect.width(), rect.top()), Qt.AlignCenter, self.axes.get_title())
+        painter.drawText(QRect(rect.left(), self.height() - metrics.height() - 2, rect.width(), metrics.height()),
+                         Qt.AlignCenter, self.axes.get_xlabel())
+        painter.save()
+        painter.translate(2, rect.top() + rect.height() // 2)
+        painter.rotate(-90)
+        painter.drawText(QRect(-rect.height() // 2, 0, rect.height(), metrics.height()), Qt.AlignCenter,
+                         self.axes.get_ylabel())
+        painter.restore()
+        painter.end()
+
+    def draw_ticks(self, painter, rect):
+        xlim = self.axes.get_xlim()
+        ylim = self.axes.get_ylim()
+        metrics = painter.fontMetrics()
+        for tick, label in self.axes.xaxis.get_ticks(*xlim):
+            xpos = int(rect.left() + (tick - xlim[0]) / (xlim[1] - xlim[0]) * rect.width())
+            painter.drawLine(xpos, rect.bottom(), xpos, rect.bottom() + 4)
+            painter.save()
+            painter.translate(xpos, rect.bottom() + 6)
+            painter.rotate(-self.axes.xaxis.rotation)
+            if self.axes.xaxis.rotation:
+                painter.drawText(-metrics.width(label), metrics.ascent(), label)
+            else:
+                painter.drawText(-metrics.width(label) // 2, metrics.ascent(), label)
+            painter.restore()
+        for tick, label in self.axes.yaxis.get_ticks(*ylim):
+            ypos = int(rect.top() + (ylim[1] - tick) / (ylim[1] - ylim[0]) * rect.height())
+            painter.drawLine(rect.left() - 4, ypos, rect.left(), ypos)
+            painter.drawText(rect.left() - 6 - metrics.width(label), ypos + metrics.ascent() // 2, label)
+
+    def draw_colorbar(self, painter, rect):
+        barrect = QRect(rect.right() + 15, rect.top() + rect.height() // 10, 15, rect.height() * 8 // 10)
+        colors = np.ascontiguousarray(self.im.get_lut()[::-1].reshape(256, 1, 4))
+        qimage = QImage(colors.data, 1, 256, 4, QImage.Format_RGBA8888)
+        painter.drawImage(barrect, qimage)
+        painter.drawRect(barrect)
+        vmin, vmax = self.im.get_clim()
+        if isinstance(self.im.norm, LogNorm):
+            middle = np.sqrt(vmin * vmax)
+        else:
+            middle = (vmin + vmax) / 2.
+        for value, ypos in ((vmax, barrect.top()), (middle, barrect.center().y()), (vmin, barrect.bottom())):
+            painter.drawText(barrect.right() + 4, ypos + painter.fontMetrics().ascent() // 2, "{:.3g}".format(value))
+
+    def wheelEvent(self, event):
+        if self.im is None:
+            return
+        xval, yval = self.to_data(event.pos())
+        # zoom in by 2 scrolling up, out scrolling down, around the mouse position
+        factor = 0.5 if event.angleDelta().y() > 0 else 2.
+        xlim = self.axes.get_xlim()
+        ylim = self.axes.get_ylim()
+        self.axes.set_xlim((xval - (xval - xlim[0]) * factor, xval + (xlim[1] - xval) * factor))
+        self.axes.set_ylim((yval - (yval - ylim[0]) * factor, yval + (ylim[1] - yval) * factor))
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start = (event.pos(), self.axes.get_xlim(), self.axes.get_ylim())
+
+    def mouseReleaseEvent(self, event):
+        self.drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.home()
+
+    def mouseMoveEvent(self, event):
+        if self.im is None:
+            return
+        if self.drag_start is not None:
+            start, xlim, ylim = self.drag_start
+            rect = self.plot_rect()
+            shift = event.pos() - start
+            dx = shift.x() / rect.width() * (xlim[1] - xlim[0])
+            dy = shift.y() / rect.height() * (ylim[0] - ylim[1])
+            self.axes.set_xlim((xlim[0] - dx, xlim[1] - dx))
+            self.axes.set_ylim((ylim[0] - dy, ylim[1] - dy))
+            self.update()
+        xval, yval = self.to_data(event.pos())
+        col, row = int(np.floor(xval + 0.5)), int(np.floor(yval + 0.5))
+        mdata = self.im.get_array()
+        if 0 <= row < mdata.shape[0] and 0 <= col < mdata.shape[1]:
+            self.position.setText("x={} y={} value={}".format(col, row, mdata[row, col]))
+        else:
+            self.position.setText("")
+
+    def save(self):
+        """export the current view with matplotlib"""
+        if self.im is None:
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "Save figure", "", "Images (*.png *.pdf *.svg *.jpg)")
+        if filename:
+            self.print_figure(filename)
+
+    def print_figure(self, filename, dpi=150):
+        """
+        :param filename: str, file to save the figure in, the format is taken from the extension
+        :param dpi: int, resolution
+        """
+        fig = Figure(figsize=(self.width() / 100., self.height() / 100.), dpi=dpi)
+        FigureCanvasAgg(fig)
+        axes = fig.add_subplot(111)
+        mimage = axes.imshow(self.im.get_array(), cmap=self.im.get_cmap(), norm=self.im.norm)
+        axes.set_xlim(self.axes.get_xlim())
+        axes.set_ylim(self.axes.get_ylim())
+        axes.set_xlabel(self.axes.get_xlabel())
+        axes.set_ylabel(self.axes.get_ylabel())
+        axes.set_title(self.axes.get_title())
+        for maxis, mine in ((axes.xaxis, self.axes.xaxis), (axes.yaxis, self.axes.yaxis)):
+            if mine.ticks is not None:
+                maxis.set_ticks(mine.ticks)
+                if mine.labels is not None:
+                    maxis.set_ticklabels(mine.labels)
+            maxis.set_tick_params(rotation=mine.rotation)
+        fig.colorbar(mimage, ax=axes, shrink=0.8)
+        fig.set_tight_layout(True)
+        fig.savefig(filename)
@@ -0,0 +1,357 @@
+"""Module for masks of compound conditions, kept with one bit per value and reused by name"""
+import os
+import re
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+try:
+    from .Expressions import Node, parse, read
+except (ImportError, ModuleNotFoundError):
+    from Expressions import Node, parse, read
+try:
+    from .helper_tools import IO_LOCK, iter_slabs
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import IO_LOCK, iter_slabs
+
+# number of set bits of each byte value
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+# names that cannot be names of masks in conditions
+RESERVED = ("and", "or", "not", "where", "mean", "median", "np", "numpy", "flag", "x", "y", "z", "misc")
+
+
+class PackedMask(object):
+    """boolean array stored with one bit per value, True where the condition holds. It does not change once made."""
+
+    def __init__(self, bits, shape, name="", text=""):
+        """
+        :param bits: 1D array of uint8, np.packbits of the flattened booleans, the unused bits of the last byte are 0
+        :param shape: tuple, shape of the boolean array
+        :param name: str, short name to use the mask in other conditions, e.g. m1
+        :param text: str, the condition
+        """
+        self.bits = bits
+        self.shape = tuple(shape)
+        self.name = name
+        self.text = text
+
+    @classmethod
+    def from_array(cls, values, name="", text=""):
+        """
+        :param values: array of booleans
+        :return: PackedMask
+        """
+        values = np.asarray(values, dtype=bool)
+        return cls(np.packbits(values.ravel()), values.shape, name, text)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def unpack(self):
+        """:return: array of booleans"""
+        return np.unpackbits(self.bits, count=self.size).view(bool).reshape(self.shape)
+
+    def count(self):
+        """:return: int, number of values where the condition holds"""
+        return int(POPCOUNT[self.bits].sum())
+
+    def combine(self, other, bits, operator):
+        if not isinstance(other, PackedMask) or other.shape != self.shape:
+            raise ValueError("masks of shape " + str(self.shape) + " and " + str(getattr(other, "shape", None)) +
+                             " cannot be combined")
+        return PackedMask(bits, self.shape, text="(" + self.text + ") " + operator + " (" + other.text + ")")
+
+    def __and__(self, other):
+        return self.combine(other, self.bits & other.bits, "and")
+
+    def __or__(self, other):
+        return self.combine(other, self.bits | other.bits, "or")
+
+    def __invert__(self):
+        bits = ~self.bits
+        if self.size % 8 and len(bits) > 0:
+            # keep the unused bits of the last byte 0
+            bits[-1] &= (0xFF << (8 - self.size % 8)) & 0xFF
+        return PackedMask(bits, self.shape, text="not (" + self.text + ")")
+
+    def __deepcopy__(self, memo):
+        # masks do not change, copies of plot data can share them
+        return self
+
+
+def apply_mask(values, mask):
+    """
+    :param values: array (can be masked)
+    :param mask: PackedMask or array of booleans of the shape of values, True for the values to keep
+    :return: masked array sharing the data of values, masked where values was masked or mask is False
+    """
+    if isinstance(mask, PackedMask):
+        keep = mask.unpack()
+    else:
+        keep = np.asarray(mask)
+        if keep.dtype != bool:
+            raise TypeError("the flag is no condition")
+    if keep.shape != np.shape(values):
+        raise IndexError("mask " + str(keep.shape) + " and values " + str(np.shape(values)) + " differ in shape")
+    return np.ma.masked_array(np.ma.getdata(values), mask=np.ma.getmaskarray(values) | ~keep, copy=False)
+
+
+class MaskNode(Node):
+    """PackedMask used in a condition, unpacked once when its values are needed"""
+
+    def __init__(self, mask):
+        """
+        :param mask: PackedMask
+        """
+        self.mask = mask
+        self.name = mask.name
+        self.key = ("mask", mask.name, id(mask))
+        self.shape = mask.shape
+        self.dtype = np.dtype(bool)
+        self.values = None
+
+    def compute(self, index, memo):
+        if self.values is None:
+            self.values = self.mask.unpack()
+        return read(self.values, index)
+
+    def sources(self):
+        return [self.mask]
+
+
+def flag_meanings(attributes):
+    """
+    :param attributes: dictionary of the attributes of a variable
+    :return: list of tuples (meaning, mask, value) of the CF attributes flag_meanings, flag_masks and flag_values,
+             mask or value is None if not given, the list is empty if the variable is no CF flag variable
+    """
+    meanings = str(attributes.get("flag_meanings", "")).split()
+    masks = np.atleast_1d(attributes["flag_masks"]).astype(np.int64) if "flag_masks" in attributes else None
+    values = np.atleast_1d(attributes["flag_values"]).astype(np.int64) if "flag_values" in attributes else None
+    if len(meanings) == 0 or (masks is None and values is None):
+        return []
+    if any(entr is not None and len(entr) != len(meanings) for entr in (masks, values)):
+        print("flag_meanings, flag_masks and flag_values have different lengths, they are not decoded")
+        return []
+    return [(meaning, None if masks is None else int(masks[idx]), None if values is None else int(values[idx]))
+            for idx, meaning in enumerate(meanings)]
+
+
+def decode_flags(variable, flags, max_elements=1000000):
+    """
+    decode all meanings of a flag variable in one pass, chunk by chunk: a value has a meaning if (value & mask) ==
+    value, if only the mask is given if (value & mask) != 0 and if only the value is given if it is equal. Masked
+    values have no meaning.
+
+    :param variable: netCDF4 variable or array of integers
+    :param flags: list of tuples (meaning, mask, value), see flag_meanings
+    :param max_elements: int, number of values read at once
+    :return: OrderedDict of meaning and PackedMask
+    """
+    shape = tuple(np.shape(variable))
+    dtype = np.dtype(variable.dtype)
+    # bitwise operations on the unsigned integers of the same size, negative flags are bit patterns as well
+    unsigned = np.dtype("u" + str(dtype.itemsize)) if dtype.kind in "iu" else np.dtype(np.uint64)
+    masks = np.array([-1 if mask is None else mask for _, mask, _ in flags], dtype=np.int64).astype(unsigned)
+    expected = np.array([0 if value is None else value for _, _, value in flags], dtype=np.int64).astype(unsigned)
+    expected &= masks
+    any_bit = np.array([value is None for _, _, value in flags])[:, None]
+    packed = [[] for _ in flags]
+    carry = np.zeros((len(flags), 0), dtype=bool)
+    for slab in iter_slabs(shape, max_elements):
+        with IO_LOCK:
+            chunk = variable[slab] if len(slab) > 0 else variable[...]
+        values = np.ma.getdata(chunk).astype(np.int64 if dtype.kind not in "iu" else dtype).astype(unsigned).ravel()
+        planes = values[None, :] & masks[:, None]
+        planes = np.where(any_bit, planes != 0, planes == expected[:, None])
+        planes &= ~np.ma.getmaskarray(chunk).ravel()[None, :]
+        # only whole bytes are packed, the rest goes on with the next chunk
+        planes = np.concatenate([carry, planes], axis=1)
+        usable = planes.shape[1] // 8 * 8
+        for idx, plane in enumerate(np.packbits(planes[:, :usable], axis=1)):
+            packed[idx].append(plane)
+        carry = planes[:, usable:]
+    result = OrderedDict()
+    for idx, (meaning, _, _) in enumerate(flags):
+        bits = np.concatenate(packed[idx] + [np.packbits(carry[idx])])
+        result[meaning] = PackedMask(bits, shape, meaning, meaning)
+    return result
+
+
+class FlagMeaning(object):
+    """one meaning of a CF flag variable, shown below the variable in the file tree, f uses it as flag"""
+
+    def __init__(self, variable, meaning, path=None, engine=None):
+        """
+        :param variable: netCDF4 variable with flag_meanings and flag_masks and/ or flag_values
+        :param meaning: str, one of the flag_meanings
+        :param path: key of the decoded masks, default is variable_key(variable)
+        :param engine: MaskEngine keeping the decoded masks, default MASKS
+        """
+        self.variable = variable
+        self.meaning = meaning
+        self.name = meaning
+        self.path = path
+        self.engine = engine
+        self.shape = variable.shape
+        self.ndim = variable.ndim
+        self.dimensions = variable.dimensions
+        self.dtype = np.dtype(bool)
+
+    def mask(self):
+        """:return: PackedMask of the meaning, all meanings of the variable are decoded at the first call"""
+        engine = self.engine if self.engine is not None else MASKS
+        return engine.flag_masks(self.variable, self.path)[self.meaning]
+
+    def group(self):
+        return self.variable.group()
+
+    def ncattrs(self):
+        return ["flag_variable", "flag_meaning"]
+
+    def getncattr(self, key):
+        return {"flag_variable": self.variable.name, "flag_meaning": self.meaning}[key]
+
+    def __getitem__(self, key):
+        return self.mask().unpack()[key]
+
+
+def reference_to(source):
+    """
+    :param source: object whose id is part of a key
+    :return: callable giving source, or None once source is gone (weak reference if possible, so that the cache
+             does not keep data alive)
+    """
+    try:
+        return weakref.ref(source)
+    except TypeError:
+        return lambda: source
+
+
+class MaskEngine(object):
+    """
+    compound conditions over several variables, e.g. "1 < flag <= 5 and not (z > 100 or m1)". Each result is kept
+    as PackedMask under a short name (m1, m2, ...) that later conditions can use; a condition already computed (same
+    text, same variables) is not computed again. The oldest masks are dropped when they take more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        """
+        :param max_bytes: int, upper limit of the memory of all masks
+        """
+        self.max_bytes = max_bytes
+        self.masks = OrderedDict()
+        self.keys = {}
+        self.decoded = {}
+        self.owners = {}
+        self.counter = 0
+
+    def __getitem__(self, name):
+        return self.masks[name]
+
+    def __contains__(self, name):
+        return name in self.masks
+
+    def define(self, text, variables):
+        """
+        :param text: str, the condition, see Expressions.Parser, masks are used with their name
+        :param variables: dictionary of names and Nodes used in text
+        :return: PackedMask
+        """
+        names = dict(variables)
+        for name in set(re.findall(r"[A-Za-z_]\w*", text)):
+            if name in self.masks and name not in names:
+                names[name] = MaskNode(self.masks[name])
+        node = parse(text, names)
+        if node.key in self.keys:
+            name, references = self.keys[node.key]
+            # the key holds ids, it is only valid as long as the objects with these ids exist
+            if name in self.masks and all(reference() is not None for reference in references):
+                self.masks.move_to_end(name)
+                return self.masks[name]
+            del self.keys[node.key]
+        values = node[...]
+        if values.dtype != bool:
+            raise ValueError(text + " is no condition, it has to give true or false")
+        self.counter += 1
+        mask = PackedMask.from_array(values.filled(False), "m" + str(self.counter), text)
+        # keys of objects that are gone cannot be hit again
+        for key in [key for key, (_, references) in self.keys.items()
+                    if any(reference() is None for reference in references)]:
+            del self.keys[key]
+        self.keys[node.key] = (mask.name, [reference_to(source) for source in node.sources()])
+        self.store(mask)
+        return mask
+
+    def store(self, mask):
+        """keep mask under its name, the oldest masks are dropped if there are too many"""
+        self.masks[mask.name] = mask
+        self.masks.move_to_end(mask.name)
+        while len(self.masks) > 1 and sum(entr.nbytes for entr in self.masks.values()) > self.max_bytes:
+            name, _ = self.masks.popitem(last=False)
+            self.owners.pop(name, None)
+            for key in [key for key, (entr, _) in self.keys.items() if entr == name]:
+                del self.keys[key]
+
+    def flag_masks(self, variable, key=None):
+        """
+        decode all meanings of a CF flag variable at once, each is kept under its meaning as name (e.g. cloud_free).
+        If the name belongs to another variable, the variable name is put in front, then also the file name, so
+        masks of different files never replace each other.
+
+        :param variable: netCDF4 variable with the attributes flag_meanings and flag_masks and/ or flag_values
+        :param key: hashable, identifies the variable, default is variable_key(variable)
+        :return: OrderedDict of meaning and PackedMask, empty if the variable has no CF flags
+        """
+        key = variable_key(variable) if key is None else key
+        names = self.decoded.get(key)
+        if names is not None and all(name in self.masks for name in names.values()):
+            return OrderedDict((meaning, self.masks[name]) for meaning, name in names.items())
+        attributes = {attr: variable.getncattr(attr) for attr in variable.ncattrs()}
+        decoded = decode_flags(variable, flag_meanings(attributes))
+        names = OrderedDict()
+        for meaning, mask in decoded.items():
+            name = self.free_name(meaning, variable.name, key)
+            mask.name = name
+            mask.text = variable.name + ": " + meaning
+            names[meaning] = name
+            self.owners[name] = key
+            self.store(mask)
+        self.decoded[key] = names
+        return decoded
+
+    def free_name(self, meaning, varname, key):
+        """
+        :return: str, name for the mask of meaning that is no other mask's, nor a word of the conditions
+        """
+        filename = os.path.splitext(os.path.basename(str(key[0])))[0] if isinstance(key, tuple) and key else ""
+        candidates = [meaning, varname + "_" + meaning, filename + "_" + varname + "_" + meaning]
+        candidates = [re.sub(r"\W", "_", entr) for entr in candidates]
+        candidates += [candidates[-1] + "_" + str(number) for number in range(2, len(self.masks) + 3)]
+        for name in candidates:
+            if not re.match(r"[A-Za-z_]", name) or name in RESERVED or re.match(r"m\d+$", name):
+                continue
+            if name not in self.masks or self.owners.get(name) == key:
+                return name
+
+
+def variable_key(variable):
+    """:return: tuple (absolute path of the file, path of the variable) identifying a netCDF4 variable"""
+    try:
+        filename = os.path.abspath(variable.group().filepath())
+    except (AttributeError, ValueError):
+        filename = str(id(variable))
+    try:
+        path = variable.group().path.rstrip("/") + "/" + variable.name
+    except AttributeError:
+        path = variable.name
+    return filename, path
+
+
+# masks of all open files, a mask made in one file can be applied in another one
+MASKS = MaskEngine()
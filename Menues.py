@@ -200,7 +200,10 @@ class Configchange(QMainWindow):
         mlayout = QVBoxLayout()
         mwidget = QWidget()
         newfont = QFont("Mono", 12, QFont.Bold)
-        keylist = ["country_line_color", "country_line_thickness",
+        keylist = ["country_line_color", "country_line_thickness", "decimate_above", "density_above",
+                   "density_statistic", "pyramid_above", "swath_above", "canvas",
+                   "animation_fps", "animation_cache_mb", "join_rows_above", "render_in_background",
+                   "robust_percentile",
                     "limit_for_sliceplot",
                    "update_plot_immediately", "newplotwindow"]
         if self.master.forspec:
@@ -6,6 +6,7 @@ import netCDF4
 import yaml
 import numpy as np
 import pyhdf.error
+import pyhdf.HDF
 import pandas
 import subprocess
 # import copy
@@ -19,21 +20,23 @@ from PyQt5.QtWidgets import (QApplication, QTreeView, QAbstractItemView, QMainWi
 
 import matplotlib
 try:
-    from .Fastplot import Fast3D, Fast2D, Fast1D, Fast2Dplus, Fast2D_select
+    from .Fastplot import Fast3D, Fast2D, Fast1D, Fast2Dplus, Fast2D_select, stop_workers
 except (ImportError, ModuleNotFoundError):
-    from Fastplot import Fast3D, Fast2D, Fast1D, Fast2Dplus, Fast2D_select
+    from Fastplot import Fast3D, Fast2D, Fast1D, Fast2Dplus, Fast2D_select, stop_workers
 try:
-    from .helper_tools import check_for_time
+    from .helper_tools import check_for_time, is_datetime, IO_LOCK
 except (ImportError, ModuleNotFoundError):
-    from helper_tools import check_for_time
+    from helper_tools import check_for_time, is_datetime, IO_LOCK
 try:
     from .Menues import FileMenu, HelpWindow
 except (ImportError, ModuleNotFoundError):
     from Menues import FileMenu, HelpWindow
 try:
-    from .Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt, Data
+    from .Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt, Data, DataReference, \
+        LazyData, dataset_of
 except (ImportError, ModuleNotFoundError):
-    from Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt, Data
+    from Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt, Data, DataReference, \
+        LazyData, dataset_of
 try:
     from .Colorschemes import QDarkPalette, reset_colors
 except:
@@ -46,10 +49,31 @@ try:
     from .Tables import MyTable
 except:
     from Tables import MyTable
+try:
+    from .Cache import MetadataCache
+except (ImportError, ModuleNotFoundError):
+    from Cache import MetadataCache
+try:
+    from .Workers import StatisticsWorker
+except (ImportError, ModuleNotFoundError):
+    from Workers import StatisticsWorker
+try:
+    from .Coastlines import CoastlineStore, CoastlineOverlay
+except (ImportError, ModuleNotFoundError):
+    from Coastlines import CoastlineStore, CoastlineOverlay
+try:
+    from .Expressions import Node, Formula, Variable, as_node, as_formula
+except (ImportError, ModuleNotFoundError):
+    from Expressions import Node, Formula, Variable, as_node, as_formula
+try:
+    from .Masks import MASKS, PackedMask, MaskNode, FlagMeaning, flag_meanings, apply_mask
+except (ImportError, ModuleNotFoundError):
+    from Masks import MASKS, PackedMask, MaskNode, FlagMeaning, flag_meanings, apply_mask
 
 from numpy import arange, squeeze
 
 CONFIGPATH = ""
+# CoastlineStore of country_lines.h5, loaded on first use
 C_LINES = None
 
 # __version__ = "0.0.4"
@@ -102,18 +126,23 @@ class MyQTreeView(QTreeView):
         idx = self.currentIndex()
         current_pointer = self.model().itemFromIndex(idx)
         try:
-            try:
-                mydata, unit = check_for_time(current_pointer.mdata)
-            except Exception as err:
-                mydata = current_pointer.mdata
-                unit = ""
-                if event.text() not in  ["d", "a"]:
-                    raise err
-            # print("unit to set is: ", unit)
+            # d and a only show metadata, x, y, z, u, e and f keep a reference that is read when it is plotted
             try:
                 mypath = current_pointer.mdata.group().path
             except:
                 mypath = ""
+            if event.text() in ["x", "y", "z", "u", "e"] and \
+                    isinstance(current_pointer.mdata, FlagMeaning):
+                HelpWindow(self.master, current_pointer.name + " is a flag meaning, it can be used as flag "
+                                        "(f) or in flag conditions, not as x, y, z, u or e.")
+                return
+            if event.text() in ["x", "y", "z", "u", "e", "f"] and not isinstance(current_pointer.mdata, FlagMeaning):
+                try:
+                    mydata = DataReference(current_pointer.mdata, mypath)
+                    unit = mydata.units
+                except TypeError:
+                    mydata, unit = check_for_time(current_pointer.mdata)
+                    mydata = squeeze(mydata)
             # try:
             #    unit = current_pointer.mdata.units
             # except Exception as err:
@@ -189,9 +218,10 @@ class MyQTreeView(QTreeView):
                     self.master.tabifyDockWidget(last_tab, self.tab)
             elif event.text() == "c":
                 if isinstance(current_pointer, Representative):
-                    tocopy = squeeze(current_pointer.mdata.get_value())
+                    with IO_LOCK:
+                        tocopy = squeeze(current_pointer.mdata.get_value())
                 else:
-                    tocopy = squeeze(mydata)
+                    tocopy = squeeze(check_for_time(current_pointer.mdata)[0])
                 try:
                     (pandas.DataFrame(tocopy)).to_clipboard(index=False, header=False)
                     dimming()
@@ -205,51 +235,36 @@ class MyQTreeView(QTreeView):
                         print(ecxs)
                         print("cannot copy")
             elif event.text() == "x":
-                self.master.mdata.x.set(squeeze(mydata), current_pointer.mdata.name, mypath,
+                self.master.mdata.x.set(mydata, current_pointer.mdata.name, mypath,
                                         dimension=current_pointer.mdata.dimensions, units=unit)
             elif event.text() == "y":
                 print("The unit that is set is: , ", unit)
-                self.master.mdata.y.set(squeeze(mydata), current_pointer.mdata.name, mypath,
+                self.master.mdata.y.set(mydata, current_pointer.mdata.name, mypath,
                                         dimension=current_pointer.mdata.dimensions, units=unit)
                 print(self.master.mdata.y.units)
             elif event.text() == "z":
-                self.master.mdata.z.set(squeeze(mydata), current_pointer.mdata.name, mypath,
+                self.master.mdata.z.set(mydata, current_pointer.mdata.name, mypath,
                                         dimension=current_pointer.mdata.dimensions, units=unit)
             elif event.text() == "u":
-                self.master.mdata.yerr.set(squeeze(mydata), current_pointer.mdata.name, mypath, units=unit)
+                self.master.mdata.yerr.set(mydata, current_pointer.mdata.name, mypath, units=unit)
             elif event.text() == "e":
-                self.master.mdata.xerr.set(squeeze(mydata), current_pointer.mdata.name, mypath, units=unit)
+                self.master.mdata.xerr.set(mydata, current_pointer.mdata.name, mypath, units=unit)
             elif event.text() == "f":
-                self.master.mdata.flag.set(squeeze(mydata), current_pointer.mdata.name, mypath, units=unit)
-            elif event.text() == "m":  # TODO: what to do for mfc?
-                print("here")
-                if self.master.filetype == "hdf4":
-                    mval = "self.mfile.myrefdict[int("+str(current_pointer.mdata.myref)+")].get_value()"
+                if isinstance(current_pointer.mdata, FlagMeaning):
+                    # a decoded flag meaning is a condition already, it is applied with "on x", "on y", ...
+                    mask = current_pointer.mdata.mask()
+                    self.master.mdata.flag.set(mask, mask.name + ": " + mask.text, mypath)
                 else:
-                    mypath = current_pointer.mdata.group().path
-                    if self.master.filetype == "mfc":
-                        if mypath:
-                            fullpath = "']['".join(mypath.lstrip("/").split("/"))
-                        else:
-                            fullpath = current_pointer.mdata.name
-                    else:
-                        fullpath = mypath+"/"+current_pointer.mdata.name
-                    mval = "self.mfile['"+fullpath+"'][:]"
-                    
+                    self.master.mdata.flag.set(mydata, current_pointer.mdata.name, mypath, units=unit)
+            elif event.text() == "m":
+                # the variable is only read when the expression is plotted or viewed, and only the part needed
                 textshow = current_pointer.mdata.name
-                if self.master.mdata.misc.datavalue is None:
-                    self.master.mdata.misc.set(mval, textshow)
-                else:
-                    if not isinstance(self.master.mdata.misc.datavalue, str):
-                        textshow = self.master.mdata.misc.name_value+textshow
-                        temp = self.master.mdata.misc.datavalue
-                        mval = eval("temp"+self.last_operator+"mval")
-                        self.last_operator = None
-                        
-                    else:
-                        textshow = self.master.mdata.misc.name_value+textshow
-                        mval = self.master.mdata.misc.datavalue+mval
-                    self.master.mdata.misc.set(mval, textshow)
+                misc = self.master.mdata.misc
+                formula = as_formula(misc.datavalue).add_variable(Variable(current_pointer.mdata, textshow),
+                                                                  self.master.mdata.misc_op)
+                if misc.datavalue is not None:
+                    textshow = misc.name_value + textshow
+                misc.set(formula, textshow)
                 isold=False
                 if isold:
                     if self.master.mdata.misc.datavalue is None:
@@ -379,6 +394,9 @@ class App(QMainWindow):
         self.config["this_file"] = CONFIGPATH
         self.holdbutton = None
         self.filetype = None
+        self.stat_items = {}
+        self.stats_worker = None
+        self.stats_cache = None
         self.load_file(this_file)
         self.setMenuBar(FileMenu(self))
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
@@ -525,19 +543,12 @@ class App(QMainWindow):
     def plot_country(self):
         global C_LINES
         if C_LINES is None:
-            C_LINES = []
             here = os.path.dirname(os.path.abspath(__file__))
-            with netCDF4.Dataset(os.path.join(here, "country_lines.h5")) as fid:
-                for k in fid.variables:
-                    C_LINES.append(fid[k][:])
-                    temp = fid[k][:].copy()
-                    temp[:, 0] = temp[:, 0] + 360
-                    C_LINES.append(temp)
-
-        ln_coll = matplotlib.collections.LineCollection(C_LINES,
-                                                        colors=self.config["Plotsettings"]["country_line_color"],
-                                                        linewidths=self.config["Plotsettings"][
-                                                            "country_line_thickness"])
+            C_LINES = CoastlineStore.from_file(os.path.join(here, "country_lines.h5"))
+
+        # only the lines inside the view are drawn, at the detail the zoom needs
+        ln_coll = CoastlineOverlay(C_LINES, colors=self.config["Plotsettings"]["country_line_color"],
+                                   linewidths=self.config["Plotsettings"]["country_line_thickness"])
         if self.active1D is None:
             self.openplots[-1].myfigure.axes.add_collection(ln_coll)
             self.openplots[-1].myfigure.draw()
@@ -580,133 +591,52 @@ class App(QMainWindow):
                     misc_layout.addWidget(self.mdata.__dict__[entr])
 
         def get_number():
-            #try:
-                try:
-                    thisdims = list(self.mdata.misc.dimension)
-                    if len(thisdims) == 0:
-                        raise ValueError()
-                except Exception as exs:
-                    thisdims = []
-                previousvalue = self.mdata.misc.datavalue
-                previoustext = self.mdata.misc.name_value
-                newtext = self.mentry.text()
-                self.mentry.clear()
-                try:
-                    if not previoustext: previoustext = ""
-                except ValueError:
-                    pass
-                try:
-                    if not previousvalue: previousvalue = ""
-                except ValueError:
-                    pass
-                try:
-                    self.mdata.misc.set(previousvalue+newtext, previoustext + newtext)
-                except:
-                    temp = previousvalue
-                    try:
-                        self.mdata.misc.set(eval("temp"+newtext), previoustext + newtext)
-                    except:
-                        self.last_operator = newtext
-                        self.mdata.misc.set(temp, previoustext + newtext)
-                        #from PyQt5.QtCore import pyqtRemoveInputHook
-                        #pyqtRemoveInputHook()
-                        #import pdb
-                        #pdb.set_trace()
+            previoustext = self.mdata.misc.name_value
+            newtext = self.mentry.text()
+            self.mentry.clear()
+            if not newtext:
                 return
-                '''
-                num = float(self.mentry.text())
-                if self.mdata.misc.datavalue is None:
-                    self.mdata.misc.set(num, str(num))
-                else:
-                    # try:
-                    if "+" in self.mdata.misc_op:
-                        mdata = self.mdata.misc.datavalue + num
-                    elif "-" in self.mdata.misc_op:
-                        mdata = self.mdata.misc.datavalue - num
-                    elif "/" in self.mdata.misc_op:
-                        mdata = self.mdata.misc.datavalue / num
-                    elif "*" in self.mdata.misc_op:
-                        mdata = self.mdata.misc.datavalue * num
-                    elif "mean" in self.mdata.misc_op:
-                        num = int(num)
-                        try:
-                            _ = thisdims.pop(num)
-                        except IndexError:
-                            HelpWindow("Please check if you chose a dimension that fits the data chosen in misc")
-                            return
-                        if (self.only_indices) and self.mdata.misc.datavalue.shape[num] == len(self.current_idx):
-                            mdata = self.mdata.misc.datavalue.data
-                            if num == 0:
-                                mdata = mdata[self.current_idx]
-                            elif num == 1:
-                                mdata = mdata[:, self.current_idx, ...]
-                            elif num == 2:
-                                mdata = mdata[:, :, self.current_idx, ...]
-                            elif num == 3:
-                                mdata = mdata[:, :, :, self.current_idx, ...]
-                            elif num == 4:
-                                mdata = mdata[:, :, :, :, self.current_idx, ...]
-                            else:
-                                HelpWindow(self, "please choose a number that is smaller than the current dimension")
-                                return
-                            self.only_indices = False
-                            mdata = np.nanmean(mdata, axis=num)
-                        else:
-                            mdata = np.nanmean(self.mdata.misc.datavalue, axis=num)
-                        mdata = np.nanmean(self.mdata.misc.datavalue, axis=num)
-                        num = " along axis " + str(num)
-                    elif "median" in self.mdata.misc_op:
-                        num = int(num)
-                        try:
-                            _ = thisdims.pop(num)
-                        except IndexError:
-                            HelpWindow("Please check if you chose a dimension that fits the data chosen in misc")
-                            return
-                        if (self.only_indices) and self.mdata.misc.datavalue.shape[num] == len(self.current_idx):
-                            mdata = self.mdata.misc.datavalue.data
-                            if num == 0:
-                                mdata = mdata[self.current_idx]
-                            elif num == 1:
-                                mdata = mdata[:, self.current_idx, ...]
-                            elif num == 2:
-                                mdata = mdata[:, :, self.current_idx, ...]
-                            elif num == 3:
-                                mdata = mdata[:, :, :, self.current_idx, ...]
-                            elif num == 4:
-                                mdata = mdata[:, :, :, :, self.current_idx, ...]
-                            else:
-                                HelpWindow(self, "please choose a number that is smaller than the current dimension")
-                                return
-                            self.only_indices = False
-                            mdata = np.nanmedian(mdata, axis=num)
-                        else:
-                            mdata = np.nanmedian(self.mdata.misc.datavalue.data, axis=num)
-                        num = " along axis " + str(num)
-                    mname = self.mdata.misc.name_value + " " + self.mdata.misc_op + str(num)
-                    self.mdata.misc.set(mdata, mname, dimension=thisdims)
-            except ValueError:
-                pass
-            '''
+            if not previoustext:
+                previoustext = ""
+            self.mdata.misc.set(as_formula(self.mdata.misc.datavalue).add_text(newtext), previoustext + newtext)
 
         def get_flag_number():
+            text = flag_entry.text().strip()
+            if not text:
+                return
             try:
-                num = float(flag_entry.text())
-                mname = self.mdata.flag.name_value + " " + self.mdata.flag_op + str(num)
-                # I need to check x,y,z, for the moment, assume z:
+                float(text)
+            except ValueError:
+                # a compound condition, e.g. 1 < flag <= 5 and not (z > 100 or m1)
+                condition = text
+                mname = text
+            else:
+                if self.mdata.flag.datavalue is None or self.mdata.flag_op is None:
+                    print("maybe no flag chosen?")
+                    return
                 if "<" in self.mdata.flag_op:
-                    mdata = self.mdata.flag.datavalue < num
+                    operator = "<"
                 elif "=" in self.mdata.flag_op:
-                    mdata = self.mdata.flag.datavalue == num
+                    operator = "=="
                 else:
-                    mdata = self.mdata.flag.datavalue > num
-                self.mdata.flag.set(mdata, mname)
-                # zdata = np.copy(self.mdata.misc.datavalue)
-                # zdata[~mdata] = np.nan
-                # self.mdata.misc.set(zdata, self.mdata.misc.name_value + " at " + mname)
-            except ValueError:
-                print("no value found")
-            except TypeError:
-                print("maybe no flag chosen?")
+                    operator = ">"
+                condition = "flag " + operator + " " + text
+                mname = self.mdata.flag.name_value + " " + self.mdata.flag_op + text
+            try:
+                variables = {}
+                for key in ("flag", "x", "y", "z", "misc"):
+                    value = self.mdata.__dict__[key].datavalue
+                    if isinstance(value, PackedMask):
+                        variables[key] = MaskNode(value)
+                    elif value is not None:
+                        variables[key] = as_node(value)
+                # masked values do not pass the condition
+                mask = MASKS.define(condition, variables)
+            except (ValueError, IndexError) as exc:
+                HelpWindow(self, "the condition " + condition + " could not be computed: " + str(exc))
+                return
+            self.mdata.flag.set(mask, mask.name + ": " + mname)
+            print(mask.name, "=", condition, ":", mask.count(), "of", mask.size, "values")
 
         # make flag_layout fields:
         flag_entry = QLineEdit()
@@ -724,25 +654,26 @@ class App(QMainWindow):
                 self.mdata.flag.setText(self.mdata.flag.name + ": " + self.mdata.flag.name_value + " " + el)
 
             button.clicked.connect(lambda state, x=el: func_flag(x))
-        for el in ["on x", "on y", "on z"]:  #TODO: on misc needs rework, "on misc"
+        for el in ["on x", "on y", "on z", "on misc"]:
             button = QPushButton(el)
             width = button.fontMetrics().boundingRect(el).width() + 8
             button.setMaximumWidth(width)
             flag_layout.addWidget(button)
             def apply_flag(el):
                 my_flag = self.mdata.flag.datavalue
-                name = self.mdata.flag.name_value
                 to_use = el.split()[-1]
-                myval = (np.ma.copy(self.mdata.__dict__[to_use].datavalue))
-                if not isinstance(myval, np.ma.MaskedArray):
-                    myval = np.ma.masked_array(myval, np.full(myval.shape, False))
-                if not isinstance(myval.mask, np.ndarray):
-                    myval.mask = np.full(myval.shape, False)
+                target = self.mdata.__dict__[to_use]
+                my_name = str(target.name_value) + " only " + str(self.mdata.flag.name_value)
                 try:
-                    myval.mask[~my_flag] = True
-                    my_name = self.mdata.__dict__[to_use].name_value + " only " + self.mdata.flag.name_value
-                    self.mdata.__dict__[to_use].set(myval, my_name, dimension=self.mdata.__dict__[to_use].dimension)
-                except IndexError as exc:
+                    if to_use == "misc":
+                        if not isinstance(my_flag, PackedMask):
+                            raise TypeError("the flag is no condition")
+                        condition = MaskNode(my_flag)
+                        target.set(as_formula(target.datavalue).where(condition), my_name)
+                    else:
+                        # the values are shared, only the mask is new
+                        target.set(apply_mask(target.datavalue, my_flag), my_name, dimension=target.dimension)
+                except (IndexError, ValueError) as exc:
                     HelpWindow(self, "probably flag and x,y have different dimensions: "+str(exc))
                 except TypeError:
                     HelpWindow(self, "check your flag condition, something went wrong there")
@@ -762,10 +693,10 @@ class App(QMainWindow):
             button.setMaximumWidth(width)
             misc_layout.addWidget(button)
             def funcxyz(which):
-                try:
-                    val = eval(self.mdata.misc.datavalue)
-                except:
-                    val = self.mdata.misc.datavalue
+                val = self.evaluate_misc()
+                if val is None:
+                    return
+                val = val[...]
                 name = self.mdata.misc.name_value
                 if "x" in which:
                     self.mdata.x.set(val, name)
@@ -784,7 +715,10 @@ class App(QMainWindow):
         misc_layout.addWidget(button_table)
         def misctable():
             last_tab = self.view.tab
-            datavalue = eval(self.mdata.misc.datavalue)
+            datavalue = self.evaluate_misc()
+            if datavalue is None:
+                return
+            datavalue = datavalue[...]
             namevalue = self.mdata.misc.name_value
             mpointer = Pointer(datavalue, namevalue)
             self.view.tab = self.view.open_table(mpointer)
@@ -792,19 +726,16 @@ class App(QMainWindow):
                  self.tabifyDockWidget(last_tab, self.view.tab)
         button_table.clicked.connect(misctable)
         def plotmisc():
-            try:
-                datavalue = eval(self.mdata.misc.datavalue)
-            except Exception as exc:
-                mtext = ("something went wrong. The expression: " +
-                      self.mdata.misc.datavalue + 
-                      " could not be evaluated. Please check that it is correct." +
-                      "The error reported is: " + str(exc))
-                HelpWindow(self, mtext)
+            datavalue = self.evaluate_misc()
+            if datavalue is None:
                 return
             name = self.mdata.misc.name_value
+            if datavalue.ndim < 3:
+                # 3D and more is sliced by the viewer, only the slices shown are computed
+                datavalue = datavalue[...]
             if datavalue.ndim >=3:
                 temp = Fast3D(datavalue, parent=self, **self.config["Startingsize"]["3Dplot"],
-                              mname=name, filename=self.name, dark=self.dark,
+                              **self.config["Plotsettings"], mname=name, filename=self.name, dark=self.dark,
                               plotscheme=self.plotscheme)
             elif datavalue.ndim == 2:
                 if self.only_indices:
@@ -863,7 +794,44 @@ class App(QMainWindow):
             width = self.config["Headers"]["Table"][key]
             self.view.setColumnWidth(idx, width)
 
+    def evaluate_misc(self):
+        """
+        :return: Node of the misc expression, slicing it computes the values; None if the expression is not valid
+        """
+        try:
+            node = as_formula(self.mdata.misc.datavalue).build()
+            if self.only_indices and getattr(self, "current_idx", None) is not None:
+                # mean/ median along the axis of the marked indices only use those
+                node = node.restrict(self.current_idx)
+            return node
+        except (ValueError, IndexError) as exc:
+            HelpWindow(self, "something went wrong. The expression: " + str(self.mdata.misc.name_value) +
+                       " could not be evaluated. Please check that it is correct. The error reported is: " + str(exc))
+            return None
+
+    def file_in_use(self):
+        """
+        :return: True if data chosen (x, y, z, ..., misc) or shown in a plot is read from the open netCDF file later
+        """
+        sources = []
+        for data in [self.mdata] + [getattr(plot, "mydata", None) for plot in self.openplots]:
+            if isinstance(data, Node):
+                sources.extend(data.sources())
+                continue
+            for key in ("x", "y", "z", "xerr", "yerr", "flag", "misc"):
+                label = getattr(data, key, None)
+                value = label.stored() if isinstance(label, LazyData) else getattr(label, "datavalue", None)
+                if isinstance(value, DataReference):
+                    sources.append(value.variable)
+                elif isinstance(value, Formula):
+                    sources.extend(source for node in value.variables for source in node.sources())
+                elif isinstance(value, Node):
+                    sources.extend(value.sources())
+        return any(dataset_of(source) is self.mfile for source in sources)
+
     def load_file(self, m_file):
+        self.stop_statistics()
+        self.stat_items = {}
         if isinstance(m_file, str):
             self.name = os.path.basename(m_file)
             self.complete_name = m_file
@@ -873,15 +841,29 @@ class App(QMainWindow):
                 self.filetype = "mfc"
             else:
                 try:
-                    self.mfile.close()
+                    if self.file_in_use():
+                        # the file closes by itself once the chosen data and the plots do not refer to it any more
+                        print("data of the previous file is still used, it is kept open")
+                    else:
+                        # plots still open must not read from the closed file in the background
+                        for plot in self.openplots:
+                            try:
+                                stop_workers(plot)
+                            except RuntimeError:
+                                # the window is deleted already
+                                pass
+                        with IO_LOCK:
+                            self.mfile.close()
                 except AttributeError:
                     pass
                 try:
-                    self.mfile = netCDF4.Dataset(m_file)
+                    with IO_LOCK:
+                        self.mfile = netCDF4.Dataset(m_file)
                     self.filetype = "netcdf4"
                 except (OSError, UnicodeError):
                     try:
-                        self.mfile = Hdf4Object(m_file)
+                        with IO_LOCK:
+                            self.mfile = Hdf4Object(m_file)
                         self.filetype = "hdf4"
                     except pyhdf.error.HDF4Error:
                         try:
@@ -915,10 +897,13 @@ class App(QMainWindow):
         self.make_design()
         if isinstance(self.mfile, netCDF4._netCDF4.Dataset):
             print("walking down nc/ hdf5")
-            self.walk_down_netcdf(self.mfile, self.model)
+            # the metadata is read from the file as well, statistics workers of other windows may be reading
+            with IO_LOCK:
+                self.walk_down_netcdf(self.mfile, self.model)
         elif self.filetype == "hdf4":
             print("walking down hdf4")
-            self.walk_down_hdf4(self.mfile.struct, self.model)
+            with IO_LOCK:
+                self.walk_down_hdf4(self.mfile.struct, self.model)
         elif self.filetype == "mfc":
             print("walking down mfc")
             self.walk_down_mfc(self.mfile, self.model)
@@ -928,11 +913,103 @@ class App(QMainWindow):
         else:
             HelpWindow(self, "This seems to be an unknown file format")
         self.setWindowTitle(self.name)
+        self.start_statistics()
+
+    def stat_row(self, key):
+        """
+        empty tree items for the statistics columns of one variable, filled in by start_statistics
+
+        :param key: path of the netCDF variable or reference of the hdf4 sd dataset
+        :return: list of QStandardItem for min, max, mean and fill
+        """
+        items = [QStandardItem("") for _ in range(4)]
+        self.stat_items[str(key)] = items
+        return items
+
+    def flag_rows(self, variable, key):
+        """
+        tree items of the meanings of a CF flag variable (flag_meanings with flag_masks and/ or flag_values), they are
+        only decoded when one of them is used
+
+        :param variable: netCDF4 variable
+        :param key: path of the netCDF variable
+        :return: list of rows of QStandardItem, empty if the variable has no CF flags
+        """
+        try:
+            attributes = {attr: variable.getncattr(attr) for attr in variable.ncattrs()}
+            flags = flag_meanings(attributes)
+        except (ValueError, TypeError) as exc:
+            print("flags of", variable.name, "cannot be decoded:", exc)
+            return []
+        shape = " x ".join([str(entr) for entr in variable.shape])
+        dims = ", ".join([str(dim) for dim in variable.dimensions])
+        rows = []
+        for meaning, mask, value in flags:
+            test = ("& " + hex(mask) + " " if mask is not None else "") + \
+                   ("== " + str(value) if value is not None else "!= 0")
+            rows.append([Pointer(FlagMeaning(variable, meaning), meaning, key),
+                         QStandardItem(str(variable.ndim)), QStandardItem(shape), QStandardItem(dims),
+                         QStandardItem(""), QStandardItem("bool"), QStandardItem(test)])
+        return rows
+
+    def stop_statistics(self):
+        if self.stats_worker is not None:
+            self.stats_worker.result.disconnect()
+            self.stats_worker.requestInterruption()
+            self.stats_worker.wait()
+            self.stats_worker = None
+        self.save_statistics()
+
+    def save_statistics(self):
+        if self.stats_cache is not None:
+            self.stats_cache.save()
+
+    def start_statistics(self):
+        """
+        show min, max, mean and fill fraction of all variables in the tree. Values are taken from the metadata cache
+        if this version of the file was seen before, all others are computed in the background.
+        """
+        settings = self.config.get("Statistics", {})
+        if not settings.get("background", True) or self.filetype not in ["netcdf4", "hdf4"] or \
+                len(self.stat_items) == 0:
+            return
+        try:
+            self.stats_cache = MetadataCache(self.complete_name, settings.get("cachedir"))
+        except OSError:
+            self.stats_cache = None
+        todo = []
+        for key in self.stat_items:
+            stats = None if self.stats_cache is None else self.stats_cache.get("statistics", key)
+            if stats is None:
+                todo.append(key)
+            else:
+                self.show_statistics(key, stats, store=False)
+        if len(todo) == 0:
+            return
+        self.stats_worker = StatisticsWorker(self.complete_name, self.filetype, todo,
+                                             settings.get("max_elements", 1000000))
+        self.stats_worker.result.connect(self.show_statistics)
+        self.stats_worker.finished.connect(self.save_statistics)
+        self.stats_worker.start()
+
+    def show_statistics(self, key, stats, store=True):
+        if store and self.stats_cache is not None:
+            self.stats_cache.set("statistics", key, stats if stats is not None else {})
+        try:
+            items = self.stat_items[key]
+        except KeyError:
+            return
+        if not stats:
+            return
+        for item, name in zip(items, ["min", "max", "mean"]):
+            item.setText("{:.5g}".format(stats[name]))
+        items[3].setText("{:.1f} %".format(100 * stats["fill"]))
 
     def get_data(self, signal):
         try:
             if isinstance(self.model.itemFromIndex(signal).mdata, Representative):
-                mydata = np.squeeze(self.model.itemFromIndex(signal).mdata.get_value())
+                with IO_LOCK:
+                    mydata = np.squeeze(self.model.itemFromIndex(signal).mdata.get_value())
             else:
                 mydata, unt = check_for_time(self.model.itemFromIndex(signal).mdata)
                 mydata = np.squeeze(mydata)
@@ -974,7 +1051,7 @@ class App(QMainWindow):
             return
         if mydata.ndim >= 3 and mydata.ndim <= self.config["moreDdata"]["limit_for_sliceplot"]:
             temp = Fast3D(
-                mydata, parent=self, **self.config["Startingsize"]["3Dplot"],
+                mydata, parent=self, **self.config["Startingsize"]["3Dplot"], **self.config["Plotsettings"],
                 mname=thisdata.name, filename=self.name, dark=self.dark, plotscheme=self.plotscheme,
                 mydata_dims=mydata_dims)
             self.openplots.append(temp)
@@ -1039,20 +1116,16 @@ class App(QMainWindow):
                     HelpWindow(self, "hold is on, but no suitable plot open. Plotting in 2D plots only with x or y set")
                 else:
                     if self.active1D is not None:
-                        if isinstance(self.active1D.mydata.x.datavalue[0],
-                                      datetime.datetime) and not isinstance(mdata.x.datavalue[0], datetime.datetime):
+                        if is_datetime(self.active1D.mydata.x.datavalue) and not is_datetime(mdata.x.datavalue):
                             HelpWindow(self, "old axis has datetime x, new x data is not datetime. unselect hold")
                             return
-                        elif not isinstance(self.active1D.mydata.x.datavalue[0],
-                                            datetime.datetime) and isinstance(mdata.x.datavalue[0], datetime.datetime):
+                        elif not is_datetime(self.active1D.mydata.x.datavalue) and is_datetime(mdata.x.datavalue):
                             HelpWindow(self, "old axis has not datetime x, new x data is datetime. unselect hold")
                             return
-                        elif isinstance(self.active1D.mydata.y.datavalue[0],
-                                        datetime.datetime) and not isinstance(mdata.y.datavalue[0], datetime.datetime):
+                        elif is_datetime(self.active1D.mydata.y.datavalue) and not is_datetime(mdata.y.datavalue):
                             HelpWindow(self, "old axis has datetime y, new y data is not datetime. unselect hold")
                             return
-                        elif not isinstance(self.active1D.mydata.y.datavalue[0],
-                                            datetime.datetime) and isinstance(mdata.y.datavalue[0], datetime.datetime):
+                        elif not is_datetime(self.active1D.mydata.y.datavalue) and is_datetime(mdata.y.datavalue):
                             HelpWindow(self, "old axis has not datetime y, new y data is datetime. unselect hold")
                             return
                         else:
@@ -1075,10 +1148,11 @@ class App(QMainWindow):
                 self.openplots.append(temp)
         elif mydata.ndim > self.config["moreDdata"]["limit_for_sliceplot"]:
             # I need to find the variables that correspond to the dimension names
-            if isinstance(self.model.itemFromIndex(signal).mdata, Representative):
-                mydata = self.model.itemFromIndex(signal).mdata.get_value()
-            else:
-                mydata = self.model.itemFromIndex(signal).mdata[:]
+            with IO_LOCK:
+                if isinstance(self.model.itemFromIndex(signal).mdata, Representative):
+                    mydata = self.model.itemFromIndex(signal).mdata.get_value()
+                else:
+                    mydata = self.model.itemFromIndex(signal).mdata[:]
             mydimdict = {}
             for midx, dimhere in enumerate(mydata_dims):
                 if dimhere in mydimdict.keys():
@@ -1200,6 +1274,10 @@ class App(QMainWindow):
                 last = [self.walk_down_netcdf(currentlevel[mkey], mkey), QStandardItem(ndim),
                         QStandardItem(shape), QStandardItem(dims), QStandardItem(units),
                         QStandardItem(dtype), QStandardItem(attrs)]
+                if isinstance(currentlevel[mkey], netCDF4.Variable):
+                    last.extend(self.stat_row(currentlevel.path.rstrip("/") + "/" + mkey))
+                    for row in self.flag_rows(currentlevel[mkey], currentlevel.path.rstrip("/") + "/" + mkey):
+                        last[0].appendRow(row)
                 currentitemlevel.appendRow(last)
             except Exception as exs:
                 print("walking down netcdf failed ", exs)
@@ -1252,10 +1330,14 @@ class App(QMainWindow):
                 last = [self.walk_down_hdf4(currentlevel[mkey], mkey), QStandardItem(ndim),
                         QStandardItem(shape), QStandardItem(dims), QStandardItem(units),
                         QStandardItem(dtype), QStandardItem(attrs)]
+                if isinstance(currentlevel[mkey], Representative) and \
+                        currentlevel[mkey].tag == pyhdf.HDF.HC.DFTAG_NDG:
+                    last.extend(self.stat_row(currentlevel[mkey].myref))
                 currentitemlevel.appendRow(last)
         return currentitemlevel
 
     def closeEvent(self, event):
+        self.stop_statistics()
         print("Close Viewer")
 
 
@@ -1425,6 +1507,12 @@ class ScrollLabel(QScrollArea):
 
 if __name__ == '__main__':
     mfile = sys.argv[1:]
+    if mfile[:1] == ["--render"]:
+        try:
+            from .Batchrender import main as render_main
+        except (ImportError, ModuleNotFoundError):
+            from Batchrender import main as render_main
+        sys.exit(render_main(mfile[1:]))
     if len(mfile) > 0:
         main(mfile)
     else:
@@ -0,0 +1,384 @@
+"""Module with images that are computed for the current view of the axes, at the resolution of the screen"""
+import threading
+import numpy as np
+from numpy import ma
+from matplotlib.image import AxesImage
+
+try:
+    from .helper_tools import summary_statistics
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import summary_statistics
+
+# generation of the view computed by the current thread, only set while computing in the background
+BACKGROUND = threading.local()
+
+
+class RenderCancelled(Exception):
+    """a newer view was requested while the pixels of an older one were computed in the background"""
+
+
+class ViewDependentImage(AxesImage):
+    """
+    Image whose pixels are recomputed for the visible part of the data whenever the view (zoom, pan) or the size of
+    the axes change. The number of pixels is about the number of screen pixels covered, independent of the size of
+    the data. Subclasses implement compute().
+    If render_later is set, new views are computed by it (e.g. in a background thread) and shown with show_view once
+    ready, until then the pixels of the last view are drawn in their old place. Every new view increases generation,
+    a computation for an older generation stops at the next check_cancelled.
+    """
+
+    def __init__(self, ax, bounds, **kwargs):
+        """
+        :param ax: axes to draw in, the image still needs to be added with ax.add_image
+        :param bounds: tuple of floats (xmin, xmax, ymin, ymax), extent of the complete data
+        :param kwargs: arguments passed on to AxesImage (e.g. cmap, norm)
+        """
+        kwargs.setdefault("origin", "lower")
+        kwargs.setdefault("interpolation", "nearest")
+        super(ViewDependentImage, self).__init__(ax, **kwargs)
+        self.bounds = tuple(float(entr) for entr in bounds)
+        self.view = None
+        # function of image and view, returns True if it takes care of computing the view, see draw
+        self.render_later = None
+        self.requested = None
+        self.generation = 0
+        xmin, xmax, ymin, ymax = self.bounds
+        self.update_view((xmin, xmax, ymin, ymax, max(int(ax.bbox.width), 1), max(int(ax.bbox.height), 1)))
+
+    def data_limits(self):
+        """
+        :return: list of the lower left and upper right corners, for ax.update_datalim
+        """
+        xmin, xmax, ymin, ymax = self.bounds
+        return [(xmin, ymin), (xmax, ymax)]
+
+    def get_view(self):
+        """
+        visible part of the data and the number of screen pixels it covers
+
+        :return: tuple (x0, x1, y0, y1, nx, ny) or None if no data is visible
+        """
+        xlim = self.axes.get_xlim()
+        ylim = self.axes.get_ylim()
+        xmin, xmax, ymin, ymax = self.bounds
+        x0, x1 = max(min(xlim), xmin), min(max(xlim), xmax)
+        y0, y1 = max(min(ylim), ymin), min(max(ylim), ymax)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        bbox = self.axes.bbox
+        nx = int(np.ceil(bbox.width * (x1 - x0) / abs(xlim[1] - xlim[0])))
+        ny = int(np.ceil(bbox.height * (y1 - y0) / abs(ylim[1] - ylim[0])))
+        return x0, x1, y0, y1, max(nx, 1), max(ny, 1)
+
+    def update_view(self, view):
+        """
+        compute the pixels for view and show them
+
+        :param view: tuple (x0, x1, y0, y1, nx, ny) as returned by get_view
+        """
+        # a view still computed in the background is outdated now
+        self.generation += 1
+        self.requested = None
+        self.show_view(view, *self.compute(*view))
+
+    def show_view(self, view, mdata, extent):
+        """
+        :param view: tuple (x0, x1, y0, y1, nx, ny) the pixels were computed for
+        :param mdata: 2D array, pixels as returned by compute
+        :param extent: tuple (left, right, bottom, top) of the pixels
+        """
+        self.view = view
+        self.set_data(mdata)
+        # set_extent would change the limits of the axes
+        self._extent = extent
+
+    def compute_in_background(self, view, generation):
+        """
+        :param view: tuple (x0, x1, y0, y1, nx, ny) as returned by get_view
+        :param generation: int, generation of the request, the computation is cancelled if it is not the newest
+        :return: tuple of the pixels and their extent, as returned by compute
+        """
+        BACKGROUND.generation = generation
+        try:
+            self.check_cancelled()
+            return self.compute(*view)
+        finally:
+            BACKGROUND.generation = None
+
+    def check_cancelled(self):
+        """raise RenderCancelled if the view computed in this thread is not wanted any more"""
+        generation = getattr(BACKGROUND, "generation", None)
+        if generation is not None and generation != self.generation:
+            raise RenderCancelled()
+
+    def invalidate(self):
+        """the data changed, compute the pixels again at the next draw"""
+        self.view = None
+        self.requested = None
+        self.stale = True
+
+    def compute(self, x0, x1, y0, y1, nx, ny):
+        """
+        :param x0: float, left border of the view
+        :param x1: float, right border of the view
+        :param y0: float, lower border of the view
+        :param y1: float, upper border of the view
+        :param nx: int, number of pixels in x
+        :param ny: int, number of pixels in y
+        :return: tuple of 2D (masked) array with about (ny, nx) pixels, row 0 at the bottom, and its extent
+                 (left, right, bottom, top), usually (x0, x1, y0, y1)
+        """
+        raise NotImplementedError
+
+    def draw(self, renderer, *args, **kwargs):
+        view = self.get_view()
+        if view is None:
+            return
+        if view != self.view and view != self.requested:
+            if self.render_later is not None and self.render_later(self, view):
+                self.requested = view
+            else:
+                self.update_view(view)
+        elif view == self.view and self.requested is not None:
+            # back at the view shown, the one still computed is not wanted any more
+            self.generation += 1
+            self.requested = None
+        super(ViewDependentImage, self).draw(renderer, *args, **kwargs)
+
+
+class DensityImage(ViewDependentImage):
+    """
+    Scatter of x, y coloured with z, shown as image: the points are binned into the screen pixels and each pixel
+    shows mean or max of z of its points, or the number of points.
+    """
+
+    def __init__(self, ax, x, y, z, statistic="mean", **kwargs):
+        """
+        :param ax: axes to draw in
+        :param x: 1D array, x-coordinates of the points
+        :param y: 1D array, y-coordinates of the points
+        :param z: 1D array, values of the points
+        :param statistic: str, mean, max or count
+        :param kwargs: arguments passed on to AxesImage
+        """
+        if statistic not in ("mean", "max", "count"):
+            raise ValueError("statistic has to be mean, max or count, not " + str(statistic))
+        valid = ~(ma.getmaskarray(x) | ma.getmaskarray(y) | ma.getmaskarray(z))
+        self.x = ma.getdata(x)[valid].astype(float)
+        self.y = ma.getdata(y)[valid].astype(float)
+        self.z = ma.getdata(z)[valid].astype(float)
+        valid = np.isfinite(self.x) & np.isfinite(self.y) & np.isfinite(self.z)
+        if not valid.all():
+            self.x, self.y, self.z = self.x[valid], self.y[valid], self.z[valid]
+        if self.x.size == 0:
+            raise ValueError("no valid points to show")
+        self.statistic = statistic
+        bounds = (self.x.min(), self.x.max(), self.y.min(), self.y.max())
+        # a single point or a line of points still needs an area
+        if bounds[0] == bounds[1]:
+            bounds = (bounds[0] - 0.5, bounds[1] + 0.5) + bounds[2:]
+        if bounds[2] == bounds[3]:
+            bounds = bounds[:2] + (bounds[2] - 0.5, bounds[3] + 0.5)
+        super(DensityImage, self).__init__(ax, bounds, **kwargs)
+        if statistic == "count":
+            self.autoscale_None()
+        else:
+            # colours do not change with zooming
+            self.set_clim(self.z.min(), self.z.max())
+
+    def compute(self, x0, x1, y0, y1, nx, ny):
+        ix = np.floor((self.x - x0) * (nx / (x1 - x0))).astype(np.int64)
+        iy = np.floor((self.y - y0) * (ny / (y1 - y0))).astype(np.int64)
+        # points exactly on the upper border belong to the last pixel, points beyond it are outside of the view
+        ix[self.x == x1] = nx - 1
+        iy[self.y == y1] = ny - 1
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        flat = iy[inside] * nx + ix[inside]
+        self.check_cancelled()
+        counts = np.bincount(flat, minlength=nx * ny)
+        if self.statistic == "count":
+            values = counts.astype(float)
+        elif self.statistic == "mean":
+            sums = np.bincount(flat, weights=self.z[inside], minlength=nx * ny)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = sums / counts
+        else:
+            zin = self.z[inside]
+            order = np.argsort(zin, kind="stable")
+            values = np.zeros(nx * ny)
+            # with repeated indices the last assignment wins, which is the largest value after sorting
+            values[flat[order]] = zin[order]
+        return ma.array(values.reshape(ny, nx), mask=(counts == 0).reshape(ny, nx)), (x0, x1, y0, y1)
+
+
+def block_mean(mdata):
+    """
+    mean of 2x2 blocks of a 2D array, masked and non-finite values are ignored, odd sizes are padded with masked values
+
+    :param mdata: 2D (masked) array
+    :return: 2D masked array of floats with half the size (rounded up)
+    """
+    mdata = ma.masked_invalid(mdata)
+    ny, nx = mdata.shape
+    if ny % 2 or nx % 2:
+        padded = ma.masked_all((ny + ny % 2, nx + nx % 2), dtype=float)
+        padded[:ny, :nx] = mdata
+        mdata = padded
+    return mdata.reshape(mdata.shape[0] // 2, 2, mdata.shape[1] // 2, 2).mean(axis=(1, 3))
+
+
+class PyramidImage(ViewDependentImage):
+    """
+    Image of a large 2D array, placed like imshow does (pixel centres at the integer indices). Levels with 2x2,
+    4x4, ... block means are built once in a background thread. Each view uses the coarsest level that still has at
+    least the resolution of the screen and only the visible window of it. Until a level is ready, every n-th pixel
+    of the full data is used instead.
+    """
+    chunk_rows = 2048  # rows of the full data averaged at once for the first level
+
+    def __init__(self, ax, mdata, min_size=256, **kwargs):
+        """
+        :param ax: axes to draw in
+        :param mdata: 2D array
+        :param min_size: int, levels are built until both dimensions are smaller than this
+        :param kwargs: arguments passed on to AxesImage
+        """
+        self.data = mdata
+        self.shape = np.shape(mdata)
+        self.levels = []
+        self.maxlevel = 0
+        while max(self.shape) // 2 ** self.maxlevel > min_size:
+            self.maxlevel += 1
+        self.cancelled = False
+        nrow, ncol = self.shape
+        super(PyramidImage, self).__init__(ax, (-0.5, ncol - 0.5, -0.5, nrow - 0.5), **kwargs)
+        stats = summary_statistics(mdata, max_elements=10000000)
+        if stats is not None and np.isfinite(stats["min"]):
+            self.set_clim(stats["min"], stats["max"])
+        else:
+            self.autoscale_None()
+        self.builder = threading.Thread(target=self.build_levels, daemon=True)
+        self.builder.start()
+
+    def build_levels(self):
+        if self.maxlevel == 0:
+            return
+        rows = []
+        for start in range(0, self.shape[0], self.chunk_rows):
+            if self.cancelled:
+                return
+            rows.append(block_mean(self.data[start:start + self.chunk_rows]))
+        level = ma.concatenate(rows)
+        self.levels.append(level)
+        while len(self.levels) < self.maxlevel and not self.cancelled:
+            level = block_mean(level)
+            self.levels.append(level)
+        # the next draw picks the new levels
+        self.invalidate()
+
+    def remove(self):
+        self.cancelled = True
+        super(PyramidImage, self).remove()
+
+    def compute(self, x0, x1, y0, y1, nx, ny):
+        nrow, ncol = self.shape
+        col0, col1 = max(int(np.floor(x0 + 0.5)), 0), min(int(np.ceil(x1 + 0.5)), ncol)
+        row0, row1 = max(int(np.floor(y0 + 0.5)), 0), min(int(np.ceil(y1 + 0.5)), nrow)
+        step = max(1, min((col1 - col0) // nx, (row1 - row0) // ny))
+        level = min(int(np.log2(step)), self.maxlevel)
+        factor = 2 ** level
+        col0 = col0 // factor * factor
+        row0 = row0 // factor * factor
+        if level == 0:
+            window = self.data[row0:row1, col0:col1]
+        elif level <= len(self.levels):
+            window = self.levels[level - 1][row0 // factor:-(-row1 // factor), col0 // factor:-(-col1 // factor)]
+        else:
+            window = self.data[row0:row1:factor, col0:col1:factor]
+        extent = (col0 - 0.5, col0 + window.shape[1] * factor - 0.5,
+                  row0 - 0.5, row0 + window.shape[0] * factor - 0.5)
+        return ma.masked_invalid(window), extent
+
+
+class SwathImage(ViewDependentImage):
+    """
+    Curvilinear field (e.g. a satellite swath with 2D longitude and latitude) rasterized onto the screen pixels of
+    the current view: every cell fills the pixels whose centres are inside the bounding box of its corners, cells
+    smaller than a pixel fill the pixel of their centre. Costs about as much as an image of the screen size.
+    """
+
+    def __init__(self, ax, xcorners, ycorners, mdata, **kwargs):
+        """
+        :param ax: axes to draw in
+        :param xcorners: 2D array (M+1, N+1), x-coordinates of the cell corners
+        :param ycorners: 2D array (M+1, N+1), y-coordinates of the cell corners
+        :param mdata: 2D array (M, N), values of the cells
+        :param kwargs: arguments passed on to AxesImage
+        """
+        xcorners = ma.masked_invalid(xcorners)
+        ycorners = ma.masked_invalid(ycorners)
+        cornermask = ma.getmaskarray(xcorners) | ma.getmaskarray(ycorners)
+        # cells with a masked corner are not shown
+        self.valid = ~(cornermask[:-1, :-1] | cornermask[1:, :-1] | cornermask[:-1, 1:] | cornermask[1:, 1:]).ravel()
+        if not self.valid.any():
+            raise ValueError("no valid cells to show")
+        bboxes = []
+        for corners in (ma.getdata(xcorners).astype(float), ma.getdata(ycorners).astype(float)):
+            four = (corners[:-1, :-1], corners[1:, :-1], corners[:-1, 1:], corners[1:, 1:])
+            bboxes.append(np.minimum.reduce(four).ravel()[self.valid])
+            bboxes.append(np.maximum.reduce(four).ravel()[self.valid])
+        self.xmin, self.xmax, self.ymin, self.ymax = bboxes
+        self.values = self.cell_values(mdata)
+        super(SwathImage, self).__init__(
+            ax, (self.xmin.min(), self.xmax.max(), self.ymin.min(), self.ymax.max()), **kwargs)
+        finite = self.values[np.isfinite(self.values)]
+        if finite.size > 0:
+            self.set_clim(finite.min(), finite.max())
+
+    def cell_values(self, mdata):
+        """
+        :param mdata: 2D array (M, N), values of the cells
+        :return: 1D array of floats, values of the valid cells, nan where masked
+        """
+        return ma.filled(ma.masked_invalid(mdata).astype(float), np.nan).ravel()[self.valid]
+
+    def set_values(self, mdata):
+        """
+        show new values on the same grid (e.g. another level)
+
+        :param mdata: 2D array (M, N), values of the cells
+        """
+        self.values = self.cell_values(mdata)
+        self.invalidate()
+
+    def compute(self, x0, x1, y0, y1, nx, ny):
+        sel = np.nonzero((self.xmax >= x0) & (self.xmin <= x1) & (self.ymax >= y0) & (self.ymin <= y1) &
+                         np.isfinite(self.values))[0]
+        scalex = nx / (x1 - x0)
+        scaley = ny / (y1 - y0)
+        pixels = []
+        for lower, upper, start, scale, npix in ((self.xmin, self.xmax, x0, scalex, nx),
+                                                 (self.ymin, self.ymax, y0, scaley, ny)):
+            first = np.ceil((lower[sel] - start) * scale - 0.5).astype(np.int64)
+            last = np.floor((upper[sel] - start) * scale - 0.5).astype(np.int64)
+            # cells not covering any pixel centre get the pixel of their centre
+            small = last < first
+            centre = np.floor(((lower[sel][small] + upper[sel][small]) / 2. - start) * scale).astype(np.int64)
+            first[small] = centre
+            last[small] = centre
+            pixels.append((np.maximum(first, 0), np.minimum(last, npix - 1)))
+        (colfirst, collast), (rowfirst, rowlast) = pixels
+        self.check_cancelled()
+        inside = (colfirst <= collast) & (rowfirst <= rowlast)
+        sel, colfirst, rowfirst = sel[inside], colfirst[inside], rowfirst[inside]
+        width = collast[inside] - colfirst + 1
+        height = rowlast[inside] - rowfirst + 1
+        values = self.values[sel]
+        result = np.full((ny, nx), np.nan)
+        for drow in range(height.max() if height.size > 0 else 0):
+            rows = np.nonzero(height > drow)[0]
+            for dcol in range(width[rows].max()):
+                self.check_cancelled()
+                cells = rows[width[rows] > dcol]
+                result[rowfirst[cells] + drow, colfirst[cells] + dcol] = values[cells]
+        return ma.masked_invalid(result), (x0, x1, y0, y1)
@@ -0,0 +1,140 @@
+"""Module for selecting points of (large) scatter plots with a lasso"""
+import datetime
+import numpy as np
+from numpy import ma
+from matplotlib import dates
+from matplotlib.path import Path
+
+# states of the grid cells for a lasso
+OUTSIDE, INSIDE, BORDER = 0, 1, 2
+
+
+def as_float(values):
+    """
+    :param values: 1D array of numbers, datetimes or datetime64, can be masked
+    :return: 1D array of floats in the units matplotlib uses for plotting, nan for masked values
+    """
+    values = ma.asarray(values)
+    data = ma.getdata(values)
+    if data.dtype.kind == "M" or (data.dtype.kind == "O" and data.size > 0 and
+                                  isinstance(data.flat[0], (datetime.datetime, datetime.date))):
+        data = dates.date2num(data)
+    floats = np.array(data, dtype=float).ravel()
+    floats[ma.getmaskarray(values).ravel()] = np.nan
+    return floats
+
+
+class PointIndex(object):
+    """
+    Uniform grid over the points of a scatter plot. A lasso only tests the points of cells its outline passes
+    through; cells completely inside are taken as a whole, the rest of the points is never looked at.
+    """
+
+    def __init__(self, xdata, ydata, rowlength=None, points_per_cell=4, max_cells=2048):
+        """
+        :param xdata: 1D array of x values (numbers or datetimes)
+        :param ydata: 1D array of y values of the same length
+        :param rowlength: int, if the points are several rows of this length one after the other, a point index
+                          (position in the row) is selected if it is inside the lasso for any of the rows
+        :param points_per_cell: int, average number of points per cell the grid is sized for
+        :param max_cells: int, upper limit of cells along x and y
+        """
+        self.x = as_float(xdata)
+        self.y = as_float(ydata)
+        if len(self.x) != len(self.y):
+            raise ValueError("x and y need the same number of points for a selection")
+        self.rowlength = rowlength
+        self.size = len(self.x) if rowlength is None else rowlength
+        valid = np.isfinite(self.x) & np.isfinite(self.y)
+        nvalid = int(valid.sum())
+        self.ncells = int(np.clip(np.sqrt(nvalid / points_per_cell), 1, max_cells))
+        if nvalid > 0:
+            self.lower = np.array([np.fmin.reduce(self.x[valid]), np.fmin.reduce(self.y[valid])])
+            self.upper = np.array([np.fmax.reduce(self.x[valid]), np.fmax.reduce(self.y[valid])])
+        else:
+            self.lower = np.zeros(2)
+            self.upper = np.ones(2)
+        self.step = np.where(self.upper > self.lower, (self.upper - self.lower) / self.ncells, 1.)
+        # points closer to the outline of a lasso than this are on it, and selected
+        self.tolerance = 1e-9 * np.maximum(np.maximum(np.abs(self.lower), np.abs(self.upper)), self.step).min()
+        self.cells = np.full(len(self.x), self.ncells * self.ncells, dtype=np.int32)  # invalid points are in no cell
+        self.cells[valid] = (self.cell_numbers(self.y[valid], 1) * self.ncells +
+                             self.cell_numbers(self.x[valid], 0))
+
+    def swap_axes(self):
+        """exchange x and y, the grid is transposed without binning the points again"""
+        self.x, self.y = self.y, self.x
+        self.lower = self.lower[::-1].copy()
+        self.upper = self.upper[::-1].copy()
+        self.step = self.step[::-1].copy()
+        valid = self.cells < self.ncells * self.ncells
+        rows, cols = np.divmod(self.cells[valid], self.ncells)
+        self.cells[valid] = cols * self.ncells + rows
+
+    def cell_numbers(self, values, axis):
+        """
+        :param values: 1D array of floats, x (axis 0) or y (axis 1) values inside the grid
+        :param axis: int, 0 for x, 1 for y
+        :return: 1D array of int32, column (x) or row (y) of the cells
+        """
+        numbers = ((values - self.lower[axis]) / self.step[axis]).astype(np.int32)
+        return np.minimum(numbers, self.ncells - 1, out=numbers)
+
+    def cell_states(self, path):
+        """
+        :param path: matplotlib Path of the lasso
+        :return: array of OUTSIDE, INSIDE or BORDER for each cell and a last entry (OUTSIDE) for invalid points
+        """
+        states = np.full(self.ncells * self.ncells + 1, OUTSIDE, dtype=np.int8)
+        verts = path.vertices
+        if (verts.max(axis=0) < self.lower).any() or (verts.min(axis=0) > self.upper).any():
+            return states
+        low = np.clip(np.floor((verts.min(axis=0) - self.lower) / self.step).astype(int), 0, self.ncells - 1)
+        high = np.clip(np.floor((verts.max(axis=0) - self.lower) / self.step).astype(int), 0, self.ncells - 1)
+        # cells touched by the outline: sample each edge at half a cell and add the neighbours of those cells
+        closed = np.vstack([verts, verts[:1]])
+        samples = [closed[-1:]]
+        for start, stop in zip(closed[:-1], closed[1:]):
+            nsample = int(np.ceil(np.max(np.abs(stop - start) / self.step) * 2)) + 1
+            samples.append(start + np.linspace(0, 1, nsample, endpoint=False)[:, None] * (stop - start))
+        touched = np.clip(np.floor((np.vstack(samples) - self.lower) / self.step).astype(int), -1, self.ncells) + 1
+        border = np.zeros((self.ncells + 2, self.ncells + 2), dtype=bool)
+        for shift_y in (-1, 0, 1):
+            for shift_x in (-1, 0, 1):
+                border[np.clip(touched[:, 1] + shift_y, 0, self.ncells + 1),
+                       np.clip(touched[:, 0] + shift_x, 0, self.ncells + 1)] = True
+        border = border[1:-1, 1:-1]
+        grid = states[:-1].reshape(self.ncells, self.ncells)
+        # cells not touched are completely inside or outside, and so is each run of them along a row: only the
+        # centre of the first cell of a run is tested
+        free = ~border[low[1]:high[1] + 1, low[0]:high[0] + 1]
+        starts = free.copy()
+        starts[:, 1:] &= ~free[:, :-1]
+        rows, cols = np.nonzero(starts)
+        if len(rows) > 0:
+            centres = self.lower + (np.column_stack([cols + low[0], rows + low[1]]) + 0.5) * self.step
+            inside = np.where(path.contains_points(centres), INSIDE, OUTSIDE).astype(np.int8)
+            runs = np.cumsum(starts.ravel()).reshape(starts.shape) - 1
+            grid[low[1]:high[1] + 1, low[0]:high[0] + 1][free] = inside[runs[free]]
+        grid[border] = BORDER
+        return states
+
+    def select(self, verts):
+        """
+        :param verts: list of (x, y) vertices of the lasso in data coordinates
+        :return: 1D array of bool, True for the points (point indices of the rows) inside the lasso, points on its
+                 outline are inside as well
+        """
+        path = Path(verts)
+        states = self.cell_states(path)[self.cells]
+        selected = states == INSIDE
+        candidates = np.nonzero(states == BORDER)[0]
+        if len(candidates) > 0:
+            points = np.column_stack([self.x[candidates], self.y[candidates]])
+            # on its own contains_points takes points on the outline depending on the direction the lasso was drawn
+            # in, with a tiny radius of either sign one test grows the path, so the outline is always included
+            selected[candidates] = (path.contains_points(points, radius=self.tolerance) |
+                                    path.contains_points(points, radius=-self.tolerance))
+        if self.rowlength is not None:
+            return selected.reshape(-1, self.rowlength).any(axis=0)
+        return selected
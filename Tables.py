@@ -18,6 +18,10 @@ try:
     from .Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt
 except (ImportError, ModuleNotFoundError):
     from Converters import Hdf4Object, Table, Representative, MFC_type, dictgen, read_txt
+try:
+    from .helper_tools import IO_LOCK
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import IO_LOCK
 
 class MyTable(QWidget):
     """
@@ -74,10 +78,12 @@ class MyTable(QWidget):
         self.c_idx2 = 0
         self.c_dim2 = 1
         try:
-            self.maxidxs = np.squeeze(data.mdata[:]).shape
+            with IO_LOCK:
+                self.maxidxs = np.squeeze(data.mdata[:]).shape
         except (AttributeError, IndexError, TypeError):
             try:
-                self.maxidxs = np.squeeze(data[:]).shape
+                with IO_LOCK:
+                    self.maxidxs = np.squeeze(data[:]).shape
             except (AttributeError, IndexError, TypeError):
                 self.maxidxs = [1]
         except Exception as exs:
@@ -93,10 +99,12 @@ class MyTable(QWidget):
         
         if hasattr(data, "mdata"):
             if isinstance(data.mdata, Representative):
-                self.all_data = np.squeeze(data.mdata.get_value())
+                with IO_LOCK:
+                    self.all_data = np.squeeze(data.mdata.get_value())
             else:
                 try:
-                    self.all_data = np.squeeze(data.mdata[:])
+                    with IO_LOCK:
+                        self.all_data = np.squeeze(data.mdata[:])
                 except:
                     self.all_data = np.array([data.mdata])
         else:
@@ -0,0 +1,266 @@
+"""Module with background jobs used by NetCDF4viewer and Fastplot that should not block the GUI"""
+import os
+import threading
+from collections import OrderedDict
+import netCDF4
+import pyhdf.SD
+from PIL import Image
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    from .helper_tools import summary_statistics, colour_limits, colorize, IO_LOCK
+except (ImportError, ModuleNotFoundError):
+    from helper_tools import summary_statistics, colour_limits, colorize, IO_LOCK
+try:
+    from .Rasterize import RenderCancelled
+except (ImportError, ModuleNotFoundError):
+    from Rasterize import RenderCancelled
+
+
+class StatisticsWorker(QThread):
+    """
+    Compute min, max, mean and fill fraction of variables in the background. The worker opens its own handle of
+    the file, results are emitted one variable at a time in the order given.
+    """
+    result = pyqtSignal(str, object)
+
+    def __init__(self, filename, filetype, variables, max_elements=1000000):
+        """
+        :param filename: str, file to compute the statistics for
+        :param filetype: str, netcdf4 or hdf4
+        :param variables: list of keys, paths of netCDF variables or references of hdf4 sd datasets
+        :param max_elements: int, number of elements read at once
+        """
+        super(StatisticsWorker, self).__init__()
+        self.filename = filename
+        self.filetype = filetype
+        self.variables = list(variables)
+        self.max_elements = max_elements
+
+    def run(self):
+        # the hdf libraries are not thread safe, everything touching the file is serialized with the GUI
+        with IO_LOCK:
+            if self.filetype == "netcdf4":
+                fid = netCDF4.Dataset(self.filename)
+            else:
+                fid = pyhdf.SD.SD(self.filename)
+        try:
+            for key in self.variables:
+                if self.isInterruptionRequested():
+                    break
+                try:
+                    if self.filetype == "netcdf4":
+                        with IO_LOCK:
+                            variable = fid[key]
+                            shape = variable.shape
+                        stats = summary_statistics(variable, max_elements=self.max_elements, shape=shape)
+                    else:
+                        with IO_LOCK:
+                            sds = fid.select(fid.reftoindex(int(key)))
+                            fillvalue = None
+                            for attr, value in sds.attributes().items():
+                                if "fillvalue" in attr.lower() or "fill_value" in attr.lower():
+                                    fillvalue = value
+                                    break
+                            shape = sds.info()[2]
+                        stats = summary_statistics(sds, fillvalue, max_elements=self.max_elements, shape=shape)
+                except Exception as exc:
+                    print("statistics could not be computed for ", key, exc)
+                    stats = None
+                self.result.emit(str(key), stats)
+        finally:
+            with IO_LOCK:
+                if self.filetype == "netcdf4":
+                    fid.close()
+                else:
+                    fid.end()
+
+
+class ColourLimitsWorker(QThread):
+    """
+    Compute the colour limits of a whole variable (minimum and maximum, and robust ones from percentiles) chunk by
+    chunk in the background, so all slices can be shown with the same colours.
+    """
+    result = pyqtSignal(object)
+
+    def __init__(self, mdata, percentile=2, max_elements=1000000):
+        """
+        :param mdata: netCDF4 variable or array, anything with slicing and shape
+        :param percentile: float, lower percentile of the robust limits, the upper one is 100 - percentile
+        :param max_elements: int, number of elements read at once
+        """
+        super(ColourLimitsWorker, self).__init__()
+        self.mdata = mdata
+        self.percentile = percentile
+        self.max_elements = max_elements
+
+    def run(self):
+        try:
+            limits = colour_limits(self.mdata, self.percentile, self.max_elements,
+                                   cancelled=self.isInterruptionRequested)
+        except Exception as exc:
+            print("colour limits could not be computed ", exc)
+            limits = None
+        if not self.isInterruptionRequested():
+            self.result.emit(limits)
+
+
+class FrameRenderer(QThread):
+    """
+    Read and colour the frames of an animation ahead of the playhead in the background. At most max_frames frames
+    are kept, frames behind the playhead are dropped, so showing a frame only costs drawing the colours. If a frame
+    cannot be rendered, failed is emitted with the error and the thread stops.
+    """
+    failed = pyqtSignal(str)
+
+    def __init__(self, get_slice, indices, norm, lut, max_frames=16):
+        """
+        :param get_slice: function of an index returning the 2D data of that frame
+        :param indices: list of indices in the order they are played (the playback loops)
+        :param norm: matplotlib Normalize (or LogNorm), fixed for all frames
+        :param lut: array (256, 4) of uint8, colours of the colour map
+        :param max_frames: int, upper limit of frames in the cache
+        """
+        super(FrameRenderer, self).__init__()
+        self.get_slice = get_slice
+        self.indices = list(indices)
+        self.norm = norm
+        self.lut = lut
+        self.max_frames = max(1, min(max_frames, len(self.indices)))
+        self.frames = {}
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def render(self, index):
+        """
+        :param index: index of the frame
+        :return: array (M, N, 4) of uint8, the coloured frame
+        """
+        with IO_LOCK:
+            mdata = self.get_slice(index)
+        return colorize(mdata, self.norm, self.lut)
+
+    def get(self, index):
+        """
+        :param index: index of the frame
+        :return: array (M, N, 4) of uint8, None if it is not rendered yet
+        """
+        with self.lock:
+            return self.frames.get(index)
+
+    def set_playhead(self, index):
+        """
+        :param index: index of the frame shown now, the frames following it are rendered next
+        """
+        with self.lock:
+            self.position = self.indices.index(index)
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            with self.lock:
+                ahead = [self.indices[(self.position + step) % len(self.indices)] for step in range(self.max_frames)]
+                for index in list(self.frames):
+                    if index not in ahead:
+                        del self.frames[index]
+                missing = [index for index in ahead if index not in self.frames]
+            if not missing:
+                self.msleep(5)
+                continue
+            try:
+                frame = self.render(missing[0])
+            except Exception as exc:
+                self.failed.emit(str(exc))
+                return
+            with self.lock:
+                self.frames[missing[0]] = frame
+
+
+class ViewRenderer(QThread):
+    """
+    Compute the pixels of view dependent images (see Rasterize) in the background, so zooming, panning or stepping
+    through slices never waits for them. Only the newest request of an image is computed: an older one still waiting
+    is replaced, one being computed is cancelled. The thread only runs while there is something to compute.
+    """
+    ready = pyqtSignal(object, int, object, object, object)  # image, generation, view, pixels, extent
+
+    def __init__(self):
+        super(ViewRenderer, self).__init__()
+        self.pending = OrderedDict()
+        self.current = None
+        self.active = False
+        self.condition = threading.Condition()
+
+    def request(self, image, view):
+        """
+        :param image: ViewDependentImage
+        :param view: tuple (x0, x1, y0, y1, nx, ny) to compute
+        :return: int, generation of the request, the result is only current if the image still has it
+        """
+        with self.condition:
+            image.generation += 1
+            self.pending.pop(image, None)
+            self.pending[image] = (image.generation, view)
+            if not self.active:
+                self.active = True
+                # the last run may still be finishing
+                self.wait()
+                self.start()
+            return image.generation
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            with self.condition:
+                if not self.pending:
+                    self.active = False
+                    return
+                image, (generation, view) = self.pending.popitem(last=False)
+                self.current = image
+            try:
+                mdata, extent = image.compute_in_background(view, generation)
+            except RenderCancelled:
+                continue
+            except Exception as exc:
+                print("view could not be computed in the background: ", exc)
+                continue
+            finally:
+                self.current = None
+            self.ready.emit(image, generation, view, mdata, extent)
+        self.active = False
+
+    def stop(self):
+        """cancel the waiting requests and the one being computed, return once the thread ended"""
+        with self.condition:
+            for image in list(self.pending) + [self.current]:
+                if image is not None:
+                    image.generation += 1
+            self.pending.clear()
+        self.requestInterruption()
+        self.wait()
+
+
+def export_frames(frames, filename, fps=10):
+    """
+    write frames as animated GIF or, for any other extension, as numbered images (e.g. name_0000.png)
+
+    :param frames: iterable of arrays (M, N, 4) of uint8
+    :param filename: str, name of the GIF or pattern of the images
+    :param fps: float, frames per second of the GIF
+    :return: int, number of frames written
+    """
+    if filename.lower().endswith(".gif"):
+        images = [Image.fromarray(frame, "RGBA") for frame in frames]
+        if not images:
+            return 0
+        images[0].save(filename, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0,
+                       disposal=2)
+        return len(images)
+    base, ext = os.path.splitext(filename)
+    if not ext:
+        ext = ".png"
+    number = 0
+    for number, frame in enumerate(frames, 1):
+        image = Image.fromarray(frame, "RGBA")
+        if ext.lower() in (".jpg", ".jpeg"):
+            image = image.convert("RGB")
+        image.save("{}_{:04d}{}".format(base, number - 1, ext))
+    return number
@@ -1,24 +1,419 @@
+import datetime
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import cftime
 from cftime import num2date, date2num
 
-def check_for_time(mdata):
-    mydata = mdata[:]
+# serializes reads of file handles between the GUI and background jobs, the hdf libraries are not thread safe
+IO_LOCK = threading.RLock()
+
+
+# calendars numpy datetime64 (proleptic gregorian) can represent, "standard" only after the gregorian reform
+STANDARD_CALENDARS = ("standard", "gregorian", "proleptic_gregorian")
+GREGORIAN_START = np.datetime64("1582-10-15")
+# microseconds per unit of "<unit> since <date>", months and years have no fixed length and are left to cftime
+TIME_UNITS = {"microseconds": 1, "microsecond": 1, "us": 1, "milliseconds": 1000, "millisecond": 1000, "ms": 1000,
+              "seconds": 10 ** 6, "second": 10 ** 6, "secs": 10 ** 6, "sec": 10 ** 6, "s": 10 ** 6,
+              "minutes": 60 * 10 ** 6, "minute": 60 * 10 ** 6, "mins": 60 * 10 ** 6, "min": 60 * 10 ** 6,
+              "hours": 3600 * 10 ** 6, "hour": 3600 * 10 ** 6, "hrs": 3600 * 10 ** 6, "hr": 3600 * 10 ** 6,
+              "h": 3600 * 10 ** 6, "days": 86400 * 10 ** 6, "day": 86400 * 10 ** 6, "d": 86400 * 10 ** 6,
+              "weeks": 7 * 86400 * 10 ** 6, "week": 7 * 86400 * 10 ** 6}
+# converted time variables, the oldest are dropped when they take more than TIME_CACHE_BYTES
+TIME_CACHE = OrderedDict()
+TIME_CACHE_BYTES = 256 * 2 ** 20
+
+
+def time_origin(unit, calendar="standard"):
+    """
+    :param unit: str, CF time unit, e.g. "hours since 2000-01-01 00:00:00"
+    :param calendar: str, CF calendar
+    :return: tuple (microseconds per unit, datetime64[us] of the origin), None if numpy cannot represent the times,
+             also if the origin is julian (before the gregorian reform in the standard calendar): the days between
+             the origin and later dates differ then
+    """
+    if not isinstance(unit, str) or " since " not in unit or str(calendar).lower() not in STANDARD_CALENDARS:
+        return None
+    step = TIME_UNITS.get(unit.split(" since ")[0].strip().lower())
+    if step is None:
+        return None
+    # cftime parses the origin (formats, time zones), only this one value is converted by it
+    origin = np.datetime64(num2date(0, unit, calendar, only_use_cftime_datetimes=False), "us")
+    if str(calendar).lower() != "proleptic_gregorian" and origin < GREGORIAN_START:
+        return None
+    return step, origin
+
+
+def to_datetime64(values, unit, calendar="standard"):
+    """
+    vectorized num2date for the calendars numpy can represent
+
+    :param values: array of numbers (can be masked), time in unit
+    :param unit: str, CF time unit, e.g. "days since 1970-01-01"
+    :param calendar: str, CF calendar
+    :return: array of datetime64[us] (masked where values are masked), None if cftime has to convert the times
+    """
+    origin = time_origin(unit, calendar)
+    if origin is None or np.asarray(values).dtype.kind not in "iuf":
+        return None
+    step, origin = origin
+    mask = np.ma.getmaskarray(values)
+    data = np.where(mask, 0, np.ma.getdata(values))
+    if data.dtype.kind == "f":
+        finite = np.isfinite(data)
+        if not finite.all() or np.abs(data).max(initial=0) * step >= 2 ** 62:
+            mask = mask | ~finite | (np.abs(data) * step >= 2 ** 62)
+            data = np.where(mask, 0, data)
+        offsets = np.round(data * step).astype(np.int64)
+    else:
+        offsets = data.astype(np.int64) * step
+    times = origin + offsets.astype("timedelta64[us]")
+    if str(calendar).lower() != "proleptic_gregorian" and (times[~mask] < GREGORIAN_START).any():
+        # the standard calendar is julian before the reform
+        return None
+    if np.ma.isMaskedArray(values) or mask.any():
+        return np.ma.masked_array(times, mask=mask)
+    return times
+
+
+def is_datetime(values):
+    """:return: True if values (array or single value) are datetimes (datetime64, datetime or cftime)"""
+    first = np.ravel(values)[0] if np.size(values) > 0 else None
+    return np.asarray(values).dtype.kind == "M" or isinstance(first, (np.datetime64, datetime.date, cftime.datetime))
+
+
+def time_key(mdata):
+    """
+    :return: key of a variable in TIME_CACHE, None if the variable cannot be identified. The key has the size and
+             modification time of the file, a rewritten file does not get the times of the old one.
+    """
+    try:
+        filepath = mdata.group().filepath()
+        stat = os.stat(filepath)
+        return (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size, mdata.group().path, mdata.name,
+                mdata.shape, str(mdata.units), str(getattr(mdata, "calendar", "standard")))
+    except Exception:
+        return None
+
+
+def check_for_time(mdata, selection=slice(None)):
+    """
+    read a variable, time variables (the name contains time and the unit is "<unit> since <date>") are converted to
+    datetime64 if the calendar allows, else to datetimes with cftime. Converted times are cached per variable.
+
+    :param mdata: netCDF4 variable (or anything with __getitem__, name and units)
+    :param selection: index of the part to read, only the whole variable is cached
+    :return: tuple of the data and the unit (None if there is none)
+    """
     try:
         unit = mdata.units
     except Exception as err:
         print(err)
         unit = None
-    if "time" in mdata.name.lower():
+    if "time" in mdata.name.lower() and unit is not None:
+        key = time_key(mdata) if isinstance(selection, slice) and selection == slice(None) else None
+        if key is not None and key in TIME_CACHE:
+            TIME_CACHE.move_to_end(key)
+            return TIME_CACHE[key].copy(), unit
+        with IO_LOCK:
+            mydata = mdata[selection]
+        calendar = getattr(mdata, "calendar", "standard")
         try:
-            unit = mdata.units
-            mydata = num2date(mydata, unit, only_use_cftime_datetimes=False)
-        except:
-            pass
-    #print("found unit is: ", unit)
+            times = to_datetime64(mydata, unit, calendar)
+            if times is None:
+                times = num2date(mydata, unit, calendar, only_use_cftime_datetimes=False)
+        except Exception:
+            return mydata, unit
+        if key is not None:
+            TIME_CACHE[key] = times
+            while len(TIME_CACHE) > 1 and sum(entr.nbytes for entr in TIME_CACHE.values()) > TIME_CACHE_BYTES:
+                TIME_CACHE.popitem(last=False)
+            times = times.copy()
+        return times, unit
+    with IO_LOCK:
+        mydata = mdata[selection]
     return mydata, unit
 
+
 def convert_from_time(mdata):
-    #unit = "hours since "+mdata[0].strftime("%Y-%m-%d %H:%M:%S")
-    mdata.datavalue = date2num(mdata.datavalue, mdata.units)
-    #print("dtype:", mdata.datavalue.dtype)
-    #print("units:", mdata.units)
+    """
+    convert the times of mdata back to numbers in mdata.units, datetime64 vectorized, other datetimes with cftime
+
+    :param mdata: MyQLabel with datavalue, units and optionally calendar
+    :return: mdata
+    """
+    times = mdata.datavalue
+    calendar = getattr(mdata, "calendar", "standard")
+    origin = time_origin(mdata.units, calendar)
+    if origin is not None and np.asarray(times).dtype.kind == "M":
+        step, origin = origin
+        offsets = (np.ma.getdata(times).astype("datetime64[us]") - origin).astype(np.int64)
+        numbers = offsets / step if offsets.size == 0 or (offsets % step).any() else offsets // step
+    elif np.asarray(times).dtype.kind == "M":
+        # the fields of the (gregorian) datetime64 are the date in the calendar of the unit, cftime counts the days
+        dates = np.ma.getdata(times).astype("datetime64[us]").astype(object)
+        numbers = date2num([cftime.datetime(*entr.timetuple()[:6], entr.microsecond, calendar=calendar)
+                            for entr in np.ravel(dates)], mdata.units, calendar)
+        numbers = np.reshape(numbers, np.shape(dates))
+    else:
+        mdata.datavalue = date2num(times, mdata.units)
+        return mdata
+    mdata.datavalue = np.ma.masked_array(numbers, mask=np.ma.getmaskarray(times)) \
+        if np.ma.isMaskedArray(times) else numbers
     return mdata
+
+
+def iter_slabs(shape, max_elements=1000000):
+    """
+    split an array of shape into slabs along the leading dimensions, each slab at most max_elements large
+
+    :param shape: tuple, shape of the array to split
+    :param max_elements: int, upper limit of elements per slab (one row of the last dimension is the minimum)
+    :return: generator of tuples of slices
+    """
+    shape = tuple(shape)
+    if len(shape) == 0:
+        yield ()
+        return
+    inner = 1
+    axis = len(shape)
+    # find the outermost axis along which slabs still fit
+    while axis > 0 and inner * shape[axis - 1] <= max_elements:
+        axis -= 1
+        inner *= shape[axis]
+    if axis == 0:
+        yield tuple(slice(None) for _ in shape)
+        return
+    step = max(1, max_elements // inner)
+    for outer in np.ndindex(*shape[:axis - 1]):
+        for start in range(0, shape[axis - 1], step):
+            yield (tuple(slice(idx, idx + 1) for idx in outer) + (slice(start, start + step),) +
+                   tuple(slice(None) for _ in shape[axis:]))
+
+
+def summary_statistics(mdata, fillvalue=None, max_elements=1000000, shape=None):
+    """
+    chunked min, max, mean and fraction of fill values of a numeric variable
+
+    :param mdata: netCDF4 variable, pyhdf SDS or array, anything with slicing
+    :param fillvalue: value to treat as fill in addition to masked and non-finite entries
+    :param max_elements: int, number of elements read at once
+    :param shape: tuple, shape of mdata, only needed if mdata has no shape attribute
+    :return: dictionary with keys min, max, mean and fill, or None if the variable is not numeric
+    """
+    if shape is None:
+        shape = mdata.shape
+    if np.ndim(shape) == 0:
+        shape = (shape, )
+    shape = tuple(int(entr) for entr in shape)
+    total = int(np.prod(shape))
+    if total == 0:
+        return {"min": np.nan, "max": np.nan, "mean": np.nan, "fill": 1.}
+    nvalid = 0
+    msum = 0.
+    mmin = np.inf
+    mmax = -np.inf
+    for slab in iter_slabs(shape, max_elements):
+        with IO_LOCK:
+            chunk = mdata[slab] if len(slab) > 0 else mdata[...]
+        if np.asarray(chunk).dtype.kind not in "biuf":
+            return None
+        valid = ~np.ma.getmaskarray(chunk)
+        chunk = np.ma.getdata(chunk).astype(float)
+        if fillvalue is not None:
+            valid &= chunk != fillvalue
+        valid &= np.isfinite(chunk)
+        values = chunk[valid]
+        if values.size == 0:
+            continue
+        nvalid += values.size
+        msum += values.sum()
+        mmin = min(mmin, values.min())
+        mmax = max(mmax, values.max())
+    if nvalid == 0:
+        return {"min": np.nan, "max": np.nan, "mean": np.nan, "fill": 1.}
+    return {"min": float(mmin), "max": float(mmax), "mean": msum / nvalid, "fill": 1. - nvalid / total}
+
+
+class QuantileSketch(object):
+    """
+    approximate quantiles of data seen chunk by chunk: every valid value is kept with the same probability, so that
+    about capacity values of the whole data are kept. Minimum and maximum are exact.
+    """
+
+    def __init__(self, total, capacity=200000, seed=0):
+        """
+        :param total: int, number of values that will be added
+        :param capacity: int, number of values to keep about
+        :param seed: int, seed of the random sampling, the same data gives the same quantiles
+        """
+        self.rate = min(1., capacity / max(total, 1))
+        self.random = np.random.default_rng(seed)
+        self.samples = []
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, chunk):
+        """
+        :param chunk: array (can be masked), masked and non-finite values are ignored
+        """
+        values = np.ma.getdata(chunk).astype(float).ravel()
+        valid = np.isfinite(values) & ~np.ma.getmaskarray(chunk).ravel()
+        values = values[valid]
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        if self.rate < 1:
+            values = values[self.random.random(values.size) < self.rate]
+        self.samples.append(values)
+
+    def quantile(self, q):
+        """
+        :param q: float or array of floats between 0 and 1
+        :return: float or array of the approximate quantiles, nan if nothing was added
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        return np.quantile(np.concatenate(self.samples + [np.array([self.min, self.max])]), q)
+
+
+def colour_limits(mdata, percentile=2, max_elements=1000000, shape=None, cancelled=None):
+    """
+    chunked colour limits of a numeric variable: minimum and maximum, and the percentile and 100 - percentile
+
+    :param mdata: netCDF4 variable, array, anything with slicing
+    :param percentile: float, lower percentile of the robust limits
+    :param max_elements: int, number of elements read at once
+    :param shape: tuple, shape of mdata, only needed if mdata has no shape attribute
+    :param cancelled: function returning True if the computation should stop
+    :return: dictionary with keys global and robust, each a tuple (vmin, vmax), None if not numeric, empty or cancelled
+    """
+    if shape is None:
+        shape = np.shape(mdata)
+    shape = tuple(int(entr) for entr in shape)
+    sketch = QuantileSketch(int(np.prod(shape)))
+    for slab in iter_slabs(shape, max_elements):
+        if cancelled is not None and cancelled():
+            return None
+        with IO_LOCK:
+            chunk = mdata[slab] if len(slab) > 0 else mdata[...]
+        if np.asarray(chunk).dtype.kind not in "biuf":
+            return None
+        sketch.add(chunk)
+    if sketch.count == 0:
+        return None
+    lower, upper = sketch.quantile([percentile / 100., 1 - percentile / 100.])
+    return {"global": (float(sketch.min), float(sketch.max)), "robust": (float(lower), float(upper))}
+
+
+def minmax_decimate(x, xnum, y, xlim, nbins):
+    """
+    reduce a line with increasing x to the first, last, minimum and maximum point of each of nbins equally wide
+    columns between xlim. Drawn with nbins pixels in x, it looks the same as the full line, all peaks are kept.
+
+    :param x: 1D array, x values to return (any type, e.g. dates)
+    :param xnum: 1D array of floats, increasing numeric version of x in the units of xlim
+    :param y: 1D array of floats, nan for missing values
+    :param xlim: tuple of two floats, visible range of x
+    :param nbins: int, number of columns, usually the width of the axes in pixels
+    :return: tuple of x and y of the decimated line
+    """
+    xlo, xhi = min(xlim), max(xlim)
+    # one point outside of the view on each side, so the line continues to the border
+    start = max(np.searchsorted(xnum, xlo, "left") - 1, 0)
+    stop = min(np.searchsorted(xnum, xhi, "right") + 1, len(xnum))
+    if stop - start <= 4 * nbins:
+        return x[start:stop], y[start:stop]
+    edges = np.searchsorted(xnum, np.linspace(xlo, xhi, nbins + 1))
+    firsts = np.unique(np.concatenate(([start], edges, [stop - 1])))
+    firsts = firsts[(firsts >= start) & (firsts < stop)]
+    lasts = np.append(firsts[1:], stop) - 1
+    ysub = y[start:stop]
+    ymin = np.fmin.reduceat(ysub, firsts - start)
+    ymax = np.fmax.reduceat(ysub, firsts - start)
+    xout = np.stack([x[firsts], x[firsts], x[firsts], x[lasts]], axis=1).ravel()
+    yout = np.stack([y[firsts], ymin, ymax, y[lasts]], axis=1).ravel()
+    return xout, yout
+
+
+def colorize(mdata, norm, lut):
+    """
+    colour 2D data with a lookup table, faster than calling the colour map for every value
+
+    :param mdata: 2D array, masked values are transparent
+    :param norm: matplotlib Normalize (or LogNorm), scales the data to 0-1
+    :param lut: array (256, 4) of uint8, RGBA colours of the colour map, e.g. cmap(np.linspace(0, 1, 256), bytes=True)
+    :return: array (M, N, 4) of uint8
+    """
+    scaled = np.ma.masked_invalid(norm(mdata))
+    index = (np.clip(np.ma.getdata(scaled), 0, 1) * (len(lut) - 1)).astype(np.uint8)
+    rgba = lut[index]
+    rgba[np.ma.getmaskarray(scaled)] = 0
+    return rgba
+
+
+class AppendBuffer(object):
+    """
+    array growing along its first axis, with spare room at the end: the capacity is doubled whenever it is full, so
+    appending k values costs O(k) amortized instead of copying everything appended before
+    """
+
+    def __init__(self, values, capacity=16):
+        """
+        :param values: array (can be masked) to start with
+        :param capacity: int, minimum number of entries to reserve
+        """
+        values = np.ma.asarray(values)
+        self.size = 0
+        self.data = np.empty((max(capacity, len(values), 1), ) + values.shape[1:], dtype=values.dtype)
+        # only allocated when something masked is appended
+        self.mask = None
+        self.append(values)
+
+    def reserve(self, size, dtype=None):
+        """
+        :param size: int, number of entries needed
+        :param dtype: numpy dtype the entries need, the buffer is converted if it differs
+        """
+        if dtype is None:
+            dtype = self.data.dtype
+        if size <= len(self.data) and dtype == self.data.dtype:
+            return
+        capacity = len(self.data)
+        while capacity < size:
+            capacity *= 2
+        data = np.empty((capacity, ) + self.data.shape[1:], dtype=dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+        if self.mask is not None:
+            mask = np.zeros(data.shape, dtype=bool)
+            mask[:self.size] = self.mask[:self.size]
+            self.mask = mask
+
+    def append(self, values):
+        """
+        :param values: array (can be masked) with the same shape as the buffer apart from the first axis
+        """
+        values = np.ma.asarray(values)
+        stop = self.size + len(values)
+        self.reserve(stop, np.result_type(self.data.dtype, values.dtype))
+        self.data[self.size:stop] = np.ma.getdata(values)
+        if self.mask is None and np.ma.getmask(values) is not np.ma.nomask and values.mask.any():
+            self.mask = np.zeros(self.data.shape, dtype=bool)
+        if self.mask is not None:
+            self.mask[self.size:stop] = np.ma.getmaskarray(values)
+        self.size = stop
+
+    @property
+    def values(self):
+        """the filled part of the buffer, as view (masked if anything masked was appended)"""
+        if self.mask is None:
+            return self.data[:self.size]
+        return np.ma.array(self.data[:self.size], mask=self.mask[:self.size], copy=False)
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,107 @@
+import os
+import netCDF4
+import numpy as np
+import pytest
+from PIL import Image
+
+from Batchrender import parse_slice, output_name, image_names, render_file, main
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("0,:,:", (0, slice(None), slice(None))),
+    ("3, 10:20, ::2", (3, slice(10, 20), slice(None, None, 2))),
+    ("-1,::-1", (-1, slice(None, None, -1))),
+    ("5:1:-2", (slice(5, 1, -2), )),
+    ("-3:", (slice(-3, None), )),
+])
+def test_parse_slice(spec, expected):
+    assert parse_slice(spec) == expected
+    values = np.arange(6 * 7 * 8).reshape(6, 7, 8)
+    values[parse_slice(spec)]
+
+
+@pytest.mark.parametrize("spec", ["a", "0,,1", "1:2:3:4", "::0", "1.5", "0;1", ""])
+def test_parse_slice_bad_input(spec):
+    with pytest.raises(ValueError, match="cannot read the slice"):
+        parse_slice(spec)
+
+
+def test_bad_slice_on_the_command_line(capsys):
+    with pytest.raises(SystemExit):
+        main(["x.nc", "-v", "temp", "-s", "1:2:3:4"])
+    assert "cannot read the slice" in capsys.readouterr().err
+
+
+def test_output_name():
+    assert output_name("/data/granule.nc", "/group/temp", "0,:,10:20", "out") == \
+        os.path.join("out", "granule_group-temp_0-all-10to20.png")
+    assert output_name("granule.nc", "temp", None, "out", name="a-granule-nc") == \
+        os.path.join("out", "a-granule-nc_temp.png")
+    assert output_name("granule.nc", "temp", "-1,::-1", "") == "granule_temp_-1-toto-1.png"
+
+
+def test_image_names_of_files_with_the_same_name():
+    names = image_names([os.path.join("data", "a", "granule.nc"), os.path.join("data", "b", "granule.nc"),
+                         os.path.join("data", "b", "granule.hdf"), os.path.join("data", "other.nc")])
+    assert names == {os.path.join("data", "a", "granule.nc"): "a-granule-nc",
+                     os.path.join("data", "b", "granule.nc"): "b-granule-nc",
+                     os.path.join("data", "b", "granule.hdf"): "b-granule-hdf",
+                     os.path.join("data", "other.nc"): "other"}
+    assert len(set(names.values())) == len(names)
+
+
+@pytest.fixture
+def ncfile(tmp_path):
+    path = str(tmp_path / "granule.nc")
+    with netCDF4.Dataset(path, "w") as fid:
+        fid.createDimension("time", 3)
+        fid.createDimension("y", 20)
+        fid.createDimension("x", 30)
+        lat = fid.createVariable("lat", "f4", ("y", "x"))
+        lon = fid.createVariable("lon", "f4", ("y", "x"))
+        jj, ii = np.mgrid[0:20, 0:30]
+        lat[:] = 40 + jj * 0.1
+        lon[:] = 10 + ii * 0.1 + jj * 0.02
+        temp = fid.createVariable("temp", "f4", ("time", "y", "x"), fill_value=-999.)
+        temp[:] = np.random.default_rng(13).random((3, 20, 30))
+        temp[0, 0, 0] = np.ma.masked
+        group = fid.createGroup("group")
+        group.createVariable("profile", "f8", ("x", ))[:] = np.arange(30.)
+        fid.createVariable("group-profile", "f8", ("x", ))[:] = np.arange(30.) * 2
+    return path
+
+
+def test_render_file(ncfile, tmp_path):
+    outdir = str(tmp_path / "out")
+    os.makedirs(outdir)
+    settings = {"width": 3, "height": 2, "dpi": 50}
+    filename, written, errors = render_file(ncfile, ["temp", "/group/profile"], spec=None, outdir=outdir,
+                                            settings=settings)
+    # 3D without a slice cannot be shown, the 1D profile can
+    assert errors and errors[0].startswith("temp: has 3 dimensions")
+    assert written == [os.path.join(outdir, "granule_group-profile.png")]
+    filename, written, errors = render_file(ncfile, ["temp"], "lon", "lat", spec="-1,:,:", outdir=outdir,
+                                            settings=settings, name="a-granule-nc")
+    assert errors == []
+    assert written == [os.path.join(outdir, "a-granule-nc_temp_-1-all-all.png")]
+    assert Image.open(written[0]).size == (150, 100)
+    filename, written, errors = render_file(ncfile, ["temp"], spec="0,1:2:3:4", outdir=outdir, settings=settings)
+    assert written == [] and "cannot read the slice" in errors[0]
+
+
+def test_render_variables_with_the_same_image_name(ncfile, tmp_path):
+    filename, written, errors = render_file(ncfile, ["/group/profile", "group-profile"], outdir=str(tmp_path),
+                                            settings={"width": 3, "height": 2, "dpi": 50})
+    assert errors == []
+    assert written == [str(tmp_path / "granule_group-profile.png"), str(tmp_path / "granule_group-profile_2.png")]
+
+
+def test_render_files_with_the_same_name(ncfile, tmp_path):
+    for directory in ("a", "b"):
+        os.makedirs(str(tmp_path / directory))
+        os.link(ncfile, str(tmp_path / directory / "granule.nc"))
+    outdir = str(tmp_path / "out")
+    pattern = str(tmp_path / "*" / "granule.nc")
+    # the pattern twice: each file is rendered once
+    assert main([pattern, pattern, "-v", "/group/profile", "-o", outdir, "-j", "1"]) == 0
+    assert sorted(os.listdir(outdir)) == ["a-granule-nc_group-profile.png", "b-granule-nc_group-profile.png"]
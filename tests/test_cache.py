@@ -0,0 +1,51 @@
+import os
+import pytest
+
+from Cache import MetadataCache
+
+
+@pytest.fixture
+def datafile(tmp_path):
+    path = tmp_path / "data.nc"
+    path.write_bytes(b"0123456789")
+    return str(path)
+
+
+def test_metadata_cache_round_trip(datafile, tmp_path):
+    cache = MetadataCache(datafile, str(tmp_path / "cache"))
+    assert cache.get("statistics", "/temp") is None
+    cache.set("statistics", "/temp", {"min": 1.5, "max": 2.})
+    cache.save()
+    assert not cache.changed
+    again = MetadataCache(datafile, str(tmp_path / "cache"))
+    assert again.get("statistics", "/temp") == {"min": 1.5, "max": 2.}
+    assert again.get("statistics", "/other", "missing") == "missing"
+
+
+def test_metadata_cache_invalid_for_changed_file(datafile, tmp_path):
+    cachedir = str(tmp_path / "cache")
+    cache = MetadataCache(datafile, cachedir)
+    cache.set("statistics", 12, [1, 2])
+    cache.save()
+    # same size, newer modification time
+    stat = os.stat(datafile)
+    os.utime(datafile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert MetadataCache(datafile, cachedir).get("statistics", 12) is None
+    cache = MetadataCache(datafile, cachedir)
+    cache.set("statistics", 12, [1, 2])
+    cache.save()
+    assert MetadataCache(datafile, cachedir).get("statistics", 12) == [1, 2]
+    # same modification time, other size
+    stat = os.stat(datafile)
+    with open(datafile, "ab") as fid:
+        fid.write(b"more")
+    os.utime(datafile, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert MetadataCache(datafile, cachedir).get("statistics", 12) is None
+
+
+def test_metadata_cache_broken_file(datafile, tmp_path):
+    cache = MetadataCache(datafile, str(tmp_path))
+    with open(cache.cachefile, "w") as fid:
+        fid.write("{no json")
+    assert MetadataCache(datafile, str(tmp_path)).content == {}
+
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from Coastlines import douglas_peucker, CoastlineStore, TOLERANCES
+
+
+def distance_to_polyline(points, line):
+    """
+    :return: array of the distance of each point to the nearest segment of line
+    """
+    start, end = line[:-1], line[1:]
+    direction = end - start
+    lengths = np.maximum((direction ** 2).sum(axis=1), 1e-300)
+    offsets = points[:, None, :] - start[None, :, :]
+    along = np.clip((offsets * direction).sum(axis=2) / lengths, 0, 1)
+    nearest = start + along[:, :, None] * direction
+    return np.hypot(*(points[:, None, :] - nearest).transpose(2, 0, 1)).min(axis=1)
+
+
+@pytest.fixture
+def walk():
+    rng = np.random.default_rng(5)
+    return np.cumsum(rng.normal(scale=0.05, size=(2000, 2)), axis=0)
+
+
+@pytest.mark.parametrize("tolerance", TOLERANCES[1:])
+def test_simplification_within_tolerance(walk, tolerance):
+    simplified = douglas_peucker(walk, tolerance)
+    assert (simplified[0] == walk[0]).all() and (simplified[-1] == walk[-1]).all()
+    assert len(simplified) < len(walk)
+    assert distance_to_polyline(walk, simplified).max() <= tolerance
+
+
+def test_simplification_of_backtracking_line():
+    # the middle vertex lies on the line through the ends, but far beyond them
+    points = np.array([(0., 0.), (-3., 0.), (1., 0.)])
+    assert len(douglas_peucker(points, 0.1)) == 3
+    ring = np.array([(0., 0.), (1., 0.), (1., 1.), (0., 1.), (0., 0.)])
+    assert len(douglas_peucker(ring, 0.1)) == 5
+
+
+def test_simplification_keeps_short_lines():
+    points = np.array([(0., 0.), (1., 1.)])
+    assert douglas_peucker(points, 1.) is points
+    assert len(douglas_peucker(np.array([(0., 0.), (0.5, 0.01), (1., 0.)]), 0.1)) == 2
+
+
+def test_levels_get_coarser(walk):
+    store = CoastlineStore.from_lines([walk], period=None)
+    sizes = [len(vertices) for vertices, offsets in store.levels]
+    assert sizes[0] == len(walk)
+    assert sizes == sorted(sizes, reverse=True)
+    assert store.level_for(0.) == 0
+    assert store.level_for(0.06) == 2
+    assert store.level_for(10.) == len(TOLERANCES) - 1
+
+
+def test_clipping_keeps_lines_crossing_the_view():
+    inside = [(0.2, 0.2), (0.3, 0.4)]
+    # no vertex of the next two is inside the view, but the lines cross it
+    crossing = [(-5., 0.5), (5., 0.5)]
+    corner = [(-1., 0.5), (0.5, 2.)]
+    outside = [(2., 2.), (3., 3.)]
+    above = [(-5., 1.5), (5., 1.5)]
+    store = CoastlineStore.from_lines([inside, crossing, corner, outside, above], period=None)
+    lines = store.segments((0., 1.), (0., 1.), (100, 100))
+    assert len(lines) == 3
+    for line, expected in zip(lines, (inside, crossing, corner)):
+        assert np.array_equal(line, expected)
+
+
+def test_clipping_repeats_lines_every_period():
+    # crosses the date line, the view shows it again one period east
+    store = CoastlineStore.from_lines([[(170., 10.), (190., 20.)], [(0., 10.), (10., 10.)]])
+    lines = store.segments((180., 560.), (0., 30.), (380, 30))
+    shifted = sorted(line[0, 0] for line in lines)
+    assert shifted == [170., 360., 530.]
+    lines = store.segments((-200., -185.), (0., 30.), (15, 30))
+    assert [line[0, 0] for line in lines] == [-190.]
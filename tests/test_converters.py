@@ -0,0 +1,60 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from Converters import DataReference, LazyData, dataset_of
+
+
+class Data(LazyData):
+    pass
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    with netCDF4.Dataset(str(tmp_path / "lazy.nc"), "w") as fid:
+        fid.createDimension("time", 4)
+        fid.createDimension("x", 3)
+        group = fid.createGroup("sub")
+        variable = group.createVariable("values", "f4", ("time", "x"))
+        variable.units = "K"
+        variable[:] = np.arange(12).reshape(4, 3)
+        time = fid.createVariable("time", "i4", ("time", ))
+        time.units = "days since 2000-01-01"
+        time[:] = np.arange(4)
+    fid = netCDF4.Dataset(str(tmp_path / "lazy.nc"))
+    yield fid
+    fid.close()
+
+
+def test_reference_reads_only_when_used(dataset):
+    data = Data()
+    data.datavalue = DataReference(dataset["sub/values"], "/sub", (slice(1, 3), 2))
+    assert data.stored().shape == (2, )
+    assert data.stored().units == "K"
+    assert data.datavalue.tolist() == [5., 8.]
+    # read once, then the values are kept
+    assert not isinstance(data.stored(), DataReference)
+    data.datavalue = np.zeros(2)
+    assert data.datavalue.tolist() == [0., 0.]
+
+
+def test_reference_converts_times(dataset):
+    times = DataReference(dataset["time"]).read()
+    assert times[3] == np.datetime64("2000-01-04", "us")
+
+
+def test_reference_shape_is_squeezed(dataset):
+    reference = DataReference(dataset["sub/values"], "/sub", (slice(None), slice(0, 1)))
+    assert reference.shape == (4, )
+    assert reference.ndim == 1
+    assert reference.read().shape == (4, )
+
+
+def test_reference_needs_variable():
+    with pytest.raises(TypeError):
+        DataReference(np.arange(3))
+
+
+def test_dataset_of(dataset):
+    assert dataset_of(dataset["sub/values"]) is dataset
+    assert dataset_of(np.arange(3)) is None
@@ -0,0 +1,227 @@
+import warnings
+import numpy as np
+import pytest
+
+import Expressions
+from Expressions import Variable, Constant, Reduction, parse, as_formula
+
+
+@pytest.fixture
+def cube():
+    rng = np.random.default_rng(1)
+    values = np.ma.masked_array(rng.normal(size=(6, 5, 4)), mask=rng.random((6, 5, 4)) < 0.2)
+    values[:, 0, 0] = np.ma.masked
+    return values
+
+
+def expected(values, axis, how, subset=None):
+    data = values.filled(np.nan)
+    if subset is not None:
+        data = np.take(data, np.arange(values.shape[axis])[subset], axis=axis)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.ma.masked_invalid((np.nanmean if how == "mean" else np.nanmedian)(data, axis=axis))
+
+
+@pytest.mark.parametrize("how", ["mean", "median"])
+@pytest.mark.parametrize("axis", [0, 1, -1])
+def test_reduction_leaves_out_masked_values(cube, how, axis):
+    result = Reduction(Variable(cube), axis, how)[...]
+    reference = expected(cube, axis, how)
+    assert result.shape == reference.shape
+    assert (result.mask == reference.mask).all()
+    np.testing.assert_allclose(result.compressed(), reference.compressed())
+
+
+@pytest.mark.parametrize("how", ["mean", "median"])
+@pytest.mark.parametrize("subset", [np.array([0, 2, 5]), np.array([True, False, True, True, False, False])])
+def test_reduction_of_subset(cube, how, subset):
+    result = Reduction(Variable(cube), 0, how, subset)[1:4, ::2]
+    reference = expected(cube, 0, how, subset)[1:4, ::2]
+    assert (result.mask == reference.mask).all()
+    np.testing.assert_allclose(result.compressed(), reference.compressed())
+
+
+@pytest.mark.parametrize("how", ["mean", "median"])
+def test_reduction_in_parts(cube, how, monkeypatch):
+    # tiny blocks: the parts are spread over threads and the mean is accumulated block by block
+    monkeypatch.setattr(Expressions, "MAX_ELEMENTS", 7)
+    result = Reduction(Variable(cube), 1, how)[...]
+    reference = expected(cube, 1, how)
+    assert (result.mask == reference.mask).all()
+    np.testing.assert_allclose(result.compressed(), reference.compressed())
+
+
+def test_reduction_restrict_keeps_subset(cube):
+    node = parse("v0.mean(axis=0)", {"v0": Variable(cube)})
+    # a boolean selection of the length of the reduced axis, e.g. the rows selected in a table
+    rows = np.array([False, True, False, True, False, False])
+    restricted = node.restrict(rows)
+    np.testing.assert_allclose(restricted[...].filled(np.nan), expected(cube, 0, "mean", rows).filled(np.nan))
+
+
+def test_reduction_axis_out_of_range(cube):
+    with pytest.raises(ValueError):
+        Reduction(Variable(cube), 3)
+
+
+EXPRESSIONS = ["(v0 - v1) / v1", "v0 ** 2 + 3 * v1", "(v0 > 0) & (v1 < 0.5)", "where(v1 > 0, v0)", "-v0 * v0 - v1"]
+
+
+def reference_values(text, v0, v1):
+    with np.errstate(all="ignore"):
+        data = {"(v0 - v1) / v1": lambda: (v0 - v1) / v1,
+                "v0 ** 2 + 3 * v1": lambda: v0 ** 2 + 3 * v1,
+                "(v0 > 0) & (v1 < 0.5)": lambda: (v0 > 0) & (v1 < 0.5),
+                "where(v1 > 0, v0)": lambda: np.where(v1 > 0, v0, np.nan),
+                "-v0 * v0 - v1": lambda: -v0 * v0 - v1}[text]()
+    return np.ma.masked_invalid(data) if data.dtype.kind == "f" else np.ma.masked_array(data)
+
+
+@pytest.fixture
+def pair():
+    rng = np.random.default_rng(2)
+    v0 = np.ma.masked_array(rng.normal(size=(40, 30)), mask=rng.random((40, 30)) < 0.1)
+    v1 = rng.normal(size=(40, 30))
+    v1[0, :3] = 0.
+    return v0, v1
+
+
+def check(result, v0, v1, text):
+    reference = reference_values(text, v0.filled(np.nan), v1)
+    mask = np.ma.getmaskarray(reference) | np.ma.getmaskarray(v0)
+    assert (np.ma.getmaskarray(result) == mask).all()
+    np.testing.assert_allclose(result[~mask].astype(float), reference[~mask].astype(float), rtol=1e-12)
+
+
+@pytest.mark.parametrize("text", EXPRESSIONS)
+def test_program_with_numpy(pair, text, monkeypatch):
+    monkeypatch.setattr(Expressions, "numexpr", None)
+    # several chunks, computed by the thread pool
+    monkeypatch.setattr(Expressions, "CHUNK", 100)
+    v0, v1 = pair
+    check(parse(text, {"v0": Variable(v0), "v1": Variable(v1)})[...], v0, v1, text)
+
+
+@pytest.mark.parametrize("text", EXPRESSIONS)
+def test_program_numexpr_and_numpy_agree(pair, text, monkeypatch):
+    if Expressions.numexpr is None:
+        pytest.skip("numexpr is not installed")
+    v0, v1 = pair
+    node = parse(text, {"v0": Variable(v0), "v1": Variable(v1)})
+    with_numexpr = node[...]
+    monkeypatch.setattr(Expressions, "numexpr", None)
+    with_numpy = node[...]
+    check(with_numexpr, v0, v1, text)
+    assert (with_numexpr.mask == with_numpy.mask).all()
+    np.testing.assert_allclose(with_numexpr.compressed().astype(float), with_numpy.compressed().astype(float),
+                               rtol=1e-12)
+
+
+def test_program_broadcasts_constants(pair):
+    v0, _ = pair
+    row = np.arange(30.)
+    result = parse("v0 * v1 + 2", {"v0": Variable(v0), "v1": Constant(row)})[5:10]
+    np.testing.assert_allclose(result.filled(np.nan), (v0[5:10] * row + 2).filled(np.nan))
+
+
+@pytest.fixture
+def abc():
+    return [Constant(np.array([value])) for value in (2., 4., 8.)]
+
+
+def test_misc_buttons_apply_to_result_so_far(abc):
+    # m a, +, m b, /, m c is (a+b)/c as the misc buttons always computed it, not a+b/c
+    a, b, c = abc
+    formula = as_formula(None).add_variable(a).add_text("+").add_variable(b).add_text("/").add_variable(c)
+    assert formula.text == "(v0+v1)/v2"
+    assert formula.build()[...].tolist() == [0.75]
+    # without a typed operator the operator of the button is used
+    assert as_formula(a).add_variable(b, "+").add_variable(c, "/").build()[...].tolist() == [0.75]
+    # typed numbers and postfix functions apply to the result so far as well
+    formula = as_formula(a).add_variable(b).add_text("/2").add_text("**2")
+    assert formula.build()[...].tolist() == [9.]
+    formula = as_formula(a).add_text("+").add_text("2").add_text("*").add_variable(c)
+    assert formula.build()[...].tolist() == [32.]
+
+
+def test_misc_typed_brackets_and_unary_minus(abc):
+    a, b, c = abc
+    formula = as_formula(None).add_text("-").add_variable(a).add_text("*(").add_variable(b).add_text("-")
+    formula = formula.add_variable(c).add_text(")")
+    assert formula.build()[...].tolist() == [8.]
+
+
+def test_formula_arithmetic(abc):
+    a, b, c = abc
+    assert ((as_formula(a) + b) / c).build()[...].tolist() == [0.75]
+    assert (np.array([8.]) / (as_formula(a) + b)).build()[...].tolist() == [8. / 6.]
+    assert (10 - as_formula(a)).build()[...].tolist() == [8.]
+
+
+@pytest.fixture
+def names():
+    return {"v0": Variable(np.array([1., 2., 3., 4.])), "v1": Variable(np.array([4., 3., 2., 1.])),
+            "v2": Variable(np.arange(8.).reshape(2, 4))}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("v0 + v1 * 2", [9., 8., 7., 6.]),
+    ("(v0 + v1) * 2", [10., 10., 10., 10.]),
+    ("v0 - v1 - 1", [-4., -2., 0., 2.]),
+    ("v0 / v1 / 2", [0.125, 1. / 3., 0.75, 2.]),
+    ("2 ** v0 ** 2", [2., 16., 512., 65536.]),
+    ("-v0 ** 2", [-1., -4., -9., -16.]),
+    ("v0 * -v1", [-4., -6., -6., -4.]),
+    ("--v0 + +v1", [5., 5., 5., 5.]),
+    ("2 ** -v0", [0.5, 0.25, 0.125, 0.0625]),
+    ("1.5e1 - .5 * v0", [14.5, 14., 13.5, 13.]),
+])
+def test_parser_precedence_like_python(names, text, expected):
+    np.testing.assert_allclose(parse(text, names)[...], expected)
+
+
+def test_parser_postfix_binds_to_its_operand(names):
+    # only v2 is reduced, as in python
+    result = parse("v0 / v2.mean(axis=0)", names)[...]
+    np.testing.assert_allclose(result, names["v0"].source / names["v2"].source.mean(axis=0))
+    np.testing.assert_allclose(parse("(v2 * 2).median(axis=1)", names)[...], [3., 11.])
+    np.testing.assert_allclose(parse("np.nanmean(v2, axis=1) + mean(v2, 1)", names)[...], [3., 11.])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("v0 < v1", [True, True, False, False]),
+    ("1 < v0 <= 3", [False, True, True, False]),
+    ("v0 > 1 and v1 > 1", [False, True, True, False]),
+    ("v0 == 1 or v1 == 1", [True, False, False, True]),
+    ("not v0 > 2 & v1 != 3", [True, False, False, False]),
+    ("~(v0 >= 2) | v0 + 1 == 5", [True, False, False, True]),
+    ("v0 < 2 or v0 > 3 and v1 < 0", [True, False, False, False]),
+])
+def test_parser_conditions(names, text, expected):
+    assert parse(text, names)[...].tolist() == expected
+
+
+@pytest.mark.parametrize("text, message", [
+    ("v0 +", "expected more but found the end"),
+    ("(v0 + v1", "expected ) but found the end"),
+    ("v0 + v1)", "unexpected )"),
+    ("v0 $ v1", "cannot read the expression at: $ v1"),
+    ("v5 * 2", "unknown name v5"),
+    ("v0.sum()", "unknown function sum, possible are mean, median"),
+    ("v0.mean(axis=v1)", "the axis of mean has to be an integer"),
+    ("v0.mean(axis=3)", "axis 3 does not exist, the data has 1 dimensions"),
+    ("mean(v0, 0, 1)", "mean needs the data and the axis"),
+    ("where(v0 > 1)", "where needs the condition and the values"),
+    ("v0 * )", "unexpected )"),
+    ("v0.mean(keepdims=1)", "unknown argument keepdims"),
+])
+def test_parser_errors(names, text, message):
+    with pytest.raises(ValueError) as error:
+        parse(text, names)
+    assert str(error.value) == message
+
+
+def test_parser_shapes_have_to_fit(names):
+    with pytest.raises(ValueError, match="do not fit together"):
+        parse("v0 + v2.mean(axis=1)", names)
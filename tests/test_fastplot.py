@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+import Fastplot
+from Cache import LRUCache
+from Converters import Data, MyQLabel
+
+
+class Master(object):
+    """main window, only its attributes used by the plot windows"""
+
+
+def label(name, values, text=None):
+    mlabel = MyQLabel(name, values)
+    mlabel.set(values, name + "v")
+    if text is not None:
+        mlabel.setText(text)
+    return mlabel
+
+
+@pytest.fixture
+def table(qapp):
+    # 200 rows of a table, e.g. spectra
+    x = np.arange(100.)
+    rows = np.sin(x[None, :] / 10. + np.arange(200)[:, None])
+    return x, rows
+
+
+def test_rows_with_symbols_are_few_lines(table):
+    x, rows = table
+    window = Fastplot.Fast1D(Master(), Data(x=label("x", x), y=label("y", rows, "y: spectrum s.0 - 199")),
+                             symbol="o")
+    try:
+        lines = [line for line in window.myfigure.axes.get_lines() if line in window.myfigure.row_labels]
+        ncolours = len(Fastplot.plt.rcParams["axes.prop_cycle"].by_key()["color"])
+        # one line per colour of the cycle, not one per row
+        assert len(lines) == ncolours
+        assert sum(len(line.get_xdata()) for line in lines) == rows.size
+        # the points of row 12 are in the line of colour 12 % ncolours, after the rows before them
+        labels, rowlength, _ = window.myfigure.row_labels[lines[12 % ncolours]]
+        assert labels[12 // ncolours].split() == ["xv", "vs", "spectrum", "12"]
+        assert rowlength == 100
+        start = (12 // ncolours) * rowlength
+        assert (lines[12 % ncolours].get_ydata()[start:start + rowlength] == rows[12]).all()
+    finally:
+        window.close()
+
+
+def test_rows_as_lines_are_one_collection(table):
+    x, rows = table
+    window = Fastplot.Fast1D(Master(), Data(x=label("x", x), y=label("y", rows, "y: spectrum s.0 - 199")))
+    try:
+        collections = [entr for entr in window.myfigure.axes.collections if isinstance(entr, LineCollection)]
+        assert len(collections) == 1
+        assert len(collections[0].get_segments()) == 200
+        assert not [line for line in window.myfigure.axes.get_lines() if line in window.myfigure.row_labels]
+    finally:
+        window.close()
+
+
+def test_lasso_on_rows_includes_outline(table):
+    x, rows = table
+    window = Fastplot.Fast1D(Master(), Data(x=label("x", x), y=label("y", rows, "y: spectrum s.0 - 199")),
+                             symbol="o")
+    try:
+        # x = 10 and x = 20 are on the outline and selected, y covers all rows
+        window.onselect([(10, -2), (20, -2), (20, 2), (10, 2)])
+        assert np.nonzero(window.current_idx)[0].tolist() == list(range(10, 21))
+        window.onselect([(10.5, -2), (19.5, -2), (19.5, 2), (10.5, 2)])
+        assert np.nonzero(window.current_idx)[0].tolist() == list(range(11, 20))
+    finally:
+        window.close()
+
+
+@pytest.fixture
+def grid_cache(qapp, monkeypatch):
+    cache = LRUCache(maxsize=2)
+    monkeypatch.setattr(Fastplot, "GRID_CACHE", cache)
+    return cache
+
+
+def grid(shift=0.):
+    jj, ii = np.mgrid[0:30, 0:40]
+    lon = np.ma.array(ii * 0.1 + jj * 0.01 + shift)
+    lat = np.ma.array(jj * 0.1 + ii * 0.0)
+    lon[3, 4] = np.ma.masked
+    data = Data()
+    data.x.set(lon, "lon")
+    data.y.set(lat, "lat")
+    data.z.set(np.ma.array(np.random.default_rng(12).random((30, 40))), "z")
+    return data
+
+
+def test_grid_cache_hit_for_copies(grid_cache):
+    data = grid()
+    canvas = Fastplot.MplCanvas(swath_above=0, render_in_background=False)
+    assert canvas.pcolormesh(data.x, data.y, data.z)
+    assert len(grid_cache.content) == 1
+    (key, entry), = grid_cache.content.items()
+    # the masked corner masks the cells around it
+    assert entry["mask"][3:5, 3:5].all() and entry["mask"].sum() == 4
+    # a copy of the chosen data (e.g. a second plot window) has the same token: same entry, no new edges
+    copied = data.copy()
+    other = Fastplot.MplCanvas(swath_above=0, render_in_background=False)
+    assert other.pcolormesh(copied.x, copied.y, copied.z)
+    assert list(grid_cache.content) == [key]
+    assert grid_cache.content[key] is entry
+    assert (other.im.get_array().mask == canvas.im.get_array().mask).all()
+
+
+def test_grid_cache_miss_for_new_token(grid_cache):
+    data = grid()
+    canvas = Fastplot.MplCanvas(swath_above=0, render_in_background=False)
+    canvas.pcolormesh(data.x, data.y, data.z)
+    first = canvas.grid_key(data.x)
+    # choosing x again, even with the same values, gives a new token and new edges
+    data.x.set(grid(1.).x.datavalue, "lon")
+    assert canvas.grid_key(data.x) != first
+    canvas.pcolormesh(data.x, data.y, data.z)
+    assert len(grid_cache.content) == 2
+    edges = [entry["x"] for entry in grid_cache.content.values()]
+    np.testing.assert_allclose(edges[1] - edges[0], 1.)
+
+
+def test_grid_cache_evicts_least_recently_used(grid_cache):
+    canvas = Fastplot.MplCanvas(swath_above=0, render_in_background=False)
+    grids = [grid(shift) for shift in range(3)]
+    for data in grids[:2]:
+        canvas.pcolormesh(data.x, data.y, data.z)
+    oldest = list(grid_cache.content)[0]
+    # using the first grid again makes the second one the oldest
+    canvas.pcolormesh(grids[0].x, grids[0].y, grids[0].z)
+    canvas.pcolormesh(grids[2].x, grids[2].y, grids[2].z)
+    assert len(grid_cache.content) == 2
+    assert oldest in grid_cache.content
+    assert canvas.grid_key(grids[1].x) not in [key[0] for key in grid_cache.content]
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # b was used least recently
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    cache.clear()
+    assert cache.get("a", "gone") == "gone"
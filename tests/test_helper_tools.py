@@ -0,0 +1,243 @@
+import os
+import netCDF4
+import numpy as np
+import pytest
+from cftime import num2date
+
+import helper_tools
+from helper_tools import to_datetime64, check_for_time, convert_from_time, TIME_CACHE
+
+
+class Label(object):
+    """stands in for the data labels and for variables of a file"""
+
+    def __init__(self, datavalue, units, name="", calendar="standard"):
+        self.datavalue = datavalue
+        self.units = units
+        self.name = name
+        self.calendar = calendar
+
+    def __getitem__(self, key):
+        return self.datavalue[key]
+
+
+@pytest.mark.parametrize("unit", ["seconds since 2000-01-01 00:00:00", "hours since 1970-01-01T06:00:00Z",
+                                  "days since 1900-1-1", "minutes since 2010-05-03 12:30"])
+@pytest.mark.parametrize("values", [np.array([0, 1, 86400, -3600, 123456]), np.array([0., 0.5, 1e5, -2.25])])
+def test_to_datetime64_like_cftime(unit, values):
+    times = to_datetime64(values, unit)
+    expected = num2date(values, unit, "standard", only_use_cftime_datetimes=False)
+    assert times.dtype == np.dtype("datetime64[us]")
+    assert times.tolist() == [np.datetime64(entr, "us").tolist() for entr in expected]
+
+
+def test_to_datetime64_masked():
+    values = np.ma.masked_array([1., np.nan, 3., 4.], mask=[False, False, True, False])
+    times = to_datetime64(values, "days since 2000-01-01")
+    assert times.mask.tolist() == [False, True, True, False]
+    assert times[3] == np.datetime64("2000-01-05", "us")
+
+
+@pytest.mark.parametrize("unit, calendar", [("days since 1500-01-01", "standard"), ("days since 2000-01-01", "noleap"),
+                                            ("months since 2000-01-01", "standard"), ("days after 2000", "standard")])
+def test_to_datetime64_left_to_cftime(unit, calendar):
+    assert to_datetime64(np.arange(3), unit, calendar) is None
+
+
+def test_to_datetime64_proleptic_before_reform():
+    times = to_datetime64(np.array([0]), "days since 1500-01-01", "proleptic_gregorian")
+    assert times[0] == np.datetime64("1500-01-01", "us")
+
+
+@pytest.mark.parametrize("calendar", ["standard", "gregorian"])
+def test_julian_origin_left_to_cftime(calendar):
+    # the origin is julian, the days up to dates after the reform differ from the proleptic gregorian calendar
+    unit = "days since 0001-01-01"
+    values = np.array([730000, 730001])
+    assert to_datetime64(values, unit, calendar) is None
+    times, _ = check_for_time(Label(values, unit, "time", calendar))
+    expected = num2date(values, unit, calendar, only_use_cftime_datetimes=False)
+    assert [str(entr) for entr in times] == [str(entr) for entr in expected] == ["1999-09-02 00:00:00",
+                                                                                 "1999-09-03 00:00:00"]
+    label = convert_from_time(Label(np.array(["1999-09-02"], dtype="datetime64[us]"), unit))
+    assert label.datavalue.tolist() == [730000]
+
+
+def test_julian_origin_proleptic_calendar():
+    unit = "days since 0001-01-01"
+    times = to_datetime64(np.array([730000]), unit, "proleptic_gregorian")
+    expected = num2date(730000, unit, "proleptic_gregorian", only_use_cftime_datetimes=False)
+    assert str(times[0].astype(object)) == str(expected) == "1999-09-04 00:00:00"
+
+
+@pytest.fixture
+def timefile(tmp_path):
+    path = str(tmp_path / "times.nc")
+    with netCDF4.Dataset(path, "w") as fid:
+        fid.createDimension("time", 5)
+        variable = fid.createVariable("time", "f8", ("time", ))
+        variable.units = "hours since 2020-01-01"
+        variable[:] = np.arange(5) * 6.
+    TIME_CACHE.clear()
+    yield path
+    TIME_CACHE.clear()
+
+
+def test_check_for_time_caches_whole_variable(timefile):
+    with netCDF4.Dataset(timefile) as fid:
+        times, unit = check_for_time(fid["time"])
+        assert unit == "hours since 2020-01-01"
+        assert times[1] == np.datetime64("2020-01-01T06:00", "us")
+        assert len(TIME_CACHE) == 1
+        # the cache hands out copies
+        times[0] = np.datetime64("1999-01-01", "us")
+        again, _ = check_for_time(fid["time"])
+        assert again[0] == np.datetime64("2020-01-01", "us")
+        part, _ = check_for_time(fid["time"], slice(2, 4))
+        assert part.tolist() == again[2:4].tolist()
+        assert len(TIME_CACHE) == 1
+
+
+def test_time_cache_is_limited(timefile, monkeypatch):
+    monkeypatch.setattr(helper_tools, "TIME_CACHE_BYTES", 1)
+    with netCDF4.Dataset(timefile, "a") as fid:
+        other = fid.createVariable("start_time", "i4", ("time", ))
+        other.units = "days since 2000-01-01"
+        other[:] = np.arange(5)
+        check_for_time(fid["time"])
+        times, _ = check_for_time(fid["start_time"])
+        # the newest one is kept even if it is larger than the limit
+        assert list(TIME_CACHE) == [helper_tools.time_key(fid["start_time"])]
+        assert times[4] == np.datetime64("2000-01-05", "us")
+
+
+@pytest.mark.parametrize("numbers", [np.array([0, 6, 12]), np.array([0.5, 6.25, -1.])])
+def test_convert_from_time_round_trip(numbers):
+    unit = "hours since 2020-01-01 00:00:00"
+    label = convert_from_time(Label(to_datetime64(numbers, unit), unit))
+    np.testing.assert_allclose(label.datavalue, numbers)
+    assert label.datavalue.dtype.kind == numbers.dtype.kind
+
+
+def test_convert_from_time_with_cftime():
+    unit = "days since 2000-01-01"
+    times = num2date(np.array([0, 365]), unit, "noleap")
+    label = convert_from_time(Label(times, unit))
+    np.testing.assert_allclose(label.datavalue, [0, 365])
+
+
+def test_minmax_decimate_keeps_extremes():
+    rng = np.random.default_rng(6)
+    xnum = np.arange(100000.)
+    y = rng.normal(size=xnum.size)
+    y[12345] = 50.
+    y[67890] = -50.
+    x, ydec = helper_tools.minmax_decimate(xnum, xnum, y, (0., 99999.), 100)
+    assert len(ydec) <= 4 * 102
+    assert ydec.max() == 50. and ydec.min() == -50.
+    assert x[0] == 0. and x[-1] == 99999.
+    assert (np.diff(x) >= 0).all()
+
+
+def test_minmax_decimate_short_line_unchanged():
+    xnum = np.arange(50.)
+    x, y = helper_tools.minmax_decimate(xnum, xnum, xnum * 2, (10., 20.), 100)
+    # one point beyond the view on each side
+    assert x.tolist() == list(range(9, 22))
+    assert y.tolist() == [2. * entr for entr in range(9, 22)]
+
+
+def test_append_buffer():
+    buffer = helper_tools.AppendBuffer(np.arange(3), capacity=4)
+    for start in range(3, 100, 7):
+        buffer.append(np.arange(start, start + 7))
+    assert len(buffer) == 3 + 7 * 14
+    assert buffer.values.tolist() == list(range(len(buffer)))
+    assert not np.ma.isMaskedArray(buffer.values)
+    assert len(buffer.data) == 128
+
+
+def test_append_buffer_mask_and_dtype():
+    buffer = helper_tools.AppendBuffer(np.zeros((2, 3), dtype=np.int32))
+    buffer.append(np.ma.masked_array(np.full((1, 3), 0.5), mask=[[True, False, False]]))
+    assert buffer.values.dtype == np.float64
+    assert buffer.values.mask.tolist() == [[False] * 3, [False] * 3, [True, False, False]]
+    buffer.append(np.ones((2, 3)))
+    assert buffer.values.mask[3:].sum() == 0
+    assert buffer.values[2, 1] == 0.5
+
+
+def test_colour_limits():
+    rng = np.random.default_rng(7)
+    data = np.ma.masked_array(rng.normal(size=(50, 40, 30)), mask=rng.random((50, 40, 30)) < 0.1)
+    data[0, 0, :3] = [1e6, -1e6, np.nan]
+    data.mask[0, 0, :2] = [False, False]
+    data[1, 1, 1] = 1e9
+    data[1, 1, 1] = np.ma.masked
+    limits = helper_tools.colour_limits(data, percentile=2, max_elements=5000)
+    assert limits["global"] == (-1e6, 1e6)
+    valid = data.compressed()
+    valid = valid[np.isfinite(valid)]
+    np.testing.assert_allclose(limits["robust"], np.percentile(valid, [2, 98]), atol=0.05)
+
+
+def test_colour_limits_not_possible():
+    assert helper_tools.colour_limits(np.array(["a", "b"])) is None
+    assert helper_tools.colour_limits(np.ma.masked_all((3, 3))) is None
+    chunks = []
+
+    def cancelled():
+        chunks.append(1)
+        return len(chunks) > 2
+    assert helper_tools.colour_limits(np.zeros((10, 10)), max_elements=10, cancelled=cancelled) is None
+    assert len(chunks) == 3
+
+
+def test_time_cache_of_rewritten_file(timefile):
+    with netCDF4.Dataset(timefile) as fid:
+        times, _ = check_for_time(fid["time"])
+    # same name, shape and units, other times
+    with netCDF4.Dataset(timefile, "a") as fid:
+        fid["time"][:] = np.arange(5) * 12.
+    # file systems with a coarse time stamp, the file is changed a second later
+    stat = os.stat(timefile)
+    os.utime(timefile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with netCDF4.Dataset(timefile) as fid:
+        again, _ = check_for_time(fid["time"])
+    assert times[1] == np.datetime64("2020-01-01T06:00", "us")
+    assert again[1] == np.datetime64("2020-01-01T12:00", "us")
+
+
+@pytest.mark.parametrize("shape, max_elements", [((7, 5, 3), 1), ((7, 5, 3), 16), ((7, 5, 3), 40), ((7, 5, 3), 1000),
+                                                 ((10, ), 3), ((), 5)])
+def test_iter_slabs_cover_array_once(shape, max_elements):
+    counts = np.zeros(shape, dtype=int)
+    for slab in helper_tools.iter_slabs(shape, max_elements):
+        part = counts[slab] if len(slab) > 0 else counts[...]
+        # at least one row of the last dimension
+        assert part.size <= max(max_elements, shape[-1] if shape else 1)
+        part += 1
+        if len(slab) == 0:
+            counts[...] = part
+    assert (counts == 1).all()
+
+
+@pytest.mark.parametrize("max_elements", [7, 100, 1000000])
+def test_summary_statistics_like_numpy(max_elements):
+    rng = np.random.default_rng(11)
+    data = np.ma.masked_array(rng.normal(size=(6, 9, 4)), mask=rng.random((6, 9, 4)) < 0.2)
+    data[0, 0, :2] = [np.nan, -999.]
+    data.mask[0, 0, :2] = False
+    stats = helper_tools.summary_statistics(data, fillvalue=-999., max_elements=max_elements)
+    valid = data.compressed()
+    valid = valid[np.isfinite(valid) & (valid != -999.)]
+    assert stats["min"] == valid.min()
+    assert stats["max"] == valid.max()
+    assert stats["mean"] == pytest.approx(valid.mean())
+    assert stats["fill"] == pytest.approx(1. - valid.size / data.size)
+
+
+def test_summary_statistics_without_values():
+    assert helper_tools.summary_statistics(np.ma.masked_all((3, 2)))["fill"] == 1.
+    assert helper_tools.summary_statistics(np.zeros((0, 2)))["fill"] == 1.
+    assert helper_tools.summary_statistics(np.array(["a"]), shape=1) is None
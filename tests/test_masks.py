@@ -0,0 +1,136 @@
+import gc
+import netCDF4
+import numpy as np
+import pytest
+
+from Expressions import Constant, Variable
+from Masks import MaskEngine, PackedMask, FlagMeaning, apply_mask, decode_flags, flag_meanings
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(3).random((20, 7))
+
+
+def test_packed_mask_round_trip(values):
+    mask = PackedMask.from_array(values > 0.3)
+    assert (mask.unpack() == (values > 0.3)).all()
+    assert mask.count() == (values > 0.3).sum()
+    assert ((mask & ~mask).unpack() == False).all()
+    assert ((mask | ~mask).unpack() == True).all()
+    masked = apply_mask(values, mask)
+    assert (masked.mask == (values <= 0.3)).all()
+
+
+def test_define_reuses_computed_condition(values):
+    engine = MaskEngine()
+    first = engine.define("v > 0.5", {"v": Variable(values)})
+    # same text and the same array, also through a new node
+    assert engine.define("v > 0.5", {"v": Variable(values)}) is first
+    assert engine.define("v > 0.6", {"v": Variable(values)}) is not first
+    both = engine.define(first.name + " and v < 0.9", {"v": Variable(values)})
+    assert (both.unpack() == ((values > 0.5) & (values < 0.9))).all()
+
+
+def test_define_with_reused_ids():
+    # arrays made and dropped one after the other often get the id of the one before, the cached mask of the old
+    # array must not be returned for the new one
+    engine = MaskEngine()
+    rng = np.random.default_rng(4)
+    for _ in range(500):
+        data = rng.random(64)
+        mask = engine.define("v > 0.5", {"v": Constant(data)})
+        assert (mask.unpack() == (data > 0.5)).all()
+    # the keys of the arrays that are gone are dropped with the next new mask
+    del data
+    gc.collect()
+    engine.define("v > 0.5", {"v": Constant(rng.random(64))})
+    assert len(engine.keys) == 1
+
+
+def test_eviction_drops_keys():
+    engine = MaskEngine(max_bytes=100)
+    arrays = [np.random.default_rng(seed).random(400) for seed in range(10)]
+    for data in arrays:
+        engine.define("v > 0.5", {"v": Constant(data)})
+    assert len(engine.masks) < len(arrays)
+    assert {name for name, _ in engine.keys.values()} <= set(engine.masks)
+    # evicted masks are computed again, under a new name
+    again = engine.define("v > 0.5", {"v": Constant(arrays[0])})
+    assert (again.unpack() == (arrays[0] > 0.5)).all()
+    assert again.name == "m" + str(len(arrays) + 1)
+
+
+def test_condition_has_to_be_boolean(values):
+    with pytest.raises(ValueError):
+        MaskEngine().define("v + 1", {"v": Variable(values)})
+
+
+def brute_force(values, mask, value):
+    values = np.ma.getdata(values).astype(np.int64)
+    if value is None:
+        return (values & mask) != 0
+    if mask is None:
+        return values == value
+    return (values & mask) == (value & mask)
+
+
+FLAGS = [("cloudy", 1, None), ("land", 6, 2), ("water", 6, 4), ("missing", None, 255), ("high", 128, 128)]
+
+
+@pytest.mark.parametrize("max_elements", [1000000, 13])
+def test_decode_flags(max_elements):
+    rng = np.random.default_rng(5)
+    variable = np.ma.masked_array(rng.integers(0, 256, size=(9, 11)).astype(np.uint8),
+                                  mask=rng.random((9, 11)) < 0.1)
+    decoded = decode_flags(variable, FLAGS, max_elements=max_elements)
+    assert list(decoded) == [meaning for meaning, _, _ in FLAGS]
+    for meaning, mask, value in FLAGS:
+        expected = brute_force(variable, mask, value) & ~variable.mask
+        assert decoded[meaning].shape == variable.shape
+        assert (decoded[meaning].unpack() == expected).all(), meaning
+
+
+def test_decode_negative_flags():
+    variable = np.array([-128, -1, 0, 1, 127], dtype=np.int8)
+    decoded = decode_flags(variable, [("sign", -128, -128), ("minus_one", None, -1)])
+    assert decoded["sign"].unpack().tolist() == [True, True, False, False, False]
+    assert decoded["minus_one"].unpack().tolist() == [False, True, False, False, False]
+
+
+def test_flag_meanings():
+    attributes = {"flag_meanings": "clear cloudy", "flag_masks": np.array([1, 2], dtype=np.int8)}
+    assert flag_meanings(attributes) == [("clear", 1, None), ("cloudy", 2, None)]
+    assert flag_meanings({"flag_meanings": "a b", "flag_values": [1]}) == []
+    assert flag_meanings({"units": "1"}) == []
+
+
+def write_flags(path, values):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with netCDF4.Dataset(str(path), "w") as fid:
+        fid.createDimension("x", len(values))
+        variable = fid.createVariable("qa", "u1", ("x", ))
+        variable[:] = values
+        variable.flag_masks = np.array([1, 2], dtype=np.uint8)
+        variable.flag_meanings = "cloud_free snow"
+
+
+def test_flag_masks_of_different_files(tmp_path):
+    # the same file and variable name in two directories, the masks must not replace each other
+    first, second = tmp_path / "a" / "q.nc", tmp_path / "b" / "q.nc"
+    write_flags(first, [1, 1, 1, 0])
+    write_flags(second, [1, 0, 0, 0])
+    engine = MaskEngine()
+    with netCDF4.Dataset(str(first)) as fid1, netCDF4.Dataset(str(second)) as fid2:
+        masks1 = engine.flag_masks(fid1["qa"])
+        masks2 = engine.flag_masks(fid2["qa"])
+        assert masks1["cloud_free"].name != masks2["cloud_free"].name
+        assert engine[masks1["cloud_free"].name].count() == 3
+        assert engine[masks2["cloud_free"].name].count() == 1
+        # decoded once per variable, a second call returns the same masks
+        assert engine.flag_masks(fid1["qa"])["cloud_free"] is masks1["cloud_free"]
+        meaning = FlagMeaning(fid2["qa"], "cloud_free", engine=engine)
+        assert meaning[...].tolist() == [True, False, False, False]
+        # the names can be used in conditions
+        both = engine.define(masks1["cloud_free"].name + " and not " + masks2["cloud_free"].name, {})
+        assert both.unpack().tolist() == [False, True, True, False]
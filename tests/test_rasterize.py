@@ -0,0 +1,140 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from Rasterize import DensityImage, PyramidImage, SwathImage, RenderCancelled, block_mean
+
+
+@pytest.fixture
+def ax():
+    figure, ax = plt.subplots(figsize=(2, 2), dpi=50)
+    yield ax
+    plt.close(figure)
+
+
+@pytest.fixture
+def scatter():
+    rng = np.random.default_rng(9)
+    x, y, z = rng.random(5000) * 10, rng.random(5000) * 5, rng.normal(size=5000)
+    x[-1], y[-1] = 10., 5.
+    return x, y, z
+
+
+def binned(x, y, z, view, statistic):
+    x0, x1, y0, y1, nx, ny = view
+    edges = (np.linspace(y0, y1, ny + 1), np.linspace(x0, x1, nx + 1))
+    counts, _, _ = np.histogram2d(y, x, bins=edges)
+    if statistic == "count":
+        return counts
+    sums, _, _ = np.histogram2d(y, x, bins=edges, weights=z)
+    return sums / np.where(counts > 0, counts, np.nan)
+
+
+@pytest.mark.parametrize("statistic", ["mean", "count"])
+@pytest.mark.parametrize("view", [(0., 10., 0., 5., 20, 10), (2.5, 7.5, 1., 4., 13, 7)])
+def test_density_like_histogram(ax, scatter, statistic, view):
+    x, y, z = scatter
+    image = DensityImage(ax, x, y, z, statistic=statistic)
+    pixels, extent = image.compute(*view)
+    assert extent == view[:4]
+    assert pixels.shape == (view[5], view[4])
+    expected = binned(x, y, z, view, statistic)
+    if statistic == "mean":
+        assert (pixels.mask == np.isnan(expected)).all()
+    np.testing.assert_allclose(pixels.filled(np.nan)[~np.isnan(expected)], expected[~np.isnan(expected)])
+
+
+def test_density_max(ax, scatter):
+    x, y, z = scatter
+    image = DensityImage(ax, x, y, z, statistic="max")
+    pixels, _ = image.compute(0., 10., 0., 5., 4, 2)
+    for row in range(2):
+        for col in range(4):
+            inside = (np.minimum(np.floor(x / 2.5), 3) == col) & (np.minimum(np.floor(y / 2.5), 1) == row)
+            assert pixels[row, col] == z[inside].max()
+
+
+def test_density_without_valid_points(ax):
+    with pytest.raises(ValueError):
+        DensityImage(ax, np.ma.masked_all(3), np.zeros(3), np.zeros(3))
+
+
+def test_block_mean():
+    data = np.ma.masked_array(np.arange(15.).reshape(3, 5), mask=np.zeros((3, 5), dtype=bool))
+    data[0, 0] = np.ma.masked
+    data[1, 1] = np.nan
+    means = block_mean(data)
+    assert means.shape == (2, 3)
+    assert means[0, 0] == 3.
+    assert means[1, 2] == 14.
+    assert means[0, 2] == 6.5
+
+
+@pytest.fixture
+def large():
+    rng = np.random.default_rng(10)
+    return rng.normal(size=(1000, 600))
+
+
+def test_pyramid_levels(ax, large):
+    image = PyramidImage(ax, large, min_size=100)
+    image.builder.join()
+    assert image.maxlevel == 4
+    assert len(image.levels) == 4
+    expected = large.reshape(125, 8, 75, 8).mean(axis=(1, 3))
+    np.testing.assert_allclose(image.levels[2], expected)
+    # the whole image on 100 x 100 pixels: the coarsest level with at least that resolution (every 8th)
+    pixels, extent = image.compute(-0.5, 599.5, -0.5, 999.5, 75, 125)
+    np.testing.assert_allclose(pixels, expected)
+    assert extent == (-0.5, 599.5, -0.5, 999.5)
+
+
+def test_pyramid_zoomed_in(ax, large):
+    image = PyramidImage(ax, large, min_size=100)
+    image.builder.join()
+    pixels, extent = image.compute(99.5, 149.5, 9.5, 39.5, 200, 200)
+    assert (pixels == large[10:40, 100:150]).all()
+    assert extent == (99.5, 149.5, 9.5, 39.5)
+
+
+@pytest.fixture
+def swath():
+    xcorners, ycorners = np.meshgrid(np.arange(9.), np.arange(7.))
+    values = np.arange(48.).reshape(6, 8)
+    return xcorners, ycorners, values
+
+
+def test_swath_one_pixel_per_cell(ax, swath):
+    xcorners, ycorners, values = swath
+    image = SwathImage(ax, xcorners, ycorners, values)
+    pixels, extent = image.compute(0., 8., 0., 6., 8, 6)
+    assert extent == (0., 8., 0., 6.)
+    assert (pixels == values).all()
+
+
+def test_swath_small_and_masked_cells(ax, swath):
+    xcorners, ycorners, values = swath
+    xcorners[0, 0] = np.nan
+    image = SwathImage(ax, xcorners, ycorners, values)
+    # 2 x 2 cells per pixel: each pixel gets a value of one of its cells
+    pixels, _ = image.compute(0., 8., 0., 6., 4, 3)
+    for row in range(3):
+        for col in range(4):
+            assert pixels[row, col] in values[2 * row:2 * row + 2, 2 * col:2 * col + 2]
+    # 2 x 2 pixels per cell, the cell with the masked corner is not shown
+    pixels, _ = image.compute(0., 8., 0., 6., 16, 12)
+    assert pixels.mask[:2, :2].all()
+    assert (pixels[2:, 2:] == np.repeat(np.repeat(values, 2, axis=0), 2, axis=1)[2:, 2:]).all()
+
+
+def test_outdated_view_is_cancelled(ax, swath):
+    image = SwathImage(ax, *swath)
+    view = (0., 8., 0., 6., 8, 6)
+    pixels, _ = image.compute_in_background(view, image.generation)
+    assert (pixels == swath[2]).all()
+    with pytest.raises(RenderCancelled):
+        image.compute_in_background(view, image.generation - 1)
+    # only the thread computing in the background is cancelled
+    assert image.compute(*view)[0].shape == (6, 8)
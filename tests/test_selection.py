@@ -0,0 +1,76 @@
+import datetime
+import numpy as np
+import pytest
+from matplotlib.path import Path
+
+from Selection import PointIndex, as_float
+
+LASSO = [(0.1, 0.1), (0.9, 0.2), (0.5, 0.5), (0.8, 0.9), (0.2, 0.7)]
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(8)
+    x, y = rng.random(20000), rng.random(20000)
+    x[:10] = np.nan
+    return x, y
+
+
+def brute_force(x, y, verts):
+    return Path(verts).contains_points(np.column_stack([x, y]))
+
+
+@pytest.mark.parametrize("points_per_cell", [1, 4, 100])
+def test_select_like_brute_force(points, points_per_cell):
+    x, y = points
+    selected = PointIndex(x, y, points_per_cell=points_per_cell).select(LASSO)
+    assert (selected == brute_force(x, y, LASSO)).all()
+    assert not selected[:10].any()
+
+
+def test_select_outside_and_around(points):
+    x, y = points
+    index = PointIndex(x, y)
+    assert not index.select([(2, 2), (3, 2), (3, 3)]).any()
+    everything = index.select([(-1, -1), (2, -1), (2, 2), (-1, 2)])
+    assert everything.sum() == len(x) - 10
+
+
+def test_swap_axes(points):
+    x, y = points
+    index = PointIndex(x, y)
+    index.swap_axes()
+    assert (index.select(LASSO) == brute_force(y, x, LASSO)).all()
+
+
+def test_rows(points):
+    x, y = points
+    # 4 rows of 5000 points, a point index is selected if it is inside in any row
+    selected = PointIndex(x, y, rowlength=5000).select(LASSO)
+    assert (selected == brute_force(x, y, LASSO).reshape(4, 5000).any(axis=0)).all()
+
+
+def test_as_float():
+    start = datetime.datetime(2020, 1, 1)
+    floats = as_float(np.ma.masked_array([start, start + datetime.timedelta(days=1)], mask=[False, True]))
+    assert np.isnan(floats[1])
+    assert as_float(np.array(["2020-01-02"], dtype="datetime64[D]"))[0] == floats[0] + 1
+    assert as_float(np.arange(3, dtype=np.int16)).dtype == np.float64
+
+
+def test_lengths_have_to_agree():
+    with pytest.raises(ValueError):
+        PointIndex(np.arange(3), np.arange(4))
+
+
+@pytest.mark.parametrize("clockwise", [False, True])
+def test_outline_is_inside(clockwise):
+    # points on a grid, the lasso runs exactly through some of them
+    x, y = [entr.ravel().astype(float) for entr in np.meshgrid(np.arange(11), np.arange(11))]
+    verts = [(2, 3), (6, 3), (6, 8), (2, 8)]
+    if clockwise:
+        verts = verts[::-1]
+    selected = PointIndex(x, y).select(verts)
+    inclusive = (x >= 2) & (x <= 6) & (y >= 3) & (y <= 8)
+    assert (selected == inclusive).all()
+    assert selected.sum() == 5 * 6